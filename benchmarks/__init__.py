@@ -0,0 +1,3 @@
+"""
+@author João Gbriel de Almeida
+"""
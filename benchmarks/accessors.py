@@ -0,0 +1,130 @@
+"""
+@author João Gbriel de Almeida
+
+Extração de prévias: sondagem por getattr/exceção versus tabela de leitores.
+
+Simula os dois estilos de API do pypff (só propriedades; só getters) com
+tipos sem ``__dict__``, como os objetos da extensão em C.
+
+    python -m benchmarks.accessors [--messages N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import time
+
+from src.adapters.pypff_adapter import SENDER, SUBJECT, SUBMIT_TIME, PypffAdapter
+from src.models import PstEmail
+
+
+class PropertyMessage:
+    __slots__ = ("_i",)
+
+    def __init__(self, i: int) -> None:
+        self._i = i
+
+    @property
+    def subject(self) -> str:
+        return f"Assunto {self._i}"
+
+    @property
+    def sender_name(self) -> str:
+        return f"Remetente {self._i % 13}"
+
+    @property
+    def client_submit_time(self) -> datetime.datetime:
+        return datetime.datetime(2020, 1, 1)
+
+    @property
+    def number_of_attachments(self) -> int:
+        return self._i % 3
+
+
+class GetterMessage:
+    __slots__ = ("_i",)
+
+    def __init__(self, i: int) -> None:
+        self._i = i
+
+    def get_subject(self) -> str:
+        return f"Assunto {self._i}"
+
+    def get_sender_name(self) -> str:
+        return f"Remetente {self._i % 13}"
+
+    def get_client_submit_time(self) -> datetime.datetime:
+        return datetime.datetime(2020, 1, 1)
+
+    def get_number_of_attachments(self) -> int:
+        return self._i % 3
+
+
+class LegacyAdapter(PypffAdapter):
+    """Sondagem original: getattr + exceção para cada nome candidato."""
+
+    def _get_attr(self, obj, field, default: str = "") -> str:
+        for n in field.names:
+            try:
+                v = getattr(obj, n)
+                if callable(v):
+                    v = v()
+                if v is None:
+                    continue
+                if isinstance(v, bytes):
+                    return v.decode("utf-8", errors="replace")
+                return str(v)
+            except Exception:
+                continue
+        return default
+
+    def _count_attachments(self, msg) -> int:
+        try:
+            ac = msg.number_of_attachments
+        except Exception:
+            ac = getattr(msg, "get_number_of_attachments", lambda: 0)()
+        return ac or 0
+
+    def _to_model_preview(self, msg) -> PstEmail:
+        subject = self._get_attr(msg, SUBJECT)
+        sender = self._get_attr(msg, SENDER)
+        date = self._get_attr(msg, SUBMIT_TIME)
+        return PstEmail(
+            id="",
+            subject=subject,
+            sender=sender,
+            to="",
+            cc="",
+            date=str(date) if date else None,
+            body_text=None,
+            body_html=None,
+            attachments=[],
+            attachment_count=self._count_attachments(msg),
+        )
+
+
+def measure(adapter: PypffAdapter, messages) -> float:
+    started = time.perf_counter()
+    for msg in messages:
+        adapter._to_model_preview(msg)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for label, cls in (("propriedades", PropertyMessage), ("getters", GetterMessage)):
+        messages = [cls(i) for i in range(args.messages)]
+        before = measure(LegacyAdapter(), messages)
+        after = measure(PypffAdapter(), messages)
+        print(
+            f"{label:<13} antes {before * 1e6 / len(messages):6.2f} us/msg   "
+            f"depois {after * 1e6 / len(messages):6.2f} us/msg   ({before / after:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+@author João Gbriel de Almeida
+
+Modelo de objetos no formato do pypff, gerado em memória, para benchmarks.
+
+``install(spec)`` registra um módulo ``pypff`` falso em ``sys.modules``; o
+``PstReader`` passa a abri-lo como se fosse um PST real (o arquivo aberto só
+precisa existir, para o índice persistente). Pastas e mensagens são criadas
+sob demanda e de forma determinística (mesma ``seed``, mesmo conteúdo), como
+os objetos que o pypff devolve a cada ``get_sub_message``.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+import datetime
+import importlib.machinery
+import random
+import sys
+import types
+
+WORDS = (
+    "contrato proposta reunião relatório pagamento fatura projeto prazo cliente entrega "
+    "orçamento revisão anexo pedido equipe agenda resultado análise documento aprovação"
+).split()
+
+
+@dataclass
+class FixtureSpec:
+    depth: int = 2
+    breadth: int = 3
+    messages: int = 200  # por pasta
+    body_bytes: int = 2000
+    html_every: int = 2  # uma a cada N mensagens tem corpo HTML (0 = nenhuma)
+    attachment_every: int = 3  # uma a cada N mensagens tem anexos (0 = nenhuma)
+    attachments: int = 1  # anexos por mensagem com anexos
+    attachment_bytes: int = 32 * 1024
+    seed: int = 1
+
+    @property
+    def folder_count(self) -> int:
+        return sum(self.breadth**d for d in range(self.depth + 1))
+
+    @property
+    def message_count(self) -> int:
+        return self.folder_count * self.messages
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class FakeAttachment:
+    __slots__ = ("_data", "_offset", "_name", "_mime")
+
+    def __init__(self, name: str, mime: Optional[str], data: bytes) -> None:
+        self._data = data
+        self._offset = 0
+        self._name = name
+        self._mime = mime
+
+    @property
+    def long_filename(self) -> str:
+        return self._name
+
+    @property
+    def mime_type(self) -> Optional[str]:
+        return self._mime
+
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    def get_size(self) -> int:
+        return len(self._data)
+
+    def seek_offset(self, offset: int, whence: int = 0) -> int:
+        base = (0, self._offset, len(self._data))[whence]
+        self._offset = max(0, base + offset)
+        return self._offset
+
+    def get_offset(self) -> int:
+        return self._offset
+
+    def read_buffer(self, size: int) -> bytes:
+        data = self._data[self._offset : self._offset + size]
+        self._offset += len(data)
+        return data
+
+
+class FakeMessage:
+    __slots__ = ("_spec", "_ident", "_index", "_rnd", "_subject", "_time")
+
+    def __init__(self, spec: FixtureSpec, ident: int, index: int) -> None:
+        self._spec = spec
+        self._ident = ident
+        self._index = index
+        self._rnd = random.Random(spec.seed * 1_000_003 + ident)
+        self._subject = " ".join(self._rnd.choice(WORDS) for _ in range(self._rnd.randint(2, 7)))
+        base = datetime.datetime(2020, 1, 1)
+        self._time = base + datetime.timedelta(minutes=self._rnd.randint(0, 3 * 365 * 24 * 60))
+
+    @property
+    def identifier(self) -> int:
+        return self._ident
+
+    @property
+    def subject(self) -> str:
+        return self._subject
+
+    @property
+    def sender_name(self) -> str:
+        return f"Remetente {self._ident % 97}"
+
+    @property
+    def sender_email_address(self) -> str:
+        return f"remetente{self._ident % 97}@exemplo.com"
+
+    @property
+    def display_to(self) -> str:
+        return "Destinatário <destino@exemplo.com>"
+
+    @property
+    def display_cc(self) -> str:
+        return ""
+
+    @property
+    def client_submit_time(self) -> datetime.datetime:
+        return self._time
+
+    @property
+    def delivery_time(self) -> datetime.datetime:
+        return self._time + datetime.timedelta(seconds=30)
+
+    @property
+    def creation_time(self) -> datetime.datetime:
+        return self._time
+
+    @property
+    def transport_headers(self) -> str:
+        # Conversas de 4 mensagens seguidas na pasta (cada uma responde à anterior)
+        reply = ""
+        if self._index % 4:
+            reply = f"In-Reply-To: <m{self._ident - 1}@exemplo.com>\r\nReferences: <m{self._ident - 1}@exemplo.com>\r\n"
+        return (
+            f"Message-ID: <m{self._ident}@exemplo.com>\r\n{reply}"
+            f"Subject: {self._subject}\r\n"
+            f"From: {self.sender_name} <{self.sender_email_address}>\r\n"
+            "To: destino@exemplo.com\r\n\r\n"
+        )
+
+    @property
+    def plain_text_body(self) -> bytes:
+        return _text(random.Random(self._ident), self._spec.body_bytes).encode("utf-8")
+
+    @property
+    def html_body(self) -> Optional[bytes]:
+        every = self._spec.html_every
+        if not every or self._index % every:
+            return None
+        text = _text(random.Random(self._ident), self._spec.body_bytes)
+        paragraphs = "".join(f"<p>{line}</p>" for line in text.split("\n"))
+        return f"<html><head><style>p{{margin:0}}</style></head><body>{paragraphs}</body></html>".encode("utf-8")
+
+    @property
+    def plain_text_body_size(self) -> int:
+        return self._spec.body_bytes
+
+    @property
+    def number_of_attachments(self) -> int:
+        every = self._spec.attachment_every
+        return self._spec.attachments if every and self._index % every == 0 else 0
+
+    def get_attachment(self, index: int) -> FakeAttachment:
+        if not 0 <= index < self.number_of_attachments:
+            raise IndexError(index)
+        name = f"documento_{self._ident}_{index}.pdf"
+        return FakeAttachment(name, "application/pdf", _payload(self._spec.attachment_bytes, self._ident + index))
+
+
+class FakeFolder:
+    __slots__ = ("_spec", "_ident", "_name", "_depth")
+
+    def __init__(self, spec: FixtureSpec, ident: int, name: str, depth: int) -> None:
+        self._spec = spec
+        self._ident = ident
+        self._name = name
+        self._depth = depth
+
+    @property
+    def identifier(self) -> int:
+        return self._ident
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def number_of_sub_folders(self) -> int:
+        return self._spec.breadth if 0 <= self._depth < self._spec.depth else (1 if self._depth < 0 else 0)
+
+    @property
+    def number_of_sub_messages(self) -> int:
+        return self._spec.messages if self._depth >= 0 else 0
+
+    def get_sub_folder(self, index: int) -> "FakeFolder":
+        if not 0 <= index < self.number_of_sub_folders:
+            raise IndexError(index)
+        if self._depth < 0:
+            return FakeFolder(self._spec, 1, "Principal", 0)
+        # Identificadores de pasta em árvore (filhos de k: k * breadth + 1...)
+        ident = self._ident * self._spec.breadth + index + 1
+        return FakeFolder(self._spec, ident, f"{self._name}-{index}", self._depth + 1)
+
+    def get_sub_message(self, index: int) -> FakeMessage:
+        if not 0 <= index < self.number_of_sub_messages:
+            raise IndexError(index)
+        # Faixa alta e disjunta das pastas
+        return FakeMessage(self._spec, 1_000_000 * self._ident + index, index)
+
+
+def install(spec: FixtureSpec) -> types.ModuleType:
+    """Registra ``pypff`` falso com a árvore descrita por ``spec``."""
+
+    class file:  # noqa: N801 - mesmo nome da classe do pypff
+        def __init__(self) -> None:
+            self._root: Optional[FakeFolder] = None
+
+        def open(self, path: str, mode: str = "r") -> None:
+            self._root = FakeFolder(spec, 0, "", -1)
+
+        def close(self) -> None:
+            self._root = None
+
+        def get_root_folder(self) -> FakeFolder:
+            return self._root
+
+    module = types.ModuleType("pypff")
+    module.__spec__ = importlib.machinery.ModuleSpec("pypff", None)
+    module.file = file
+    sys.modules["pypff"] = module
+    return module
+
+
+def _text(rnd: random.Random, size: int) -> str:
+    lines: List[str] = []
+    total = 0
+    while total < size:
+        line = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(6, 14)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+_blocks: dict = {}
+
+
+def _payload(size: int, seed: int) -> bytes:
+    # Bloco pseudoaleatório repetido: barato de gerar, não compressível em blocos curtos
+    block = _blocks.get(seed % 64)
+    if block is None:
+        block = _blocks[seed % 64] = random.Random(seed % 64).randbytes(4096)
+    data = b"%PDF-1.4\n" + block * (size // len(block) + 1)
+    return data[:size]
@@ -0,0 +1,82 @@
+"""
+@author João Gbriel de Almeida
+
+Custo por mensagem da conversão HTML -> texto.
+
+Compara a conversão antiga com a atual (um HTML2Text novo por mensagem),
+sem e com a memória de resultados, e com o modo de prévia.
+
+    python -m benchmarks.html_to_text [--messages N] [--distinct N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from src.utils import text as text_mod
+
+
+def make_html(seed: int) -> str:
+    # Corpo no estilo "newsletter": tabelas aninhadas, estilos e muitos links
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(rnd.randint(20, 60)):
+        rows.append(
+            "<tr><td style='padding:8px;font-family:Arial'>"
+            f"<a href='https://exemplo.com/p/{seed}/{i}?utm_source=mail'><img src='cid:{i}' alt='produto {i}'></a>"
+            f"<p>Oferta {i}: <b>{rnd.randint(10, 999)},90</b> &nbsp; {'texto ' * rnd.randint(5, 40)}</p>"
+            "</td></tr>"
+        )
+    return (
+        "<html><head><style>td{color:#333}</style></head><body>"
+        f"<table width='600'>{''.join(rows)}</table>"
+        "<p>Para cancelar o recebimento <a href='https://exemplo.com/sair'>clique aqui</a>.</p>"
+        "</body></html>"
+    )
+
+
+def old_html_to_text(html: str) -> str:
+    import html2text  # type: ignore
+
+    conv = html2text.HTML2Text()
+    conv.ignore_links = False
+    conv.ignore_images = True
+    conv.body_width = 0
+    return text_mod.normalize_text(conv.handle(html))
+
+
+def measure(label: str, fn, bodies) -> None:
+    started = time.perf_counter()
+    for body in bodies:
+        fn(body)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000 / len(bodies):8.3f} ms/msg  ({len(bodies) / elapsed:8.0f} msg/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=100, help="corpos distintos (repetições exercitam a memória)")
+    args = parser.parse_args()
+
+    distinct = [make_html(i) for i in range(args.distinct)]
+    bodies = [distinct[i % len(distinct)] for i in range(args.messages)]
+    print(f"{args.messages} mensagens, {args.distinct} corpos distintos, {sum(map(len, distinct)) // len(distinct)} chars/corpo")
+
+    measure("antes (HTML2Text por msg)", old_html_to_text, bodies)
+
+    def no_memo(html: str) -> str:
+        text_mod.clear_memo()
+        return text_mod.html_to_text(html)
+
+    measure("sem memória", no_memo, bodies)
+    text_mod.clear_memo()
+    measure("com memória", text_mod.html_to_text, bodies)
+    text_mod.clear_memo()
+    measure("prévia (texto simples)", lambda html: text_mod.html_to_text(html, preview=True), bodies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+@author João Gbriel de Almeida
+
+Memória e tempo das prévias: um ``PstEmail`` por mensagem versus
+``PreviewBatch`` (colunas, remetentes compartilhados, datas em época).
+
+    python -m benchmarks.previews [--messages N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import time
+import tracemalloc
+
+from src.models import PstEmail
+from src.previews import PreviewBatch, epoch_from_datetime
+
+
+def rows(n: int):
+    base = datetime.datetime(2020, 1, 1)
+    for i in range(n):
+        # Remetentes montados a cada linha, como chegam do PST
+        yield f"1:{i}", f"Assunto da mensagem {i}", "Remetente " + str(i % 500), base + datetime.timedelta(minutes=i), i % 3
+
+
+def as_objects(n: int):
+    return [
+        PstEmail(
+            id=msg_id,
+            subject=subject,
+            sender=sender,
+            to="",
+            cc="",
+            date=str(date),
+            body_text=None,
+            body_html=None,
+            attachments=[],
+            attachment_count=attachments,
+        )
+        for msg_id, subject, sender, date, attachments in rows(n)
+    ]
+
+
+def as_batch(n: int) -> PreviewBatch:
+    batch = PreviewBatch("1")
+    for msg_id, subject, sender, date, attachments in rows(n):
+        batch.append(msg_id, subject, sender, epoch_from_datetime(date), attachments)
+    return batch
+
+
+def measure(label: str, build, n: int):
+    started = time.perf_counter()
+    result = build(n)
+    elapsed = time.perf_counter() - started
+    del result
+    tracemalloc.start()
+    result = build(n)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {peak / n:7.1f} bytes/msg  {elapsed * 1e6 / n:6.2f} us/msg")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000)
+    args = parser.parse_args()
+
+    objects = measure("PstEmail", as_objects, args.messages)
+    batch = measure("PreviewBatch", as_batch, args.messages)
+
+    started = time.perf_counter()
+    sorted(objects, key=lambda m: m.date)
+    print(f"ordenar por data: objetos {(time.perf_counter() - started) * 1000:.1f} ms", end="")
+    started = time.perf_counter()
+    batch.sort_order("date")
+    print(f", colunas {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
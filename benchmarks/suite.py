@@ -0,0 +1,351 @@
+"""
+@author João Gbriel de Almeida
+
+Suíte de benchmarks do PstReader sobre um PST sintético (``fake_pypff``).
+
+Casos: abertura com indexação (fria) e com índice pronto, listagem de
+prévias, decodificação completa, exportação EML, extração de anexos (avulsa e
+no repositório por conteúdo) e busca.
+Para cada caso: operações/s, latência p50/p99 e pico de RSS. Cada caso roda
+num processo próprio (o pico de RSS é do processo), a menos que
+``--in-process`` seja usado.
+
+    python -m benchmarks.suite [--messages N] [--depth N] [--breadth N]
+        [--body-bytes N] [--attachment-bytes N] [--limit N]
+        [--case NOME ...] [--baseline ARQ] [--save-baseline ARQ] [--check]
+
+Com ``--baseline`` (padrão: benchmarks/baseline.json, se existir) cada caso é
+comparado com o valor guardado; ``--check`` sai com código 1 se algum caso
+ficar mais lento que a tolerância.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_pypff import FixtureSpec, install
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # type: ignore
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEARCH_TERMS = ("contrato", "fatura", "reunião prazo", "subject:projeto", "cliente -orçamento")
+
+
+class Context:
+    """PST sintético, diretórios temporários e leitor já indexado (quando preciso)."""
+
+    def __init__(self, spec: FixtureSpec, limit: int) -> None:
+        self.spec = spec
+        self.limit = limit
+        self.tmp = tempfile.mkdtemp(prefix="pstbench-")
+        # O adaptador só precisa que o arquivo exista (chave do índice persistente)
+        self.pst_path = os.path.join(self.tmp, "sintetico.pst")
+        with open(self.pst_path, "wb") as f:
+            f.write(b"!BDN")
+        self.index_dir = os.path.join(self.tmp, "indice")
+        install(spec)
+
+    def reader(self, indexed: bool = True, cache_bytes: int = 0):
+        from src.pst_reader import PstReader
+
+        reader = PstReader(index_dir=self.index_dir, cache_bytes=cache_bytes)
+        reader.open(self.pst_path)
+        if indexed:
+            index_all(reader)
+        return reader
+
+    def message_ids(self, reader, with_attachments: bool = False) -> List[str]:
+        ids: List[str] = []
+        for folder, _path, _depth in reader.walk_folders():
+            for batch in reader.iter_preview_batches(folder.id):
+                for k in range(len(batch)):
+                    if not with_attachments or batch.attachment_counts[k]:
+                        ids.append(batch.ids[k])
+                        if len(ids) >= self.limit:
+                            return ids
+        return ids
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def index_all(reader) -> None:
+    for folder, _path, _depth in reader.walk_folders():
+        start: Optional[int] = 0
+        while start is not None:
+            start = reader.index_messages(folder.id, start, 1000)
+
+
+def timed(items, fn: Callable) -> List[float]:
+    latencies = []
+    for item in items:
+        started = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+# Casos: cada um devolve as latências (s) das operações medidas
+def case_open_index(ctx: Context) -> List[float]:
+    def open_cold(_k: int) -> None:
+        shutil.rmtree(ctx.index_dir, ignore_errors=True)
+        ctx.reader(indexed=True)
+
+    return timed(range(3), open_cold)
+
+
+def case_open_warm(ctx: Context) -> List[float]:
+    ctx.reader(indexed=True)
+    return timed(range(10), lambda _k: ctx.reader(indexed=False).get_root_folders())
+
+
+def case_list_previews(ctx: Context) -> List[float]:
+    reader = ctx.reader()
+    folders = [folder.id for folder, _path, _depth in reader.walk_folders()]
+    return timed(folders * 5, reader.preview_batch)
+
+
+def case_get_message(ctx: Context) -> List[float]:
+    reader = ctx.reader()
+    return timed(ctx.message_ids(reader), reader.get_message)
+
+
+def case_export_eml(ctx: Context) -> List[float]:
+    reader = ctx.reader()
+    out_dir = os.path.join(ctx.tmp, "eml")
+    os.makedirs(out_dir, exist_ok=True)
+    ids = ctx.message_ids(reader)
+    return timed(range(len(ids)), lambda k: reader.export_eml(ids[k], os.path.join(out_dir, f"{k}.eml")))
+
+
+def case_extract_attachments(ctx: Context) -> List[float]:
+    reader = ctx.reader()
+    out_dir = os.path.join(ctx.tmp, "anexos")
+    ids = ctx.message_ids(reader, with_attachments=True)
+
+    def extract(k: int) -> None:
+        target = os.path.join(out_dir, str(k))
+        os.makedirs(target, exist_ok=True)
+        reader.extract_attachments(ids[k], target)
+
+    return timed(range(len(ids)), extract)
+
+
+def case_store_attachments(ctx: Context) -> List[float]:
+    from src.attachment_store import AttachmentStore
+
+    reader = ctx.reader()
+    ids = ctx.message_ids(reader, with_attachments=True)
+    with AttachmentStore(os.path.join(ctx.tmp, "repositorio"), link_mode="hardlink") as store:
+        return timed(ids, lambda msg_id: reader.store_attachments(msg_id, store, os.path.join(store.root, "mensagens", msg_id)))
+
+
+def case_search(ctx: Context) -> List[float]:
+    from src.index.search import SearchIndex, update_search_index
+
+    reader = ctx.reader()
+    index = SearchIndex(reader.index_path)
+    try:
+        update_search_index(reader, index)
+        return timed(SEARCH_TERMS * 20, index.search)
+    finally:
+        index.close()
+
+
+def case_conversation(ctx: Context) -> List[float]:
+    from src.index.threads import ThreadIndex, update_thread_index
+
+    reader = ctx.reader()
+    index = ThreadIndex(reader.index_path)
+    try:
+        update_thread_index(reader, index)
+    finally:
+        index.close()
+    return timed(ctx.message_ids(reader), reader.conversation)
+
+
+def case_metadata_export(ctx: Context) -> List[float]:
+    from src.metadata_export import ColumnarWriter, MetadataExporter, _collect_with
+
+    reader = ctx.reader()
+    out_path = os.path.join(ctx.tmp, "metadados.pstcol")
+    # Uma operação = uma fatia de 50 mensagens lida e gravada no formato colunar
+    shards = MetadataExporter(ctx.pst_path, out_path, chunk_rows=50).plan(reader)
+    writer = ColumnarWriter(out_path)
+    try:
+        return timed(shards, lambda shard: writer.write_chunk(_collect_with(reader, shard)[0]))
+    finally:
+        writer.close()
+
+
+CASES: Dict[str, Callable[[Context], List[float]]] = {
+    "open_index": case_open_index,
+    "open_warm": case_open_warm,
+    "list_previews": case_list_previews,
+    "get_message": case_get_message,
+    "export_eml": case_export_eml,
+    "extract_attachments": case_extract_attachments,
+    "store_attachments": case_store_attachments,
+    "search": case_search,
+    "conversation": case_conversation,
+    "metadata_export": case_metadata_export,
+}
+
+
+# Métricas
+def percentile(values: List[float], q: float) -> float:
+    # Nearest-rank: valor observado, sem interpolação
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def peak_rss_kb() -> Optional[int]:
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa KiB; macOS, bytes
+        return peak // 1024 if sys.platform == "darwin" else peak
+    try:
+        import psutil  # type: ignore
+
+        return psutil.Process().memory_info().peak_wset // 1024
+    except Exception:
+        return None
+
+
+def run_case(name: str, spec: FixtureSpec, limit: int) -> dict:
+    ctx = Context(spec, limit)
+    try:
+        latencies = CASES[name](ctx)
+    finally:
+        ctx.cleanup()
+    total = sum(latencies)
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": round(len(latencies) / total, 2) if total else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else 0.0,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else 0.0,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def run_isolated(name: str, args: argparse.Namespace) -> dict:
+    # Processo novo por caso: pico de RSS e caches não vazam entre casos
+    cmd = [sys.executable, "-m", "benchmarks.suite", "--worker", name] + spec_argv(args)
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+# Linha de comando
+def spec_from_args(args: argparse.Namespace) -> FixtureSpec:
+    return FixtureSpec(
+        depth=args.depth,
+        breadth=args.breadth,
+        messages=args.messages,
+        body_bytes=args.body_bytes,
+        attachment_bytes=args.attachment_bytes,
+        attachment_every=args.attachment_every,
+        seed=args.seed,
+    )
+
+
+def spec_argv(args: argparse.Namespace) -> List[str]:
+    return [
+        "--depth", str(args.depth),
+        "--breadth", str(args.breadth),
+        "--messages", str(args.messages),
+        "--body-bytes", str(args.body_bytes),
+        "--attachment-bytes", str(args.attachment_bytes),
+        "--attachment-every", str(args.attachment_every),
+        "--seed", str(args.seed),
+        "--limit", str(args.limit),
+    ]
+
+
+def compare(results: Dict[str, dict], baseline: dict, tolerance: float, out=sys.stdout) -> List[str]:
+    """Imprime a comparação e devolve os casos que ficaram mais lentos."""
+    regressions = []
+    saved = baseline.get("results", {})
+    for name, result in results.items():
+        base = saved.get(name)
+        if not base or not base.get("ops_per_sec"):
+            continue
+        ratio = result["ops_per_sec"] / base["ops_per_sec"]
+        flag = ""
+        if ratio < 1 - tolerance:
+            flag = "  REGRESSÃO"
+            regressions.append(name)
+        print(f"  {name:<20} {ratio:6.2f}x ops/s   p99 {base['p99_ms']:.3f} -> {result['p99_ms']:.3f} ms{flag}", file=out)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = FixtureSpec()
+    parser.add_argument("--depth", type=int, default=defaults.depth, help="níveis de subpastas")
+    parser.add_argument("--breadth", type=int, default=defaults.breadth, help="subpastas por pasta")
+    parser.add_argument("--messages", type=int, default=defaults.messages, help="mensagens por pasta")
+    parser.add_argument("--body-bytes", type=int, default=defaults.body_bytes)
+    parser.add_argument("--attachment-bytes", type=int, default=defaults.attachment_bytes)
+    parser.add_argument("--attachment-every", type=int, default=defaults.attachment_every, help="uma a cada N mensagens tem anexo")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--limit", type=int, default=500, help="máximo de mensagens por caso")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="casos a rodar (padrão: todos)")
+    parser.add_argument("--in-process", action="store_true", help="todos os casos no mesmo processo")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON de referência para comparação")
+    parser.add_argument("--save-baseline", default=None, help="gravar os resultados como referência")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="queda de ops/s tolerada (fração)")
+    parser.add_argument("--check", action="store_true", help="código de saída 1 se houver regressão")
+    parser.add_argument("--json", action="store_true", help="resultados em JSON no stdout")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    spec = spec_from_args(args)
+
+    if args.worker:
+        print(json.dumps(run_case(args.worker, spec, args.limit)))
+        return 0
+
+    names = args.case or list(CASES)
+    results: Dict[str, dict] = {}
+    if not args.json:
+        print(f"PST sintético: {spec.folder_count} pastas, {spec.message_count} mensagens")
+        print(f"  {'caso':<20} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'RSS pico MB':>12}")
+    for name in names:
+        result = run_case(name, spec, args.limit) if args.in_process else run_isolated(name, args)
+        results[name] = result
+        if not args.json:
+            rss = f"{result['peak_rss_kb'] / 1024:12.1f}" if result["peak_rss_kb"] else f"{'-':>12}"
+            print(f"  {name:<20} {result['ops_per_sec']:10.1f} {result['p50_ms']:9.3f} {result['p99_ms']:9.3f} {rss}")
+
+    report = {"spec": spec.to_dict(), "limit": args.limit, "results": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    regressions: List[str] = []
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("spec") != report["spec"] or baseline.get("limit") != args.limit:
+            print("aviso: referência gerada com outro PST sintético; comparação aproximada", file=sys.stderr)
+        out = sys.stderr if args.json else sys.stdout
+        print(f"Comparação com {args.baseline}:", file=out)
+        regressions = compare(results, baseline, args.tolerance, out)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional, Tuple
+import inspect
+import operator
+
+Accessor = Callable[[Any], Any]
+
+_MISSING = object()
+_declared: Dict[Tuple[type, str], bool] = {}
+
+
+class Field:
+    """Um campo lido de objetos pypff, com seus nomes candidatos.
+
+    Versões de pypff expõem propriedades (``subject``) e/ou métodos
+    (``get_subject``); testar os nomes com ``getattr`` e exceções em cada
+    campo de cada mensagem custa caro. A sondagem é feita no primeiro objeto
+    de cada tipo e os leitores que existem ficam guardados por tipo; o
+    caminho quente só chama esses leitores.
+    """
+
+    __slots__ = ("names", "_by_type")
+
+    def __init__(self, *names: str) -> None:
+        self.names = names
+        self._by_type: Dict[type, Tuple[Accessor, ...]] = {}
+
+    def accessors(self, obj) -> Tuple[Accessor, ...]:
+        cls = type(obj)
+        found = self._by_type.get(cls)
+        if found is None:
+            found = self._by_type[cls] = _resolve(cls, self.names)
+        return found
+
+    def get(self, obj, default=None):
+        """Primeiro valor não nulo entre os nomes candidatos."""
+        found = self._by_type.get(type(obj))
+        if found is None:
+            found = self.accessors(obj)
+        if len(found) == 1:
+            # Caso comum (um só nome existe no tipo): sem laço
+            try:
+                value = found[0](obj)
+            except Exception:
+                return default
+            return default if value is None else value
+        for accessor in found:
+            try:
+                value = accessor(obj)
+            except Exception:
+                # Propriedade existe mas não pôde ser lida neste objeto
+                continue
+            if value is not None:
+                return value
+        return default
+
+
+class Record:
+    """Vários campos lidos de uma vez (ex.: os da prévia de uma mensagem).
+
+    Quando cada campo resolve para uma propriedade do tipo, a leitura vira um
+    único ``operator.attrgetter`` com todos os nomes; senão, campo a campo.
+    """
+
+    __slots__ = ("fields", "_by_type")
+
+    def __init__(self, *fields: Field) -> None:
+        self.fields = fields
+        self._by_type: Dict[type, Optional[Accessor]] = {}
+
+    def read(self, obj) -> Tuple:
+        cls = type(obj)
+        reader = self._by_type.get(cls, _MISSING)
+        if reader is _MISSING:
+            reader = self._by_type[cls] = self._compile(cls)
+        if reader is not None:
+            try:
+                values = reader(obj)
+            except Exception:
+                pass
+            else:
+                if None not in values:
+                    return values
+                # Campo vazio: os demais nomes candidatos ainda podem ter valor
+                return tuple(v if v is not None else f.get(obj) for v, f in zip(values, self.fields))
+        return tuple(f.get(obj) for f in self.fields)
+
+    def _compile(self, cls: type) -> Optional[Accessor]:
+        names = []
+        for field in self.fields:
+            for name in field.names:
+                attr = inspect.getattr_static(cls, name, _MISSING)
+                if attr is not _MISSING:
+                    if not inspect.isdatadescriptor(attr):
+                        return None
+                    names.append(name)
+                    break
+            else:
+                return None
+        return operator.attrgetter(*names) if len(names) > 1 else None
+
+
+def has_attribute(obj, name: str) -> bool:
+    key = (type(obj), name)
+    declared = _declared.get(key)
+    if declared is None:
+        declared = _declared[key] = inspect.getattr_static(type(obj), name, _MISSING) is not _MISSING
+    return declared or (_has_instance_dict(type(obj)) and hasattr(obj, name))
+
+
+def _resolve(cls: type, names: Tuple[str, ...]) -> Tuple[Accessor, ...]:
+    found = []
+    dynamic = _has_instance_dict(cls)
+    for name in names:
+        attr = inspect.getattr_static(cls, name, _MISSING)
+        if attr is _MISSING:
+            # Tipos de extensão (pypff) não têm atributos de instância: nome
+            # ausente no tipo é descartado de vez
+            if dynamic:
+                found.append(_instance_reader(name))
+        elif inspect.isdatadescriptor(attr):
+            found.append(operator.attrgetter(name))
+        elif not isinstance(attr, (staticmethod, classmethod)) and (
+            inspect.isfunction(attr) or inspect.ismethoddescriptor(attr)
+        ):
+            # Método: chamado direto pelo descritor, sem criar bound method
+            found.append(getattr(cls, name))
+        else:
+            found.append(_instance_reader(name))
+    return tuple(found)
+
+
+def _has_instance_dict(cls: type) -> bool:
+    return getattr(cls, "__dictoffset__", 0) != 0
+
+
+def _instance_reader(name: str) -> Accessor:
+    def read(obj):
+        value = getattr(obj, name, None)
+        return value() if callable(value) else value
+
+    return read
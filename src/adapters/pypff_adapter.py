@@ -4,25 +4,80 @@
 
 from __future__ import annotations
 
-from typing import Dict, List, Tuple
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
+import hashlib
 import os
 import mimetypes
-import re
+import sqlite3
 
-from src.models import PstEmail, PstFolder
+from src.adapters.accessors import Field, Record, has_attribute
+from src.models import MessageHeaders, MessageMetadata, MessageStat, PstAttachment, PstEmail, PstFolder
+from src.previews import PreviewBatch, epoch_from_datetime, epoch_from_text
+from src.index.sidecar import SidecarIndex
+from src.index.sorting import SortIndex, build_sort_index
+from src.instrumentation import result_len, traced
+from src.utils.dates import DateLike, display_date, in_range, to_epoch, to_utc
+from src.utils.exporters import sanitize_filename
+from src.utils.mime import MimeAttachment, MimeMessage, MimeWriter
+from src.utils.text import html_to_text, normalize_text
 
 try:
     import puremagic  # type: ignore
 except Exception:  # pragma: no cover
     puremagic = None  # type: ignore
 
+# Bytes lidos do início de um anexo para detectar o tipo quando não há MIME
+SNIFF_BYTES = 4096
+# Tamanho dos blocos na cópia de anexos
+CHUNK_SIZE = 1024 * 1024
+
+# Campos lidos dos objetos pypff (propriedade e/ou getter, conforme a versão)
+IDENTIFIER = Field("identifier", "get_identifier")
+FOLDER_NAME = Field("name", "get_name", "_name")
+SUB_FOLDER_COUNT = Field("number_of_sub_folders", "get_number_of_sub_folders")
+SUB_MESSAGE_COUNT = Field("number_of_sub_messages", "get_number_of_sub_messages")
+SUBJECT = Field("subject", "get_subject")
+SENDER = Field("sender_name", "get_sender_name", "sender_email_address", "get_sender_email_address")
+DISPLAY_TO = Field("display_to", "get_display_to")
+DISPLAY_CC = Field("display_cc", "get_display_cc")
+SUBMIT_TIME = Field("client_submit_time", "get_client_submit_time")
+DELIVERY_TIME = Field("delivery_time", "get_delivery_time")
+CREATION_TIME = Field("creation_time", "get_creation_time")
+PLAIN_BODY = Field("plain_text_body", "get_plain_text_body")
+HTML_BODY = Field("html_body", "get_html_body")
+RTF_BODY = Field("rtf_body", "get_rtf_body")
+BODY_SIZES = (
+    Field("plain_text_body_size", "get_plain_text_body_size"),
+    Field("html_body_size", "get_html_body_size"),
+    Field("rtf_body_size", "get_rtf_body_size"),
+)
+ATTACHMENT_COUNT = Field("number_of_attachments", "get_number_of_attachments")
+ATTACHMENT_NAME = Field("long_filename", "get_long_filename", "filename", "get_filename")
+ATTACHMENT_MIME = Field("mime_type", "get_mime_type", "mime_tag", "get_mime_tag", "content_type", "get_content_type")
+ATTACHMENT_SIZE = Field("size", "get_size", "data_size", "get_data_size")
+IS_EMBEDDED = Field("is_embedded_message", "get_is_embedded_message")
+TRANSPORT_HEADERS = Field("transport_headers", "get_transport_headers")
+CONVERSATION_INDEX = Field("conversation_index", "get_conversation_index")
+EMBEDDED_MESSAGE = Field("embedded_message", "get_embedded_message")
+MESSAGE_SIZE = Field("size", "get_size", "message_size", "get_message_size")
+PREVIEW = Record(SUBJECT, SENDER, SUBMIT_TIME, ATTACHMENT_COUNT)
+
 
 class PypffAdapter:
-    def __init__(self) -> None:
+    def __init__(self, index_dir: Optional[str] = None, lazy: bool = False) -> None:
         self._pff = None  # type: ignore
         self._file = None  # type: ignore
         self._folder_index: Dict[str, object] = {}
+        # Localização (pasta pai, posição) de cada pasta e (pasta, posição) de
+        # cada mensagem conhecida, para resolver IDs estáveis em O(1)
+        self._folder_locations: Dict[str, Tuple[Optional[str], int]] = {}
+        self._message_index: Dict[str, Tuple[str, int]] = {}
+        self._root_nodes: List[PstFolder] = []
+        self._nodes: Dict[str, PstFolder] = {}
+        self._lazy = lazy
+        self._index_dir = index_dir
+        self._sidecar: Optional[SidecarIndex] = None
 
     def _normalize_path(self, path: str) -> str:
         try:
@@ -39,132 +94,481 @@ class PypffAdapter:
             import pypff  # type: ignore
         except Exception as exc:  # pragma: no cover
             raise RuntimeError("pypff não disponível") from exc
+        self.close()
         self._pff = pypff
         self._file = pypff.file()
         norm_path = self._normalize_path(path)
         self._file.open(norm_path)
-        self._index()
-
-    def _index(self) -> None:
-        root = self._file.get_root_folder()
         self._folder_index.clear()
+        self._folder_locations.clear()
+        self._message_index.clear()
+        self._sidecar = self._open_sidecar(path)
+        if self._sidecar is not None:
+            if not self._sidecar.is_fresh():
+                # PST mudou: tudo no índice precisa ser conferido de novo
+                self._sidecar.invalidate()
+                self._sidecar.mark_fresh()
+            for folder_id, parent_id, position, _name, _subs, _count in self._sidecar.load_folders():
+                self._folder_locations[folder_id] = (parent_id, position)
+        self._index()
 
-        def walk(folder_obj) -> PstFolder:
-            folder_id = str(id(folder_obj))
-            name = getattr(folder_obj, "name", None) or getattr(folder_obj, "_name", "Pasta")
-            children_py: List[PstFolder] = []
+    def close(self) -> None:
+        file, self._file = self._file, None
+        if file is not None:
             try:
-                count = folder_obj.number_of_sub_folders
+                file.close()
             except Exception:
-                count = getattr(folder_obj, "get_number_of_sub_folders", lambda: 0)()
-            for i in range(count or 0):
+                pass
+        if self._sidecar is not None:
+            self._sidecar.close()
+            self._sidecar = None
+        self._folder_index.clear()
+        self._folder_locations.clear()
+        self._message_index.clear()
+        self._root_nodes = []
+        self._nodes.clear()
+
+    @property
+    def index_path(self) -> Optional[str]:
+        return self._sidecar.db_path if self._sidecar is not None else None
+
+    def _open_sidecar(self, path: str) -> Optional[SidecarIndex]:
+        if not self._index_dir:
+            return None
+        try:
+            return SidecarIndex(self._index_dir, path)
+        except (OSError, sqlite3.Error):
+            # Índice é opcional: sem ele, apenas não há cache entre aberturas
+            return None
+
+    @traced()
+    def _index(self) -> None:
+        self._nodes.clear()
+        if self._lazy:
+            # Apenas o primeiro nível; subpastas são lidas em get_sub_folders
+            self._root_nodes = self._read_children(None)
+            return
+
+        def walk(parent_id: Optional[str]) -> List[PstFolder]:
+            nodes = self._read_children(parent_id)
+            for node in nodes:
+                if node.subfolder_count:
+                    node.children = walk(node.id)
+            return nodes
+
+        self._root_nodes = walk(None)
+
+    @traced()
+    def _read_children(self, parent_id: Optional[str]) -> List[PstFolder]:
+        nodes: List[PstFolder] = []
+        rows = self._sidecar.load_children(parent_id) if self._sidecar is not None else None
+        if rows is not None:
+            for folder_id, _parent_id, position, name, subs, count in rows:
+                self._folder_locations[folder_id] = (parent_id, position)
+                nodes.append(PstFolder(id=folder_id, name=name, children=[], subfolder_count=subs, message_count=count))
+        else:
+            parent = self._file.get_root_folder() if parent_id is None else self._resolve_folder(parent_id)
+            if parent is None:
+                return []
+            rows = []
+            for i in range(self._count_sub_folders(parent)):
                 try:
-                    child = folder_obj.get_sub_folder(i)
+                    child = parent.get_sub_folder(i)
                 except Exception:
                     continue
-                child_model = walk(child)
-                children_py.append(child_model)
+                name = self._get_attr(child, FOLDER_NAME, default="Pasta")
+                folder_id = self._folder_id(child, parent_id, i, name)
+                subs = self._count_sub_folders(child)
+                count = self._count_messages(child)
+                self._folder_index[folder_id] = child
+                self._folder_locations[folder_id] = (parent_id, i)
+                rows.append((folder_id, parent_id, i, name, subs, count))
+                nodes.append(PstFolder(id=folder_id, name=name, children=[], subfolder_count=subs, message_count=count))
+            if self._sidecar is not None:
+                self._sidecar.sync_children(parent_id, rows)
+        for node in nodes:
+            self._nodes[node.id] = node
+        return nodes
 
-            node = PstFolder(id=folder_id, name=name, children=children_py)
-            self._folder_index[folder_id] = folder_obj
-            return node
+    # Identificadores estáveis
+    def _get_identifier(self, obj) -> Optional[int]:
+        v = IDENTIFIER.get(obj)
+        return v if isinstance(v, int) else None
 
-        self._root_nodes: List[PstFolder] = []
+    def _folder_id(self, folder_obj, parent_id: Optional[str], position: int, name: str) -> str:
+        # Preferir o identificador do nó no PST; sem ele, hash do caminho da pasta
+        ident = self._get_identifier(folder_obj)
+        if ident is not None:
+            return str(ident)
+        digest = hashlib.sha1(f"{parent_id or ''}/{position}:{name}".encode("utf-8")).hexdigest()
+        return f"p{digest[:16]}"
+
+    def _message_id(self, folder_id: str, msg, position: int) -> str:
+        ident = self._get_identifier(msg)
+        if ident is not None:
+            return f"{folder_id}:{ident}"
+        return f"{folder_id}:@{position}"
+
+    def _resolve_folder(self, folder_id: str):
+        folder_obj = self._folder_index.get(folder_id)
+        if folder_obj is not None:
+            return folder_obj
+        location = self._folder_locations.get(folder_id)
+        if location is None:
+            return None
+        parent_id, position = location
+        parent = self._resolve_folder(parent_id) if parent_id is not None else self._file.get_root_folder()
+        if parent is None:
+            return None
         try:
-            sub_count = root.number_of_sub_folders
+            folder_obj = parent.get_sub_folder(position)
         except Exception:
-            sub_count = getattr(root, "get_number_of_sub_folders", lambda: 0)()
-        for i in range(sub_count or 0):
-            try:
-                f = root.get_sub_folder(i)
-            except Exception:
-                continue
-            self._root_nodes.append(walk(f))
+            return None
+        name = self._get_attr(folder_obj, FOLDER_NAME, default="Pasta")
+        if self._folder_id(folder_obj, parent_id, position, name) != folder_id:
+            # Localização antiga (PST alterado): a pasta não está mais ali
+            return None
+        self._folder_index[folder_id] = folder_obj
+        return folder_obj
+
+    def _count_sub_folders(self, folder_obj) -> int:
+        return SUB_FOLDER_COUNT.get(folder_obj) or 0
+
+    def _count_messages(self, folder_obj) -> int:
+        return SUB_MESSAGE_COUNT.get(folder_obj) or 0
 
     # Public API
     def get_root_folders(self) -> List[PstFolder]:
         return list(self._root_nodes)
 
-    def list_messages(self, folder_id: str) -> List[PstEmail]:
-        folder_obj = self._folder_index.get(folder_id)
+    def get_sub_folders(self, folder_id: str) -> List[PstFolder]:
+        node = self._nodes.get(folder_id)
+        if node is not None and (node.children or not node.subfolder_count):
+            return list(node.children)
+        children = self._read_children(folder_id)
+        if node is not None:
+            node.children = children
+        return list(children)
+
+    def list_messages(self, folder_id: str, since: DateLike = None, until: DateLike = None) -> List[PstEmail]:
+        """Prévias da pasta, opcionalmente só as enviadas em [since, until).
+
+        Com a pasta indexada o filtro de datas é uma consulta na coluna de
+        época do índice; sem índice, as prévias são lidas e filtradas.
+        """
+        since_epoch, until_epoch = to_epoch(since), to_epoch(until)
+        if self._sidecar is not None:
+            if since is None and until is None:
+                rows = self._sidecar.load_previews(folder_id)
+            else:
+                rows = self._sidecar.load_previews_between(folder_id, since_epoch, until_epoch)
+            if rows is not None:
+                return [self._preview_from_index(folder_id, row) for row in rows]
+        folder_obj = self._resolve_folder(folder_id)
         if not folder_obj:
             return []
         emails: List[PstEmail] = []
-        try:
-            mcount = folder_obj.number_of_sub_messages
-        except Exception:
-            mcount = getattr(folder_obj, "get_number_of_sub_messages", lambda: 0)()
-        for j in range(mcount or 0):
+        positions: List[int] = []
+        for model, j in self._read_previews(folder_obj, folder_id, 0, self._count_messages(folder_obj)):
+            emails.append(model)
+            positions.append(j)
+        if self._sidecar is not None:
+            self._sidecar.save_previews(folder_id, (self._index_row(m, pos) for m, pos in zip(emails, positions)))
+        return [m for m in emails if in_range(m.epoch, since_epoch, until_epoch)]
+
+    def count_messages(self, folder_id: str) -> int:
+        if self._sidecar is not None:
+            indexed = self._sidecar.count_previews(folder_id)
+            if indexed is not None:
+                return indexed
+        node = self._nodes.get(folder_id)
+        if node is not None:
+            return node.message_count
+        folder_obj = self._resolve_folder(folder_id)
+        return self._count_messages(folder_obj) if folder_obj else 0
+
+    def iter_messages(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[PstEmail]:
+        """Prévias das mensagens na faixa [start, start + count) da pasta."""
+        if self._sidecar is not None:
+            rows = self._sidecar.load_previews(folder_id, start, count)
+            if rows is not None:
+                for row in rows:
+                    yield self._preview_from_index(folder_id, row)
+                return
+        folder_obj = self._resolve_folder(folder_id)
+        if not folder_obj:
+            return
+        total = self._count_messages(folder_obj)
+        stop = total if count is None else min(total, start + count)
+        for model, _j in self._read_previews(folder_obj, folder_id, max(start, 0), stop):
+            yield model
+
+    def preview_batch(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> PreviewBatch:
+        """Prévias da faixa [start, start + count) em colunas, sem um objeto por mensagem."""
+        batch = PreviewBatch(folder_id, start)
+        if self._sidecar is not None:
+            rows = self._sidecar.load_previews(folder_id, start, count)
+            if rows is not None:
+                for msg_id, position, subject, sender, date, attachments in rows:
+                    self._message_index[msg_id] = (folder_id, position)
+                    batch.append(msg_id, subject, sender, epoch_from_text(date), attachments, position)
+                return batch
+        folder_obj = self._resolve_folder(folder_id)
+        if not folder_obj:
+            return batch
+        total = self._count_messages(folder_obj)
+        stop = total if count is None else min(total, start + count)
+        self._append_previews(batch, folder_obj, folder_id, range(max(start, 0), stop))
+        return batch
+
+    def preview_batch_at(self, folder_id: str, positions: List[int]) -> PreviewBatch:
+        """Prévias das posições dadas, na mesma ordem (página de uma lista ordenada)."""
+        batch = PreviewBatch(folder_id)
+        if self._sidecar is not None:
+            rows = self._sidecar.load_previews_at(folder_id, positions)
+            if rows is not None:
+                for msg_id, position, subject, sender, date, attachments in rows:
+                    self._message_index[msg_id] = (folder_id, position)
+                    batch.append(msg_id, subject, sender, epoch_from_text(date), attachments, position)
+                return batch
+        folder_obj = self._resolve_folder(folder_id)
+        if folder_obj:
+            self._append_previews(batch, folder_obj, folder_id, positions)
+        return batch
+
+    def _append_previews(self, batch: PreviewBatch, folder_obj, folder_id: str, positions) -> None:
+        start = len(batch)
+        for j in positions:
+            try:
+                msg = folder_obj.get_sub_message(j)
+            except Exception:
+                continue
+            subject, sender, date, attachments = PREVIEW.read(msg)
+            msg_id = self._message_id(folder_id, msg, j)
+            self._message_index[msg_id] = (folder_id, j)
+            batch.append(
+                msg_id, self._as_text(subject), self._as_text(sender), epoch_from_datetime(date), attachments or 0, j
+            )
+        self._save_message_ids(folder_id, zip(batch.ids[start:], batch.positions[start:]))
+
+    def sort_index(self, folder_id: str, key: str) -> SortIndex:
+        """Ordem da pasta pela coluna ``key``: índice persistente ou cálculo (a memória fica com o ``PstReader``)."""
+        stored = self._sidecar.load_sort_index(folder_id, key) if self._sidecar is not None else None
+        if stored is not None:
+            found = SortIndex.from_bytes(key, *stored)
+        else:
+            found = build_sort_index(self.preview_batch(folder_id), key)
+            if self._sidecar is not None:
+                # Só é gravada se a pasta já estiver indexada por completo
+                self._sidecar.save_sort_index(folder_id, key, *found.to_bytes())
+        return found
+
+    def index_messages(self, folder_id: str, start: int, count: int) -> Optional[int]:
+        """Indexa as prévias da faixa [start, start + count) no índice persistente.
+
+        Retorna a próxima posição a indexar ou None quando não há mais nada a
+        fazer (pasta completa, já indexada ou índice desativado).
+        """
+        if self._sidecar is None or self._sidecar.count_previews(folder_id) is not None:
+            return None
+        folder_obj = self._resolve_folder(folder_id)
+        if not folder_obj:
+            return None
+        total = self._count_messages(folder_obj)
+        stop = min(total, start + count)
+        rows = [self._index_row(m, j) for m, j in self._read_previews(folder_obj, folder_id, start, stop)]
+        self._sidecar.append_previews(folder_id, rows, reset=start == 0)
+        if stop >= total:
+            self._sidecar.finish_previews(folder_id)
+            return None
+        return stop
+
+    def _read_previews(self, folder_obj, folder_id: str, start: int, stop: int) -> Iterator[Tuple[PstEmail, int]]:
+        for j in range(start, stop):
             try:
                 msg = folder_obj.get_sub_message(j)
             except Exception:
                 continue
             model = self._to_model_preview(msg)
-            model.id = f"{folder_id}:{j}"
-            emails.append(model)
-        return emails
+            model.id = self._message_id(folder_id, msg, j)
+            self._message_index[model.id] = (folder_id, j)
+            yield model, j
 
-    def _resolve_message(self, composite_id: str):
-        try:
-            folder_id, idx_str = composite_id.rsplit(":", 1)
-            idx = int(idx_str)
-        except Exception as exc:
-            raise KeyError("Mensagem não encontrada") from exc
-        folder_obj = self._folder_index.get(folder_id)
+    def _index_row(self, m: PstEmail, position: int):
+        return (m.id, position, m.subject, m.sender, m.date, m.attachment_count, m.epoch)
+
+    def _preview_from_index(self, folder_id: str, row) -> PstEmail:
+        self._message_index[row[0]] = (folder_id, row[1])
+        return self._preview_from_row(row)
+
+    def _preview_from_row(self, row) -> PstEmail:
+        msg_id, _position, subject, sender, date, attachment_count = row
+        return PstEmail(
+            id=msg_id,
+            subject=subject,
+            sender=sender,
+            to="",
+            cc="",
+            date=date,
+            body_text=None,
+            body_html=None,
+            attachments=[],
+            attachment_count=attachment_count or 0,
+            timestamp=to_utc(date),
+        )
+
+    def _locate_message(self, msg_id: str) -> Tuple[str, int]:
+        location = self._message_index.get(msg_id)
+        if location is not None:
+            return location
+        folder_id, sep, local_id = msg_id.rpartition(":")
+        if not sep or folder_id not in self._folder_locations:
+            raise KeyError("Mensagem não encontrada")
+        if local_id.startswith("@"):
+            try:
+                return folder_id, int(local_id[1:])
+            except ValueError as exc:
+                raise KeyError("Mensagem não encontrada") from exc
+        if self._sidecar is not None:
+            # Posição gravada quando a mensagem foi lida (listagem, índices)
+            location = self._sidecar.locate_message(msg_id)
+            if location is not None:
+                self._message_index[msg_id] = location
+                return location
+            if self._sidecar.has_message_ids(folder_id):
+                raise KeyError("Mensagem não encontrada")
+        # Pasta ainda não mapeada: percorre os identificadores uma única vez
+        # (sem percorrer a árvore) e grava o mapa no índice persistente
+        self._map_folder_messages(folder_id)
+        location = self._message_index.get(msg_id)
+        if location is None:
+            raise KeyError("Mensagem não encontrada")
+        return location
+
+    def _map_folder_messages(self, folder_id: str) -> None:
+        folder_obj = self._resolve_folder(folder_id)
         if not folder_obj:
+            return
+        found: List[Tuple[str, int]] = []
+        for j in range(self._count_messages(folder_obj)):
+            try:
+                msg = folder_obj.get_sub_message(j)
+            except Exception:
+                continue
+            msg_id = self._message_id(folder_id, msg, j)
+            self._message_index[msg_id] = (folder_id, j)
+            found.append((msg_id, j))
+        self._save_message_ids(folder_id, found, complete=True)
+
+    def _save_message_ids(self, folder_id: str, rows: Iterable[Tuple[str, int]], complete: bool = False) -> None:
+        # Ids posicionais ("@n") se resolvem sozinhos; só os estáveis vão para o índice
+        if self._sidecar is not None:
+            self._sidecar.save_message_ids(folder_id, [r for r in rows if not r[0].rpartition(":")[2].startswith("@")], complete)
+
+    def _resolve_message(self, composite_id: str):
+        folder_id, idx = self._locate_message(composite_id)
+        msg = self._sub_message(folder_id, idx)
+        if composite_id.rpartition(":")[2].startswith("@"):
+            if msg is None:
+                raise KeyError("Mensagem não encontrada")
+            return msg
+        if msg is not None and self._message_id(folder_id, msg, idx) == composite_id:
+            return msg
+        # Outra mensagem na posição (pasta regravada): remapeia e tenta de novo
+        for stale in [k for k, (fid, _j) in self._message_index.items() if fid == folder_id]:
+            del self._message_index[stale]
+        self._map_folder_messages(folder_id)
+        location = self._message_index.get(composite_id)
+        msg = self._sub_message(folder_id, location[1]) if location is not None else None
+        if msg is None:
             raise KeyError("Mensagem não encontrada")
+        return msg
+
+    def _sub_message(self, folder_id: str, position: int):
+        folder_obj = self._resolve_folder(folder_id)
+        if not folder_obj:
+            return None
         try:
-            return folder_obj.get_sub_message(idx)
-        except Exception as exc:
-            raise KeyError("Mensagem não encontrada") from exc
+            return folder_obj.get_sub_message(position)
+        except Exception:
+            return None
 
     def get_message(self, msg_id: str) -> PstEmail:
         msg = self._resolve_message(msg_id)
         return self._to_model_full(msg, msg_id)
 
     def export_eml(self, msg_id: str, out_path: str) -> None:
-        from src.utils.exporters import build_eml
+        with open(out_path, "wb") as f:
+            self.write_eml(msg_id, f)
 
-        model = self.get_message(msg_id)
-        content = build_eml(model)
-        with open(out_path, "w", encoding="utf-8", newline="\r\n") as f:
-            f.write(content)
+    def write_eml(self, msg_id: str, out: BinaryIO) -> int:
+        """Grava a mensagem em EML direto do PST (cabeçalhos originais, anexos em blocos)."""
+        msg = self._resolve_message(msg_id)
+        return MimeWriter(out).write_message(self._mime_message(msg))
 
-    def _is_embedded_message(self, attachment) -> bool:
-        for attr in ("is_embedded_message", "get_is_embedded_message"):
+    def _mime_message(self, msg) -> MimeMessage:
+        return MimeMessage(
+            subject=self._get_attr(msg, SUBJECT),
+            sender=self._get_attr(msg, SENDER),
+            to=self._get_attr(msg, DISPLAY_TO),
+            cc=self._get_attr(msg, DISPLAY_CC),
+            timestamp=to_utc(SUBMIT_TIME.get(msg)),
+            # Corpos como estão no PST (sem a normalização da visualização)
+            body_text=self._get_attr(msg, PLAIN_BODY) or None,
+            body_html=self._get_attr(msg, HTML_BODY) or None,
+            transport_headers=self._get_attr(msg, TRANSPORT_HEADERS),
+            attachments=self._iter_mime_attachments(msg),
+        )
+
+    def _iter_mime_attachments(self, msg) -> Iterator[MimeAttachment]:
+        # Gerador: cada anexo (e cada mensagem incorporada) é lido só quando o
+        # gravador chega nele
+        for i in range(self._count_attachments(msg)):
             try:
-                v = getattr(attachment, attr)
-                v = v() if callable(v) else v
-                if isinstance(v, bool):
-                    return v
+                att = msg.get_attachment(i)
             except Exception:
                 continue
-        try:
-            _ = getattr(attachment, "get_embedded_message")
-            return True
-        except Exception:
-            return False
+            name = self._get_attr(att, ATTACHMENT_NAME)
+            if self._is_embedded_message(att):
+                embedded = EMBEDDED_MESSAGE.get(att)
+                if embedded is not None:
+                    yield MimeAttachment(name, "message/rfc822", embedded=self._mime_message(embedded))
+                    continue
+                # Item sem acesso ao objeto da mensagem: o conteúdo bruto, se houver
+                name = name or f"mensagem_{i}.msg"
+                yield MimeAttachment(name, "application/vnd.ms-outlook", self.iter_attachment_chunks(att))
+                continue
+            name = self._sanitize_filename(name or f"anexo_{i}")
+            mime = self._get_attr(att, ATTACHMENT_MIME) or self._sniff_mime(name, None)
+            yield MimeAttachment(name, mime, self.iter_attachment_chunks(att))
+
+    def _is_embedded_message(self, attachment) -> bool:
+        v = IS_EMBEDDED.get(attachment)
+        if isinstance(v, bool):
+            return v
+        return has_attribute(attachment, "get_embedded_message")
 
     def _sanitize_filename(self, name: str) -> str:
-        name = name.strip().replace("\n", " ").replace("\r", " ")
-        name = re.sub(r"[<>:\\/\|\?\*]", "_", name)
-        return name or "anexo"
+        return sanitize_filename(name)
 
-    def _read_attachment_bytes(self, att) -> bytes | None:
-        size = None
-        for getter in ("size", "get_size", "data_size", "get_data_size"):
+    def _attachment_size(self, att) -> Optional[int]:
+        for accessor in ATTACHMENT_SIZE.accessors(att):
             try:
-                v = getattr(att, getter)
-                v = v() if callable(v) else v
-                if isinstance(v, int) and v > 0:
-                    size = v
-                    break
+                v = accessor(att)
             except Exception:
                 continue
+            if isinstance(v, int) and v > 0:
+                return v
+        return None
+
+    @traced(size=result_len)
+    def _read_attachment_bytes(self, att) -> bytes | None:
+        size = self._attachment_size(att)
         # 1) read_buffer(size)
         try:
             rb = getattr(att, "read_buffer", None)
             if callable(rb) and size:
+                self._seek_attachment(att, 0)
                 data = rb(size)
                 if data:
                     return data
@@ -190,13 +594,33 @@ class PypffAdapter:
             pass
         return None
 
+    def _seek_attachment(self, att, offset: int) -> None:
+        seek = getattr(att, "seek_offset", None)
+        if callable(seek):
+            seek(offset, os.SEEK_SET)
+
+    def _read_attachment_prefix(self, att, size: Optional[int]) -> bytes | None:
+        # Apenas o início do conteúdo, suficiente para detectar o tipo; sem
+        # read_buffer não há leitura parcial e o tipo vem só da extensão
+        rb = getattr(att, "read_buffer", None)
+        if not callable(rb) or not size:
+            return None
+        try:
+            self._seek_attachment(att, 0)
+            data = rb(min(size, SNIFF_BYTES))
+            self._seek_attachment(att, 0)
+            return data or None
+        except Exception:
+            return None
+
+    @traced()
     def _sniff_mime(self, name: str, data: bytes | None) -> str:
         # Prefer header/extension; if puremagic disponível e temos bytes, melhorar detecção
         guessed, _ = mimetypes.guess_type(name)
         if puremagic and data:
             try:
                 res = puremagic.from_string(data, mime=True)
-                if isinstance(res, str):
+                if isinstance(res, str) and res:
                     return res
                 if isinstance(res, list) and res:
                     return res[0]
@@ -204,134 +628,241 @@ class PypffAdapter:
                 pass
         return guessed or "application/octet-stream"
 
-    def get_attachments(self, msg_id: str) -> List[str]:
-        msg = self._resolve_message(msg_id)
-        display: List[str] = []
-        try:
-            ac = msg.number_of_attachments
-        except Exception:
-            ac = getattr(msg, "get_number_of_attachments", lambda: 0)()
-        for i in range(ac or 0):
+    def _count_attachments(self, msg) -> int:
+        return ATTACHMENT_COUNT.get(msg) or 0
+
+    @traced()
+    def _attachment_records(self, msg, sniff: bool = True) -> List[PstAttachment]:
+        # Somente metadados: o conteúdo dos anexos só é lido para detectar o
+        # tipo quando o PST não o informa (e sniff=True)
+        records: List[PstAttachment] = []
+        for i in range(self._count_attachments(msg)):
             try:
                 att = msg.get_attachment(i)
             except Exception:
                 continue
+            size = self._attachment_size(att) or 0
             if self._is_embedded_message(att):
-                display.append(f"mensagem incorporada {i} (message/rfc822)")
+                records.append(PstAttachment(index=i, name=f"mensagem_{i}.eml", size=size, mime_type="message/rfc822", is_embedded=True))
                 continue
-            name = self._get_attr(att, ("long_filename", "get_long_filename", "filename", "get_filename"), default=f"anexo_{i}")
+            name = self._get_attr(att, ATTACHMENT_NAME, default=f"anexo_{i}")
             name = self._sanitize_filename(name)
-            data = self._read_attachment_bytes(att)
-            mime = self._get_attr(att, ("mime_type", "get_mime_type", "mime_tag", "get_mime_tag", "content_type", "get_content_type"), default="")
-            mime = mime or self._sniff_mime(name, data)
-            display.append(f"{name} ({mime})")
-        return display
+            mime = self._get_attr(att, ATTACHMENT_MIME)
+            if not mime:
+                mime = self._sniff_mime(name, self._read_attachment_prefix(att, size) if sniff else None)
+            records.append(PstAttachment(index=i, name=name, size=size, mime_type=mime))
+        return records
 
-    def save_attachments(self, msg_id: str, output_dir: str) -> List[str]:
-        msg = self._resolve_message(msg_id)
-        saved: List[str] = []
-        os.makedirs(output_dir, exist_ok=True)
+    def iter_message_stats(
+        self, folder_id: str, start: int = 0, count: Optional[int] = None, metadata_only: bool = True
+    ) -> Iterator[MessageStat]:
+        """Métricas das mensagens da faixa, numa passada pela pasta.
+
+        ``metadata_only`` usa apenas tamanhos e tipos declarados no PST, sem
+        ler corpos nem conteúdo de anexos; senão, corpos sem tamanho
+        declarado são lidos e tipos ausentes detectados pelo conteúdo.
+        """
+        folder_obj = self._resolve_folder(folder_id)
+        if not folder_obj:
+            return
+        total = self._count_messages(folder_obj)
+        stop = total if count is None else min(total, start + count)
+        for j in range(max(start, 0), stop):
+            try:
+                msg = folder_obj.get_sub_message(j)
+            except Exception:
+                continue
+            subject, _sender, date, attachment_count = PREVIEW.read(msg)
+            attachments = self._attachment_records(msg, sniff=not metadata_only)
+            yield MessageStat(
+                id=self._message_id(folder_id, msg, j),
+                subject=self._as_text(subject),
+                epoch=to_epoch(date),
+                body_size=self._body_size(msg, metadata_only),
+                attachments=attachments,
+                attachment_count=attachment_count or len(attachments),
+            )
+
+    def iter_message_metadata(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[MessageMetadata]:
+        """Metadados da faixa só com valores declarados no PST (sem ler corpos nem anexos)."""
+        folder_obj = self._resolve_folder(folder_id)
+        if not folder_obj:
+            return
+        total = self._count_messages(folder_obj)
+        stop = total if count is None else min(total, start + count)
+        for j in range(max(start, 0), stop):
+            try:
+                msg = folder_obj.get_sub_message(j)
+            except Exception:
+                continue
+            subject, sender, date, attachment_count = PREVIEW.read(msg)
+            attachments = self._attachment_records(msg, sniff=False)
+            size = MESSAGE_SIZE.get(msg)
+            yield MessageMetadata(
+                id=self._message_id(folder_id, msg, j),
+                subject=self._as_text(subject),
+                sender=self._as_text(sender),
+                to=self._get_attr(msg, DISPLAY_TO),
+                cc=self._get_attr(msg, DISPLAY_CC),
+                sent=to_epoch(date),
+                delivered=to_epoch(DELIVERY_TIME.get(msg)),
+                created=to_epoch(CREATION_TIME.get(msg)),
+                size=size if isinstance(size, int) and size >= 0 else None,
+                body_size=self._body_size(msg, metadata_only=True),
+                attachments=attachments,
+                attachment_count=attachment_count or len(attachments),
+            )
+
+    def iter_thread_headers(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[MessageHeaders]:
+        """Prévia e cabeçalhos de encadeamento das mensagens da faixa (sem corpos nem anexos)."""
+        folder_obj = self._resolve_folder(folder_id)
+        if not folder_obj:
+            return
+        total = self._count_messages(folder_obj)
+        stop = total if count is None else min(total, start + count)
+        # Ids que vão para o índice de conversas: posições gravadas ao final
+        seen: List[Tuple[str, int]] = []
         try:
-            ac = msg.number_of_attachments
-        except Exception:
-            ac = getattr(msg, "get_number_of_attachments", lambda: 0)()
-        for i in range(ac or 0):
+            for j in range(max(start, 0), stop):
+                try:
+                    msg = folder_obj.get_sub_message(j)
+                except Exception:
+                    continue
+                subject, sender, date, attachment_count = PREVIEW.read(msg)
+                msg_id = self._message_id(folder_id, msg, j)
+                self._message_index[msg_id] = (folder_id, j)
+                seen.append((msg_id, j))
+                conversation = CONVERSATION_INDEX.get(msg)
+                yield MessageHeaders(
+                    id=msg_id,
+                    subject=self._as_text(subject),
+                    sender=self._as_text(sender),
+                    epoch=to_epoch(date),
+                    attachment_count=attachment_count or 0,
+                    transport_headers=self._get_attr(msg, TRANSPORT_HEADERS),
+                    conversation_index=bytes(conversation) if isinstance(conversation, (bytes, bytearray)) else None,
+                )
+        finally:
+            self._save_message_ids(folder_id, seen)
+
+    def _body_size(self, msg, metadata_only: bool) -> int:
+        sizes = [field.get(msg) for field in BODY_SIZES]
+        if any(isinstance(v, int) for v in sizes) or metadata_only:
+            return sum(v for v in sizes if isinstance(v, int) and v > 0)
+        total = 0
+        for field in (PLAIN_BODY, HTML_BODY, RTF_BODY):
+            v = field.get(msg)
+            if isinstance(v, str):
+                total += len(v.encode("utf-8"))
+            elif isinstance(v, (bytes, bytearray)):
+                total += len(v)
+        return total
+
+    def get_attachments(self, msg_id: str) -> List[PstAttachment]:
+        return self._attachment_records(self._resolve_message(msg_id))
+
+    def iter_attachment_data(self, msg_id: str) -> Iterator[Tuple[int, str, str, Iterator[bytes]]]:
+        msg = self._resolve_message(msg_id)
+        for i in range(self._count_attachments(msg)):
             try:
                 att = msg.get_attachment(i)
             except Exception:
                 continue
             if self._is_embedded_message(att):
                 continue
-            name = self._get_attr(att, ("long_filename", "get_long_filename", "filename", "get_filename"), default=f"anexo_{i}")
-            name = self._sanitize_filename(name)
-            data = self._read_attachment_bytes(att)
-            if not data:
-                continue
-            out_path = os.path.join(output_dir, name)
-            base, ext = os.path.splitext(out_path)
-            k = 1
-            while os.path.exists(out_path):
-                out_path = f"{base} ({k}){ext}"
-                k += 1
-            with open(out_path, "wb") as f:
-                f.write(data)
-            saved.append(out_path)
-        return saved
+            name = self._sanitize_filename(self._get_attr(att, ATTACHMENT_NAME, default=f"anexo_{i}"))
+            # Tipo declarado ou pela extensão: sem ler o conteúdo duas vezes
+            mime = self._get_attr(att, ATTACHMENT_MIME) or self._sniff_mime(name, None)
+            yield i, name, mime, self.iter_attachment_chunks(att)
 
-    # Helpers
-    def _get_attr(self, obj, names: Tuple[str, ...], default: str = "") -> str:
-        for n in names:
+    def iter_attachment_chunks(self, att, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Conteúdo do anexo em blocos; a memória usada não depende do tamanho do anexo."""
+        size = self._attachment_size(att)
+        rb = getattr(att, "read_buffer", None)
+        if callable(rb) and size:
             try:
-                v = getattr(obj, n)
-                if callable(v):
-                    v = v()
-                if v is None:
-                    continue
-                if isinstance(v, bytes):
-                    try:
-                        return v.decode("utf-8", errors="replace")
-                    except Exception:
-                        return default
-                return str(v)
+                self._seek_attachment(att, 0)
+                first = rb(min(chunk_size, size))
             except Exception:
-                continue
-        return default
+                first = None
+            if first:
+                yield first
+                remaining = size - len(first)
+                while remaining > 0:
+                    data = rb(min(chunk_size, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+                return
+        # Sem leitura parcial: único caminho é o conteúdo inteiro
+        data = self._read_attachment_bytes(att)
+        if data:
+            for offset in range(0, len(data), chunk_size):
+                yield data[offset : offset + chunk_size]
+
+    # Helpers
+    def _get_attr(self, obj, field: Field, default: str = "") -> str:
+        return self._as_text(field.get(obj), default)
+
+    def _as_text(self, v, default: str = "") -> str:
+        if v is None:
+            return default
+        if isinstance(v, bytes):
+            return v.decode("utf-8", errors="replace")
+        return str(v)
 
     def _normalize_text(self, text: str) -> str:
-        return (text or "").replace("\r\n", "\n").replace("\r", "\n")
+        return normalize_text(text)
 
     def _html_to_text(self, html: str) -> str:
-        try:
-            import html2text  # type: ignore
-
-            conv = html2text.HTML2Text()
-            conv.ignore_links = False
-            conv.ignore_images = True
-            conv.body_width = 0
-            text = conv.handle(html)
-            return self._normalize_text(text)
-        except Exception:
-            return self._normalize_text(html)
+        return html_to_text(html)
 
     def _to_model_preview(self, msg) -> PstEmail:
-        subject = self._get_attr(msg, ("subject", "get_subject"))
-        sender = self._get_attr(msg, ("sender_name", "get_sender_name", "sender_email_address", "get_sender_email_address"))
-        date = self._get_attr(msg, ("client_submit_time", "get_client_submit_time"))
+        subject, sender, date, attachments = PREVIEW.read(msg)
+        timestamp = to_utc(date)
         return PstEmail(
             id="",
-            subject=subject,
-            sender=sender,
+            subject=self._as_text(subject),
+            sender=self._as_text(sender),
             to="",
             cc="",
-            date=str(date) if date else None,
+            date=display_date(timestamp),
             body_text=None,
             body_html=None,
             attachments=[],
+            attachment_count=attachments or 0,
+            timestamp=timestamp,
         )
 
+    @traced()
     def _to_model_full(self, msg, msg_id: str) -> PstEmail:
-        subject = self._get_attr(msg, ("subject", "get_subject"))
-        sender = self._get_attr(msg, ("sender_name", "get_sender_name", "sender_email_address", "get_sender_email_address"))
-        to = self._get_attr(msg, ("display_to", "get_display_to"))
-        cc = self._get_attr(msg, ("display_cc", "get_display_cc"))
-        date = self._get_attr(msg, ("client_submit_time", "get_client_submit_time"))
-        body_text = self._get_attr(msg, ("plain_text_body", "get_plain_text_body"))
-        body_html = self._get_attr(msg, ("html_body", "get_html_body"))
+        subject = self._get_attr(msg, SUBJECT)
+        sender = self._get_attr(msg, SENDER)
+        to = self._get_attr(msg, DISPLAY_TO)
+        cc = self._get_attr(msg, DISPLAY_CC)
+        timestamp = to_utc(SUBMIT_TIME.get(msg))
+        body_text = self._get_attr(msg, PLAIN_BODY)
+        body_html = self._get_attr(msg, HTML_BODY)
         if not body_text and body_html:
             body_text = self._html_to_text(body_html)
         else:
             body_text = self._normalize_text(body_text)
             if body_html:
                 body_html = self._normalize_text(body_html)
-        names = self.get_attachments(msg_id)
+        attachments = self._attachment_records(msg)
         return PstEmail(
             id=msg_id,
             subject=subject,
             sender=sender,
             to=to,
             cc=cc,
-            date=str(date) if date else None,
+            date=display_date(timestamp),
             body_text=body_text or None,
             body_html=body_html or None,
-            attachments=names,
+            attachments=attachments,
+            attachment_count=len(attachments),
+            timestamp=timestamp,
+            delivery_time=to_utc(DELIVERY_TIME.get(msg)),
+            creation_time=to_utc(CREATION_TIME.get(msg)),
         )
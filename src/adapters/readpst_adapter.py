@@ -2,34 +2,542 @@
 @author João Gbriel de Almeida
 """
 
+from __future__ import annotations
+
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesHeaderParser, BytesParser
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+import base64
+import hashlib
+import mmap
+import os
+import re
 import shutil
-from typing import List
+import sqlite3
+import subprocess
+import tempfile
+import threading
+
+from src.models import MessageHeaders, MessageMetadata, MessageStat, PstAttachment, PstEmail, PstFolder
+from src.index.sorting import SortIndex, build_sort_index
+from src.instrumentation import result_len, traced
+from src.previews import PreviewBatch, epoch_from_text
+from src.utils.dates import DateLike, display_date, to_epoch, to_utc
+from src.utils.text import html_to_text, normalize_text
+
+INDEX_SCHEMA_VERSION = 2
+INDEX_NAME = "indice.sqlite"
+MAIL_DIR = "mail"
+# Arquivo criado por readpst -r em cada diretório de pasta
+MBOX_NAME = "mbox"
+# Caracteres base64 decodificados por vez na cópia de anexos (múltiplo de 4)
+B64_CHUNK = 4 * 256 * 1024
 
-from src.models import PstEmail, PstFolder
+_FROM_LINE = re.compile(rb"^From [^\n]*\n", re.M)
+# mboxrd: linhas ">From ", ">>From "... perderam um ">" na gravação
+_ESCAPED_FROM = re.compile(rb"^>(>*From )", re.M)
+_ATTACHMENT = re.compile(rb"^content-disposition:[ \t]*attachment", re.M | re.I)
+_HEADER_END = re.compile(rb"\r?\n\r?\n")
 
 
 class ReadPstAdapter:
-    def __init__(self) -> None:
+    """Leitura via readpst: o PST é convertido uma vez para mbox e servido daí.
+
+    A conversão fica num cache chaveado por caminho, tamanho e data do PST.
+    Cada mbox ganha um índice de deslocamentos (início/fim de cada mensagem e
+    cabeçalhos de prévia) em SQLite; as mensagens são lidas de fatias de um
+    ``mmap`` do arquivo, sem reprocessar o mbox inteiro.
+    """
+
+    def __init__(self, index_dir: Optional[str] = None) -> None:
         self._path: str | None = None
         if not shutil.which("readpst"):
             raise RuntimeError("readpst não encontrado no PATH")
+        self._index_dir = index_dir
+        self._cache_dir: Optional[str] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._nodes: Dict[str, PstFolder] = {}
+        self._children: Dict[Optional[str], List[str]] = {}
+        self._mbox_paths: Dict[str, str] = {}
+        self._maps: Dict[str, mmap.mmap] = {}
 
     def open(self, path: str) -> None:
-        # Estratégia futura: converter PST para mbox temporário e indexar
-        # No MVP, apenas valida a existência e falha com mensagem orientativa
-        self._path = path
-        raise RuntimeError(
-            "Fallback readpst ainda não implementado. Instale pypff/libpff para melhor experiência."
+        self.close()
+        self._path = os.path.abspath(path)
+        st = os.stat(self._path)
+        key = hashlib.sha1(f"{self._path}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8")).hexdigest()
+        base = self._index_dir or os.path.join(tempfile.gettempdir(), "pstreader")
+        self._cache_dir = os.path.join(base, "readpst", key)
+        self._convert()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._load_index()
+
+    def close(self) -> None:
+        with self._lock:
+            for mm in self._maps.values():
+                mm.close()
+            self._maps.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._nodes.clear()
+            self._children.clear()
+            self._mbox_paths.clear()
+
+    @property
+    def index_path(self) -> Optional[str]:
+        return os.path.join(self._cache_dir, INDEX_NAME) if self._cache_dir else None
+
+    # Conversão e índice
+    @traced()
+    def _convert(self) -> None:
+        done_marker = os.path.join(self._cache_dir, ".completo")
+        if os.path.exists(done_marker):
+            return
+        # Converte num diretório temporário: uma conversão interrompida não
+        # deixa cache pela metade
+        tmp = self._cache_dir + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(os.path.join(tmp, MAIL_DIR))
+        result = subprocess.run(
+            ["readpst", "-q", "-r", "-8", "-o", os.path.join(tmp, MAIL_DIR), self._path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if result.returncode != 0:
+            shutil.rmtree(tmp, ignore_errors=True)
+            detail = result.stderr.decode("utf-8", "replace").strip()
+            raise RuntimeError(f"readpst falhou ({result.returncode}): {detail}")
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        os.replace(tmp, self._cache_dir)
+        with open(done_marker, "w", encoding="utf-8") as f:
+            f.write(self._path)
+
+    def _load_index(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'mbox_schema'").fetchone()
+            if not row or row[0] != str(INDEX_SCHEMA_VERSION):
+                self._build_index()
+            for folder_id, parent_id, name, rel, subs, count in self._conn.execute(
+                "SELECT id, parent_id, name, rel, subfolder_count, message_count FROM folders ORDER BY parent_id, position"
+            ):
+                self._nodes[folder_id] = PstFolder(
+                    id=folder_id, name=name, children=[], subfolder_count=subs, message_count=count
+                )
+                self._children.setdefault(parent_id, []).append(folder_id)
+                self._mbox_paths[folder_id] = os.path.join(self._cache_dir, MAIL_DIR, rel, MBOX_NAME)
+        for parent_id, child_ids in self._children.items():
+            if parent_id in self._nodes:
+                self._nodes[parent_id].children = [self._nodes[c] for c in child_ids]
+
+    @traced()
+    def _build_index(self) -> None:
+        conn = self._conn
+        for table in ("folders", "messages"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(
+            "CREATE TABLE folders (id TEXT PRIMARY KEY, parent_id TEXT, position INTEGER, name TEXT,"
+            " rel TEXT, subfolder_count INTEGER, message_count INTEGER)"
+        )
+        conn.execute(
+            "CREATE TABLE messages (folder_id TEXT, position INTEGER, start INTEGER, end INTEGER,"
+            " subject TEXT, sender TEXT, date TEXT, attachment_count INTEGER, timestamp INTEGER,"
+            " PRIMARY KEY (folder_id, position))"
+        )
+        conn.execute("CREATE INDEX messages_time ON messages (folder_id, timestamp)")
+        mail_root = os.path.join(self._cache_dir, MAIL_DIR)
+
+        def walk(rel: str, parent_id: Optional[str]) -> None:
+            try:
+                names = sorted(e.name for e in os.scandir(os.path.join(mail_root, rel)) if e.is_dir())
+            except OSError:
+                names = []
+            for position, name in enumerate(names):
+                child_rel = os.path.join(rel, name) if rel else name
+                folder_id = "r" + hashlib.sha1(child_rel.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+                count = self._index_mbox(folder_id, os.path.join(mail_root, child_rel, MBOX_NAME))
+                subs = sum(1 for e in os.scandir(os.path.join(mail_root, child_rel)) if e.is_dir())
+                conn.execute(
+                    "INSERT INTO folders VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (folder_id, parent_id, position, name, child_rel, subs, count),
+                )
+                walk(child_rel, folder_id)
+
+        walk("", None)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('mbox_schema', ?)", (str(INDEX_SCHEMA_VERSION),))
+
+    @traced()
+    def _index_mbox(self, folder_id: str, mbox_path: str) -> int:
+        try:
+            if os.path.getsize(mbox_path) == 0:
+                return 0
+            f = open(mbox_path, "rb")
+        except OSError:
+            return 0
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            matches = [(m.start(), m.end()) for m in _FROM_LINE.finditer(mm)]
+            starts = [m[1] for m in matches]
+            separators = [m[0] for m in matches[1:]] + [len(mm)]
+            rows = []
+            parser = BytesHeaderParser(policy=policy.default)
+            for position, (start, end) in enumerate(zip(starts, separators)):
+                # Linha em branco antes do próximo "From " não faz parte da mensagem
+                while end > start and mm[end - 1:end] in (b"\n", b"\r"):
+                    end -= 1
+                end += 2 if mm[end:end + 2] == b"\r\n" else (1 if mm[end:end + 1] == b"\n" else 0)
+                match = _HEADER_END.search(mm, start, end)
+                header_end = match.start() if match else end
+                try:
+                    headers = parser.parsebytes(mm[start:header_end])
+                    subject = str(headers.get("Subject", "") or "")
+                    sender = str(headers.get("From", "") or "")
+                    timestamp = to_utc(headers.get("Date"))
+                except Exception:
+                    subject, sender, timestamp = "", "", None
+                attachments = sum(1 for _ in _ATTACHMENT.finditer(mm, header_end, end))
+                rows.append(
+                    (folder_id, position, start, end, subject, sender, display_date(timestamp), attachments, to_epoch(timestamp))
+                )
+        self._conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    # Pastas
+    def get_root_folders(self) -> List[PstFolder]:
+        return [self._nodes[c] for c in self._children.get(None, [])]
+
+    def get_sub_folders(self, folder_id: str) -> List[PstFolder]:
+        self._require_folder(folder_id)
+        return [self._nodes[c] for c in self._children.get(folder_id, [])]
+
+    def _require_folder(self, folder_id: str) -> PstFolder:
+        node = self._nodes.get(folder_id)
+        if node is None:
+            raise KeyError(f"Pasta não encontrada: {folder_id}")
+        return node
+
+    # Mensagens
+    def list_messages(self, folder_id: str, since: DateLike = None, until: DateLike = None) -> List[PstEmail]:
+        if since is None and until is None:
+            return list(self.iter_messages(folder_id))
+        self._require_folder(folder_id)
+        since_epoch, until_epoch = to_epoch(since), to_epoch(until)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, subject, sender, date, attachment_count FROM messages"
+                " WHERE folder_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY position",
+                (folder_id, -(2**63) if since_epoch is None else since_epoch, 2**63 - 1 if until_epoch is None else until_epoch),
+            ).fetchall()
+        return [self._preview(folder_id, *row) for row in rows]
+
+    def count_messages(self, folder_id: str) -> int:
+        return self._require_folder(folder_id).message_count
+
+    def iter_messages(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[PstEmail]:
+        self._require_folder(folder_id)
+        limit = -1 if count is None else count
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, subject, sender, date, attachment_count FROM messages"
+                " WHERE folder_id = ? AND position >= ? ORDER BY position LIMIT ?",
+                (folder_id, start, limit),
+            ).fetchall()
+        for row in rows:
+            yield self._preview(folder_id, *row)
+
+    def _preview(self, folder_id: str, position: int, subject: str, sender: str, date: Optional[str], attachments: int) -> PstEmail:
+        return PstEmail(
+            id=f"{folder_id}:{position}",
+            subject=subject,
+            sender=sender,
+            to="",
+            cc="",
+            date=date,
+            body_text=None,
+            body_html=None,
+            attachments=[],
+            attachment_count=attachments,
+            timestamp=to_utc(date),
         )
 
-    def get_root_folders(self) -> List[PstFolder]:  # pragma: no cover
-        raise NotImplementedError
+    def preview_batch(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> PreviewBatch:
+        self._require_folder(folder_id)
+        batch = PreviewBatch(folder_id, start)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, subject, sender, date, attachment_count FROM messages"
+                " WHERE folder_id = ? AND position >= ? ORDER BY position LIMIT ?",
+                (folder_id, start, -1 if count is None else count),
+            ).fetchall()
+        for position, subject, sender, date, attachments in rows:
+            batch.append(f"{folder_id}:{position}", subject, sender, epoch_from_text(date), attachments, position)
+        return batch
+
+    def preview_batch_at(self, folder_id: str, positions: List[int]) -> PreviewBatch:
+        self._require_folder(folder_id)
+        batch = PreviewBatch(folder_id)
+        by_position = {}
+        with self._lock:
+            for i in range(0, len(positions), 500):
+                chunk = list(positions[i : i + 500])
+                for row in self._conn.execute(
+                    "SELECT position, subject, sender, date, attachment_count FROM messages"
+                    f" WHERE folder_id = ? AND position IN ({','.join('?' * len(chunk))})",
+                    [folder_id, *chunk],
+                ):
+                    by_position[row[0]] = row
+        for position in positions:
+            row = by_position.get(position)
+            if row is not None:
+                _, subject, sender, date, attachments = row
+                batch.append(f"{folder_id}:{position}", subject, sender, epoch_from_text(date), attachments, position)
+        return batch
+
+    def sort_index(self, folder_id: str, key: str) -> SortIndex:
+        # A conversão não muda enquanto o PST estiver aberto: o ``PstReader`` guarda em memória
+        return build_sort_index(self.preview_batch(folder_id), key)
+
+    def index_messages(self, folder_id: str, start: int, count: int) -> Optional[int]:
+        # O índice de deslocamentos é completo desde a conversão
+        return None
+
+    def _locate(self, msg_id: str) -> Tuple[mmap.mmap, int, int]:
+        folder_id, _, position = msg_id.rpartition(":")
+        self._require_folder(folder_id)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT start, end FROM messages WHERE folder_id = ? AND position = ?",
+                (folder_id, int(position) if position.isdigit() else -1),
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"Mensagem não encontrada: {msg_id}")
+            mm = self._folder_map(folder_id)
+        return mm, row[0], row[1]
+
+    def _folder_map(self, folder_id: str) -> mmap.mmap:
+        mm = self._maps.get(folder_id)
+        if mm is None:
+            with open(self._mbox_paths[folder_id], "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[folder_id] = mm
+        return mm
+
+    @traced(size=result_len)
+    def _raw_message(self, msg_id: str) -> bytes:
+        mm, start, end = self._locate(msg_id)
+        data = mm[start:end]
+        return _ESCAPED_FROM.sub(rb"\1", data) if _ESCAPED_FROM.search(mm, start, end) else data
+
+    @traced()
+    def _parse(self, msg_id: str) -> EmailMessage:
+        return BytesParser(policy=policy.default).parsebytes(self._raw_message(msg_id))
+
+    def get_message(self, msg_id: str) -> PstEmail:
+        msg = self._parse(msg_id)
+        body_text = _part_text(msg.get_body(preferencelist=("plain",)))
+        body_html = _part_text(msg.get_body(preferencelist=("html",)))
+        if not body_text and body_html:
+            body_text = html_to_text(body_html)
+        attachments = [att for att, _part in self._attachment_parts(msg)]
+        timestamp = to_utc(msg.get("Date"))
+        return PstEmail(
+            id=msg_id,
+            subject=str(msg.get("Subject", "") or ""),
+            sender=str(msg.get("From", "") or ""),
+            to=str(msg.get("To", "") or ""),
+            cc=str(msg.get("Cc", "") or ""),
+            date=display_date(timestamp),
+            body_text=normalize_text(body_text) if body_text else None,
+            body_html=body_html or None,
+            attachments=attachments,
+            attachment_count=len(attachments),
+            timestamp=timestamp,
+            delivery_time=_delivery_time(msg),
+        )
+
+    def export_eml(self, msg_id: str, out_path: str) -> None:
+        with open(out_path, "wb") as f:
+            self.write_eml(msg_id, f)
+
+    def write_eml(self, msg_id: str, out: BinaryIO) -> int:
+        # A mensagem do mbox já é o EML original (cabeçalhos e anexos completos)
+        mm, start, end = self._locate(msg_id)
+        if _ESCAPED_FROM.search(mm, start, end):
+            data = _ESCAPED_FROM.sub(rb"\1", mm[start:end])
+            out.write(data)
+            return len(data)
+        # Sem linhas escapadas: grava a fatia do mmap diretamente
+        with memoryview(mm) as view:
+            out.write(view[start:end])
+        return end - start
+
+    # Anexos
+    def _attachment_parts(self, msg: EmailMessage) -> Iterator[Tuple[PstAttachment, EmailMessage]]:
+        for i, part in enumerate(msg.iter_attachments()):
+            mime = part.get_content_type()
+            embedded = mime == "message/rfc822"
+            name = part.get_filename() or ("" if embedded else f"anexo_{i}")
+            yield PstAttachment(
+                index=i, name=name, size=_part_size(part), mime_type=mime, is_embedded=embedded
+            ), part
+
+    def iter_message_stats(
+        self, folder_id: str, start: int = 0, count: Optional[int] = None, metadata_only: bool = True
+    ) -> Iterator[MessageStat]:
+        """Métricas da faixa; só metadados = índice de deslocamentos, sem ler o mbox.
+
+        Nesse modo ``body_size`` é o tamanho bruto da mensagem (corpo e
+        anexos codificados) e dos anexos só se conhece a contagem.
+        """
+        self._require_folder(folder_id)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, subject, start, end, timestamp, attachment_count FROM messages"
+                " WHERE folder_id = ? AND position >= ? ORDER BY position LIMIT ?",
+                (folder_id, start, -1 if count is None else count),
+            ).fetchall()
+        for position, subject, begin, end, timestamp, attachment_count in rows:
+            msg_id = f"{folder_id}:{position}"
+            if metadata_only:
+                yield MessageStat(msg_id, subject, timestamp, end - begin, [], attachment_count)
+                continue
+            msg = self._parse(msg_id)
+            body_size = sum(
+                _part_size(part)
+                for part in (msg.get_body(preferencelist=("plain",)), msg.get_body(preferencelist=("html",)))
+                if part is not None
+            )
+            attachments = [att for att, _part in self._attachment_parts(msg)]
+            yield MessageStat(msg_id, subject, timestamp, body_size, attachments, len(attachments))
+
+    def iter_message_metadata(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[MessageMetadata]:
+        """Metadados da faixa: cabeçalhos do mmap; a mensagem só é analisada se tiver anexos."""
+        self._require_folder(folder_id)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, subject, sender, timestamp, attachment_count, start, end FROM messages"
+                " WHERE folder_id = ? AND position >= ? ORDER BY position LIMIT ?",
+                (folder_id, start, -1 if count is None else count),
+            ).fetchall()
+            mm = self._folder_map(folder_id) if rows else None
+        parser = BytesHeaderParser(policy=policy.default)
+        for position, subject, sender, timestamp, attachment_count, begin, end in rows:
+            msg_id = f"{folder_id}:{position}"
+            match = _HEADER_END.search(mm, begin, end)
+            header_end = match.start() if match else end
+            try:
+                headers = parser.parsebytes(mm[begin:header_end])
+                to, cc = str(headers.get("To", "") or ""), str(headers.get("Cc", "") or "")
+                delivered = to_epoch(_delivery_time(headers))
+            except Exception:
+                to, cc, delivered = "", "", None
+            attachments: List[PstAttachment] = []
+            # Corpo = mensagem menos cabeçalhos (codificado, como no mbox)
+            body_size = end - (match.end() if match else end)
+            if attachment_count:
+                msg = self._parse(msg_id)
+                attachments = [att for att, _part in self._attachment_parts(msg)]
+                body_size = sum(
+                    _part_size(part)
+                    for part in (msg.get_body(preferencelist=("plain",)), msg.get_body(preferencelist=("html",)))
+                    if part is not None
+                )
+            yield MessageMetadata(
+                id=msg_id,
+                subject=subject,
+                sender=sender,
+                to=to,
+                cc=cc,
+                sent=timestamp,
+                delivered=delivered,
+                created=None,
+                size=end - begin,
+                body_size=body_size,
+                attachments=attachments,
+                attachment_count=len(attachments) if attachment_count else 0,
+            )
+
+    def iter_thread_headers(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[MessageHeaders]:
+        """Prévias do índice e o bloco de cabeçalhos de cada mensagem, lido do mmap."""
+        self._require_folder(folder_id)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, subject, sender, timestamp, attachment_count, start, end FROM messages"
+                " WHERE folder_id = ? AND position >= ? ORDER BY position LIMIT ?",
+                (folder_id, start, -1 if count is None else count),
+            ).fetchall()
+            mm = self._folder_map(folder_id) if rows else None
+        for position, subject, sender, timestamp, attachment_count, begin, end in rows:
+            match = _HEADER_END.search(mm, begin, end)
+            header_end = match.start() if match else end
+            yield MessageHeaders(
+                id=f"{folder_id}:{position}",
+                subject=subject,
+                sender=sender,
+                epoch=timestamp,
+                attachment_count=attachment_count,
+                transport_headers=mm[begin:header_end].decode("utf-8", "replace"),
+            )
+
+    def get_attachments(self, msg_id: str) -> List[PstAttachment]:
+        return [att for att, _part in self._attachment_parts(self._parse(msg_id))]
+
+    def iter_attachment_data(self, msg_id: str) -> Iterator[Tuple[int, str, str, Iterator[bytes]]]:
+        for att, part in self._attachment_parts(self._parse(msg_id)):
+            if not att.is_embedded:
+                yield att.index, att.name, att.mime_type, _iter_part_chunks(part)
+
+
+def _delivery_time(msg: EmailMessage):
+    # O Received mais recente (o primeiro) foi adicionado na entrega
+    received = msg.get("Received")
+    if not received:
+        return None
+    return to_utc(str(received).rpartition(";")[2])
+
+
+def _part_text(part) -> str:
+    if part is None:
+        return ""
+    try:
+        return part.get_content()
+    except (LookupError, ValueError):
+        payload = part.get_payload(decode=True) or b""
+        return payload.decode("utf-8", "replace")
+
 
-    def list_messages(self, folder_id: str) -> List[PstEmail]:  # pragma: no cover
-        raise NotImplementedError
+def _part_size(part) -> int:
+    if part.get_content_type() == "message/rfc822":
+        return len(part.as_bytes())
+    payload = part.get_payload()
+    if isinstance(payload, str) and part.get("Content-Transfer-Encoding", "").lower() == "base64":
+        # Estimativa sem decodificar: 3 bytes por 4 caracteres
+        data = "".join(payload.split())
+        return len(data) * 3 // 4 - data[-2:].count("=")
+    return len(part.get_payload(decode=True) or b"")
 
-    def get_message(self, msg_id: str) -> PstEmail:  # pragma: no cover
-        raise NotImplementedError
 
-    def export_eml(self, msg_id: str, out_path: str) -> None:  # pragma: no cover
-        raise NotImplementedError
+def _iter_part_chunks(part) -> Iterator[bytes]:
+    payload = part.get_payload()
+    if not (isinstance(payload, str) and part.get("Content-Transfer-Encoding", "").lower() == "base64"):
+        yield part.get_payload(decode=True) or b""
+        return
+    # base64 decodificado em blocos: a cópia do anexo não dobra em memória
+    pending: List[str] = []
+    size = 0
+    for line in payload.splitlines():
+        line = line.strip()
+        pending.append(line)
+        size += len(line)
+        if size >= B64_CHUNK:
+            data = "".join(pending)
+            cut = len(data) - len(data) % 4
+            yield base64.b64decode(data[:cut])
+            pending = [data[cut:]]
+            size = len(pending[0])
+    data = "".join(pending)
+    if data:
+        yield base64.b64decode(data + "=" * (-len(data) % 4))
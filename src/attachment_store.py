@@ -0,0 +1,263 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+
+from src.instrumentation import count, traced
+from src.models import StoredAttachment
+from src.utils.exporters import NameAllocator, sanitize_filename
+
+MANIFEST_NAME = "manifest.sqlite"
+OBJECTS_DIR = "objects"
+SCHEMA_VERSION = 1
+# Conteúdo até este tamanho fica em memória até o hash ser conhecido; acima
+# disso vai para um temporário, renomeado para o blob (ou descartado se repetido)
+SPOOL_BYTES = 8 * 1024 * 1024
+LINK_MODES = ("hardlink", "copy")
+
+
+class AttachmentStore:
+    """Repositório de anexos endereçado pelo conteúdo.
+
+    Cada conteúdo é gravado uma única vez em ``objects/ab/cdef...`` (hash do
+    conteúdo); o manifesto SQLite liga (PST, mensagem, índice, nome original)
+    ao hash. Com ``link_mode`` os anexos também aparecem na pasta de cada
+    mensagem como hardlinks para o blob (ou cópias, se o sistema de arquivos
+    não permitir o link).
+    """
+
+    def __init__(
+        self,
+        root: str,
+        hash_name: str = "sha256",
+        link_mode: Optional[str] = None,
+        spool_bytes: int = SPOOL_BYTES,
+    ) -> None:
+        if link_mode is not None and link_mode not in LINK_MODES:
+            raise ValueError(f"Modo de link inválido: {link_mode} (use {', '.join(LINK_MODES)})")
+        self.root = os.path.abspath(root)
+        self.hash_name = hash_name
+        self.link_mode = link_mode
+        self.spool_bytes = spool_bytes
+        self.objects_dir = os.path.join(self.root, OBJECTS_DIR)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.root, MANIFEST_NAME), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Uma transação por mensagem: em WAL, NORMAL não faz fsync a cada commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        # Alocador da última pasta de mensagem: listada uma vez, não a cada anexo
+        self._names: Optional[NameAllocator] = None
+        self._temp_seq = 0
+
+    def _init_schema(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row and row[0] != str(SCHEMA_VERSION):
+                raise RuntimeError(f"Manifesto com esquema {row[0]} (esperado {SCHEMA_VERSION}): use outro diretório")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'hash'").fetchone()
+            if row and row[0] != self.hash_name:
+                raise RuntimeError(f"Repositório criado com {row[0]}, não {self.hash_name}")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, mime_type TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS attachments ("
+                " source TEXT, message_id TEXT, idx INTEGER, name TEXT, digest TEXT, path TEXT,"
+                " PRIMARY KEY (source, message_id, idx))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS attachments_digest ON attachments (digest)")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)", [("schema", str(SCHEMA_VERSION)), ("hash", self.hash_name)]
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def __enter__(self) -> "AttachmentStore":
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+    # Blobs
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    @traced(size=lambda r: r[1])
+    def put(self, chunks: Iterable[bytes]) -> Tuple[str, int, bool]:
+        """Grava o conteúdo se ainda não existir; devolve (hash, tamanho, novo)."""
+        hasher = hashlib.new(self.hash_name)
+        pending: List[bytes] = []
+        size = 0
+        spill = None
+        spill_path = None
+        try:
+            for chunk in chunks:
+                hasher.update(chunk)
+                size += len(chunk)
+                if spill is not None:
+                    spill.write(chunk)
+                    continue
+                pending.append(chunk)
+                if size > self.spool_bytes:
+                    spill_path = self._temp_path()
+                    spill = open(spill_path, "xb")
+                    spill.writelines(pending)
+                    pending = []
+            if spill is not None:
+                spill.close()
+            digest = hasher.hexdigest()
+            target = self.blob_path(digest)
+            if os.path.exists(target):
+                count("store.duplicate", size)
+                return digest, size, False
+            if spill_path is None:
+                # Pequeno e inédito: só agora vai para o disco
+                spill_path = self._temp_path()
+                with open(spill_path, "xb") as f:
+                    f.writelines(pending)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Renomeação atômica: um blob nunca fica pela metade
+            os.replace(spill_path, target)
+            spill_path = None
+            count("store.written", size)
+            return digest, size, True
+        finally:
+            if spill is not None and not spill.closed:
+                spill.close()
+            if spill_path is not None:
+                os.remove(spill_path)
+
+    def _temp_path(self) -> str:
+        # Nome único por processo/thread; "xb" cria com as permissões normais (umask)
+        self._temp_seq += 1
+        return os.path.join(self.tmp_dir, f"{os.getpid()}-{threading.get_ident()}-{self._temp_seq}.tmp")
+
+    def link(self, digest: str, link_dir: str, name: str) -> str:
+        """Coloca o blob em ``link_dir`` com o nome original (sem colidir com existentes)."""
+        names = self._names
+        if names is None or names.output_dir != link_dir:
+            os.makedirs(link_dir, exist_ok=True)
+            names = self._names = NameAllocator(link_dir)
+        out_path = names.reserve(sanitize_filename(name))
+        blob = self.blob_path(digest)
+        if self.link_mode == "hardlink":
+            try:
+                os.link(blob, out_path)
+                return out_path
+            except OSError:
+                # Outro volume, FAT ou limite de links por arquivo: copiar
+                pass
+        shutil.copyfile(blob, out_path)
+        return out_path
+
+    # Mensagens
+    def stored(self, source: str, message_id: str) -> Optional[List[StoredAttachment]]:
+        """Anexos já registrados da mensagem (None se ela ainda não passou pelo repositório)."""
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT 1 FROM attachments WHERE source = ? AND message_id = ? AND idx = -1", (source, message_id)
+            ).fetchone()
+            if not done:
+                return None
+            rows = self._conn.execute(
+                "SELECT a.idx, a.name, b.size, a.digest, a.path FROM attachments a JOIN blobs b ON b.digest = a.digest"
+                " WHERE a.source = ? AND a.message_id = ? AND a.idx >= 0 ORDER BY a.idx",
+                (source, message_id),
+            ).fetchall()
+        return [
+            StoredAttachment(message_id, idx, name, size, digest, self.blob_path(digest), False, path)
+            for idx, name, size, digest, path in rows
+        ]
+
+    def store_message(
+        self,
+        source: str,
+        message_id: str,
+        attachments: Iterable[Tuple[int, str, str, Iterable[bytes]]],
+        link_dir: Optional[str] = None,
+    ) -> List[StoredAttachment]:
+        """Grava os anexos de uma mensagem (``iter_attachment_data`` do adaptador).
+
+        O manifesto da mensagem é gravado numa transação só, com uma linha
+        marcadora (``idx = -1``): uma extração interrompida recomeça da
+        mensagem seguinte à última concluída.
+        """
+        previous = self.stored(source, message_id)
+        if previous is not None:
+            return previous
+        items: List[StoredAttachment] = []
+        blobs = []
+        for index, name, mime, chunks in attachments:
+            digest, size, new = self.put(chunks)
+            if not size:
+                continue
+            path = self.link(digest, link_dir, name) if self.link_mode and link_dir else None
+            items.append(StoredAttachment(message_id, index, name, size, digest, self.blob_path(digest), new, path))
+            blobs.append((digest, size, mime or None))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)", blobs)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO attachments VALUES (?, ?, ?, ?, ?, ?)",
+                [(source, message_id, a.index, a.name, a.digest, a.path) for a in items]
+                + [(source, message_id, -1, "", "", None)],
+            )
+        return items
+
+    # Consulta
+    def iter_manifest(self) -> Iterator[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT a.source, a.message_id, a.idx, a.name, a.digest, b.size, b.mime_type, a.path"
+                " FROM attachments a JOIN blobs b ON b.digest = a.digest"
+                " WHERE a.idx >= 0 ORDER BY a.source, a.message_id, a.idx"
+            ).fetchall()
+        for source, message_id, idx, name, digest, size, mime, path in rows:
+            yield {
+                "source": source,
+                "message_id": message_id,
+                "index": idx,
+                "name": name,
+                self.hash_name: digest,
+                "size": size,
+                "mime_type": mime,
+                "blob": os.path.relpath(self.blob_path(digest), self.root),
+                "path": path,
+            }
+
+    def export_manifest(self, path: str) -> int:
+        """Manifesto em JSON lines (uma linha por anexo); devolve o número de linhas."""
+        n = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.iter_manifest():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                n += 1
+        return n
+
+    def summary(self) -> dict:
+        with self._lock:
+            attachments, logical = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM attachments a JOIN blobs b ON b.digest = a.digest WHERE a.idx >= 0"
+            ).fetchone()
+            blobs, stored = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {
+            "attachments": attachments,
+            "blobs": blobs,
+            "logical_bytes": logical,
+            "stored_bytes": stored,
+            "saved_bytes": logical - stored,
+        }
@@ -0,0 +1,285 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import time
+
+from src.models import PstFolder
+from src.pst_reader import PstReader
+from src.utils.exporters import MboxrdWriter, build_txt, mbox_from_line, sanitize_filename
+from src.utils.workers import init_worker_reader, worker_reader
+
+FORMATS = ("eml", "mbox", "txt")
+MBOX_NAME = "mensagens.mbox"
+PARTS_DIR = ".partes"
+
+
+@dataclass
+class ExportShard:
+    folder_id: str
+    rel_dir: str
+    start: int
+    count: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.folder_id}:{self.start}"
+
+
+@dataclass
+class ExportProgress:
+    shards_done: int = 0
+    shards_total: int = 0
+    messages: int = 0
+    bytes_written: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def messages_per_sec(self) -> float:
+        return self.messages / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.bytes_written / (1024 * 1024) / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BulkExporter:
+    """Exporta pastas inteiras (ou o PST todo) para EML, mbox ou txt.
+
+    As pastas viram diretórios espelhando a hierarquia do PST. O trabalho é
+    dividido em fatias de ``shard_size`` mensagens distribuídas num pool de
+    processos; cada processo abre seu próprio handle pypff. Fatias concluídas
+    ficam registradas no arquivo de checkpoint, permitindo retomar a exportação
+    com o mesmo ``shard_size`` (com outro, ela recomeça do zero).
+    """
+
+    def __init__(
+        self,
+        pst_path: str,
+        out_dir: str,
+        fmt: str = "eml",
+        workers: Optional[int] = None,
+        shard_size: int = 1000,
+        index_dir: Optional[str] = None,
+        checkpoint_path: Optional[str] = None,
+        on_progress: Optional[Callable[[ExportProgress], None]] = None,
+    ) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato inválido: {fmt} (use {', '.join(FORMATS)})")
+        self.pst_path = os.path.abspath(pst_path)
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.shard_size = max(1, shard_size)
+        self.index_dir = index_dir
+        self.checkpoint_path = checkpoint_path or os.path.join(out_dir, ".export-checkpoint.json")
+        self.on_progress = on_progress
+
+    # Planejamento
+    def plan(self, reader: PstReader, folder_ids: Optional[Iterable[str]] = None) -> List[ExportShard]:
+        wanted = set(folder_ids) if folder_ids else None
+        shards: List[ExportShard] = []
+
+        def walk(folders: List[PstFolder], parent_dir: str, selected: bool) -> None:
+            used: Dict[str, int] = {}
+            for folder in folders:
+                name = sanitize_filename(folder.name or "", default="Pasta")
+                # Pastas irmãs com o mesmo nome ganham sufixo
+                n = used.get(name.lower(), 0)
+                used[name.lower()] = n + 1
+                rel_dir = os.path.join(parent_dir, name if n == 0 else f"{name} ({n})")
+                take = selected or wanted is None or folder.id in wanted
+                if take:
+                    total = reader.count_messages(folder.id)
+                    for start in range(0, total, self.shard_size):
+                        shards.append(ExportShard(folder.id, rel_dir, start, min(self.shard_size, total - start)))
+                walk(reader.get_sub_folders(folder.id), rel_dir, take and wanted is not None)
+
+        walk(reader.get_root_folders(), "", False)
+        return shards
+
+    # Execução
+    def run(self, folder_ids: Optional[Iterable[str]] = None) -> ExportProgress:
+        started = time.perf_counter()
+        reader = PstReader(index_dir=self.index_dir)
+        try:
+            reader.open(self.pst_path)
+            progress = self._run(reader, folder_ids, started)
+        finally:
+            reader.close()
+        progress.elapsed = time.perf_counter() - started
+        return progress
+
+    def _run(self, reader: PstReader, folder_ids: Optional[Iterable[str]], started: float) -> ExportProgress:
+        shards = self.plan(reader, folder_ids)
+        checkpoint = self._load_checkpoint()
+        done_keys = set(checkpoint["done"])
+        if not done_keys and self.fmt == "mbox":
+            # Recomeço: partes de uma exportação anterior (com outras fatias)
+            # não podem entrar no mbox junto com as novas
+            self._clear_mbox_parts({s.rel_dir for s in shards})
+        pending = [s for s in shards if s.key not in done_keys]
+
+        progress = ExportProgress(
+            shards_done=len(shards) - len(pending),
+            shards_total=len(shards),
+            messages=checkpoint["messages"],
+            bytes_written=checkpoint["bytes"],
+        )
+
+        def record(key: str, messages: int, nbytes: int, errors: List[str]) -> None:
+            done_keys.add(key)
+            progress.shards_done += 1
+            progress.messages += messages
+            progress.bytes_written += nbytes
+            progress.errors.extend(errors)
+            progress.elapsed = time.perf_counter() - started
+            self._save_checkpoint(done_keys, progress)
+            if self.on_progress:
+                self.on_progress(progress)
+
+        if self.workers <= 1:
+            # Sem pool: reaproveita o leitor já aberto
+            for shard in pending:
+                record(*_export_shard_with(reader, shard, self.out_dir, self.fmt))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_worker_reader,
+                initargs=(self.pst_path, self.index_dir),
+            ) as pool:
+                futures = [pool.submit(_export_shard, shard, self.out_dir, self.fmt) for shard in pending]
+                for future in as_completed(futures):
+                    record(*future.result())
+
+        if self.fmt == "mbox":
+            self._merge_mbox_parts({s.rel_dir for s in shards})
+        return progress
+
+    def _clear_mbox_parts(self, rel_dirs: Iterable[str]) -> None:
+        for rel_dir in rel_dirs:
+            parts_dir = os.path.join(self.out_dir, rel_dir, PARTS_DIR)
+            if os.path.isdir(parts_dir):
+                for part in os.listdir(parts_dir):
+                    os.remove(os.path.join(parts_dir, part))
+
+    def _merge_mbox_parts(self, rel_dirs: Iterable[str]) -> None:
+        for rel_dir in rel_dirs:
+            folder_dir = os.path.join(self.out_dir, rel_dir)
+            parts_dir = os.path.join(folder_dir, PARTS_DIR)
+            if not os.path.isdir(parts_dir):
+                continue
+            parts = sorted(os.listdir(parts_dir))
+            with open(os.path.join(folder_dir, MBOX_NAME), "wb") as out:
+                for part in parts:
+                    with open(os.path.join(parts_dir, part), "rb") as f:
+                        while True:
+                            chunk = f.read(1024 * 1024)
+                            if not chunk:
+                                break
+                            out.write(chunk)
+            # Partes só são apagadas depois do mbox completo
+            for part in parts:
+                os.remove(os.path.join(parts_dir, part))
+            os.rmdir(parts_dir)
+
+    # Checkpoint
+    def _load_checkpoint(self) -> dict:
+        empty = {"done": [], "messages": 0, "bytes": 0}
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        # Chaves são "pasta:início": com outro tamanho de fatia não valem mais
+        if (data.get("pst"), data.get("format"), data.get("shard_size")) != (self.pst_path, self.fmt, self.shard_size):
+            return empty
+        return {"done": data.get("done", []), "messages": data.get("messages", 0), "bytes": data.get("bytes", 0)}
+
+    def _save_checkpoint(self, done_keys: Iterable[str], progress: ExportProgress) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "pst": self.pst_path,
+                    "format": self.fmt,
+                    "shard_size": self.shard_size,
+                    "done": sorted(done_keys),
+                    "messages": progress.messages,
+                    "bytes": progress.bytes_written,
+                },
+                f,
+            )
+        os.replace(tmp, self.checkpoint_path)
+
+
+def _export_shard(shard: ExportShard, out_dir: str, fmt: str) -> Tuple[str, int, int, List[str]]:
+    return _export_shard_with(worker_reader(), shard, out_dir, fmt)
+
+
+def _export_shard_with(reader: PstReader, shard: ExportShard, out_dir: str, fmt: str) -> Tuple[str, int, int, List[str]]:
+    folder_dir = os.path.join(out_dir, shard.rel_dir)
+    os.makedirs(folder_dir, exist_ok=True)
+    messages = 0
+    nbytes = 0
+    errors: List[str] = []
+    part = None
+    if fmt == "mbox":
+        parts_dir = os.path.join(folder_dir, PARTS_DIR)
+        os.makedirs(parts_dir, exist_ok=True)
+        part = open(os.path.join(parts_dir, f"{shard.start:010d}.part"), "wb")
+    try:
+        # Posição real de cada mensagem (não start + k): mensagens puladas
+        # pelo adaptador não deslocam os nomes das seguintes
+        batch = reader.preview_batch(shard.folder_id, shard.start, shard.count)
+        for k in range(len(batch)):
+            msg_id, position = batch.ids[k], batch.positions[k]
+            try:
+                if fmt == "eml":
+                    path = os.path.join(folder_dir, _message_filename(position, batch.subjects[k], ".eml"))
+                    reader.export_eml(msg_id, path)
+                    nbytes += os.path.getsize(path)
+                elif fmt == "mbox":
+                    # Mesmo EML do export_eml (cabeçalhos originais e anexos), em streaming
+                    entry_start = part.tell()
+                    try:
+                        from_line = mbox_from_line(batch.senders[k]).encode("utf-8")
+                        part.write(from_line)
+                        body = MboxrdWriter(part)
+                        reader.write_eml(msg_id, body)
+                        body.finish()
+                    except Exception:
+                        # Entrada pela metade não fica no mbox
+                        part.seek(entry_start)
+                        part.truncate()
+                        raise
+                    nbytes += len(from_line) + body.written
+                else:
+                    msg = reader.get_message(msg_id)
+                    data = build_txt(msg).encode("utf-8")
+                    path = os.path.join(folder_dir, _message_filename(position, msg.subject, ".txt"))
+                    with open(path, "wb") as f:
+                        f.write(data)
+                    nbytes += len(data)
+                messages += 1
+            except Exception as exc:
+                errors.append(f"{msg_id}: {exc}")
+    finally:
+        if part is not None:
+            part.close()
+    return shard.key, messages, nbytes, errors
+
+
+def _message_filename(position: int, subject: str, ext: str) -> str:
+    # Posição no início mantém nomes únicos e determinísticos (retomada)
+    subject = sanitize_filename(subject or "", default="sem assunto")[:80].rstrip(". ")
+    return f"{position:06d} - {subject}{ext}"
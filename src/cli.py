@@ -0,0 +1,537 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from typing import Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import sys
+
+from src import instrumentation
+from src.index.sidecar import default_index_dir
+from src.index.sorting import parse_sort_spec, sort_batch
+from src.models import PstFolder
+from src.previews import NO_DATE, PreviewBatch
+from src.pst_reader import PstReader
+from src.utils.dates import display_date, to_utc
+
+
+def open_reader(args: argparse.Namespace, lazy: bool = True) -> PstReader:
+    reader = PstReader(index_dir=None if args.no_index else args.index_dir, lazy_folders=lazy)
+    reader.open(args.pst)
+    return reader
+
+
+def select_folders(reader: PstReader, folder_ids: Optional[List[str]]) -> Iterator[Tuple[PstFolder, str, int]]:
+    wanted = set(folder_ids or [])
+    for folder, path, depth in reader.walk_folders():
+        if not wanted or folder.id in wanted:
+            yield folder, path, depth
+
+
+def emit(obj) -> None:
+    sys.stdout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+
+def preview_record(batch: PreviewBatch, k: int, folder_id: str, path: str) -> dict:
+    epoch = batch.dates[k]
+    return {
+        "id": batch.ids[k],
+        "folder_id": folder_id,
+        "folder": path,
+        "subject": batch.subjects[k],
+        "sender": batch.senders[k],
+        "date": batch.date_text(k) or None,
+        "timestamp": None if epoch == NO_DATE else epoch,
+        "attachments": batch.attachment_counts[k],
+    }
+
+
+def sort_spec_arg(text: str):
+    try:
+        return parse_sort_spec(text)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from exc
+
+
+def date_arg(text: str):
+    value = to_utc(text)
+    if value is None:
+        raise argparse.ArgumentTypeError(f"Data inválida: {text!r} (use AAAA-MM-DD[ HH:MM[:SS]])")
+    return value
+
+
+# Subcomandos
+def cmd_tree(args: argparse.Namespace) -> int:
+    reader = open_reader(args)
+    for folder, path, depth in reader.walk_folders():
+        if args.json:
+            emit({"id": folder.id, "path": path, "depth": depth, "subfolders": folder.subfolder_count, "messages": folder.message_count})
+        else:
+            sys.stdout.write(f"{'  ' * depth}{folder.name} [{folder.id}] ({folder.message_count})\n")
+    return 0
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    reader = open_reader(args)
+    for folder, path, _depth in select_folders(reader, args.folder):
+        if args.since or args.until:
+            # Filtro de datas resolvido pelo índice quando a pasta está indexada
+            batch = PreviewBatch.from_emails(reader.list_messages(folder.id, args.since, args.until), folder.id)
+            if args.sort:
+                batch = sort_batch(batch, [(key, reverse != args.reverse) for key, reverse in args.sort])
+            for k in range(len(batch)):
+                emit(preview_record(batch, k, folder.id, path))
+            continue
+        if args.sort:
+            spec = [(key, reverse != args.reverse) for key, reverse in args.sort]
+            # Ordem pré-calculada (posições); prévias lidas em páginas nessa ordem
+            order = reader.sort_order(folder.id, spec)
+            for start in range(0, len(order), 1000):
+                batch = reader.preview_batch_at(folder.id, order[start : start + 1000].tolist())
+                for k in range(len(batch)):
+                    emit(preview_record(batch, k, folder.id, path))
+            continue
+        for batch in reader.iter_preview_batches(folder.id):
+            for k in range(len(batch)):
+                emit(preview_record(batch, k, folder.id, path))
+    return 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    from src.bulk_export import BulkExporter
+
+    def on_progress(p) -> None:
+        sys.stderr.write(
+            f"\r{p.shards_done}/{p.shards_total} fatias, {p.messages} mensagens, "
+            f"{p.messages_per_sec:.1f} msg/s, {p.mb_per_sec:.2f} MB/s"
+        )
+        sys.stderr.flush()
+
+    exporter = BulkExporter(
+        args.pst,
+        args.out,
+        fmt=args.format,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        index_dir=None if args.no_index else args.index_dir,
+        checkpoint_path=args.checkpoint,
+        on_progress=None if args.quiet else on_progress,
+    )
+    progress = exporter.run(args.folder)
+    if not args.quiet:
+        sys.stderr.write("\n")
+    emit(
+        {
+            "messages": progress.messages,
+            "bytes": progress.bytes_written,
+            "seconds": round(progress.elapsed, 3),
+            "messages_per_sec": round(progress.messages_per_sec, 1),
+            "mb_per_sec": round(progress.mb_per_sec, 3),
+            "errors": progress.errors,
+        }
+    )
+    return 1 if progress.errors else 0
+
+
+def cmd_extract(args: argparse.Namespace) -> int:
+    # IDs de mensagem avulsos precisam da árvore completa para resolver a pasta
+    reader = open_reader(args, lazy=not args.message)
+    if args.message:
+        targets = [(msg_id, os.path.join(args.out, _safe_dir(msg_id))) for msg_id in args.message]
+    else:
+        targets = (
+            (batch.ids[k], os.path.join(args.out, *path.split("/"), _safe_dir(batch.ids[k])))
+            for folder, path, _depth in select_folders(reader, args.folder)
+            for batch in reader.iter_preview_batches(folder.id)
+            for k in range(len(batch))
+            if batch.attachment_counts[k]
+        )
+    if args.dedup:
+        return _extract_dedup(args, reader, targets)
+    for msg_id, out_dir in targets:
+        for item in reader.extract_attachments(msg_id, out_dir, hash_name=None if args.no_hash else "sha256"):
+            emit({"message_id": msg_id, "name": item.name, "path": item.path, "size": item.size, "sha256": item.digest})
+    return 0
+
+
+def _extract_dedup(args: argparse.Namespace, reader: PstReader, targets) -> int:
+    from src.attachment_store import AttachmentStore
+
+    # Conteúdo em <out>/objects, manifesto em <out>/manifest.sqlite e links em <out>/mensagens
+    links_root = os.path.join(args.out, "mensagens")
+    with AttachmentStore(args.out, link_mode=args.link) as store:
+        for msg_id, out_dir in targets:
+            link_dir = os.path.join(links_root, os.path.relpath(out_dir, args.out))
+            for item in reader.store_attachments(msg_id, store, link_dir):
+                emit(
+                    {
+                        "message_id": msg_id,
+                        "name": item.name,
+                        "blob": item.blob_path,
+                        "path": item.path,
+                        "size": item.size,
+                        "sha256": item.digest,
+                        "new": item.new,
+                    }
+                )
+        if args.manifest:
+            store.export_manifest(args.manifest)
+        if not args.quiet:
+            sys.stderr.write(json.dumps(store.summary()) + "\n")
+    return 0
+
+
+def cmd_search(args: argparse.Namespace) -> int:
+    reader = open_reader(args)
+    if reader.index_path is None:
+        # Sem índice: varredura das prévias (assunto/remetente)
+        term = args.query.lower()
+        for folder, path, _depth in select_folders(reader, args.folder):
+            for batch in reader.iter_preview_batches(folder.id):
+                for k in range(len(batch)):
+                    if term in batch.subjects[k].lower() or term in batch.senders[k].lower():
+                        emit(preview_record(batch, k, folder.id, path))
+        return 0
+
+    from src.index.search import SearchIndex, update_search_index
+
+    index = SearchIndex(reader.index_path)
+    try:
+        if not args.no_update:
+            def on_folder(path: str, count: int) -> None:
+                sys.stderr.write(f"indexado: {path} ({count})\n")
+
+            update_search_index(reader, index, on_folder=on_folder)
+        paths = {folder.id: path for folder, path, _depth in reader.walk_folders()}
+        for hit in index.search(args.query, folder_ids=args.folder, limit=args.limit):
+            emit(
+                {
+                    "id": hit.msg_id,
+                    "folder_id": hit.folder_id,
+                    "folder": paths.get(hit.folder_id),
+                    "subject": hit.subject,
+                    "sender": hit.sender,
+                    "date": hit.date,
+                    "rank": round(hit.rank, 4),
+                }
+            )
+    finally:
+        index.close()
+    return 0
+
+
+def cmd_thread(args: argparse.Namespace) -> int:
+    reader = open_reader(args)
+    if reader.index_path is None:
+        raise RuntimeError("conversas precisam do índice persistente (sem --no-index)")
+
+    from src.index.threads import ThreadIndex, update_thread_index
+
+    index = ThreadIndex(reader.index_path)
+    try:
+        if not args.no_update:
+            def on_folder(path: str, count: int) -> None:
+                sys.stderr.write(f"conversas: {path} ({count})\n")
+
+            update_thread_index(reader, index, on_folder=on_folder)
+        paths = {folder.id: path for folder, path, _depth in reader.walk_folders()}
+        if args.message:
+            thread = index.load_thread(args.message)
+            if not thread:
+                raise KeyError(f"Mensagem fora do índice de conversas: {args.message}")
+            for msg in thread:
+                emit(
+                    {
+                        "id": msg.msg_id,
+                        "parent_id": msg.parent_id,
+                        "depth": msg.depth,
+                        "folder_id": msg.folder_id,
+                        "folder": paths.get(msg.folder_id),
+                        "subject": msg.subject,
+                        "sender": msg.sender,
+                        "date": display_date(msg.epoch),
+                        "attachments": msg.attachment_count,
+                    }
+                )
+            return 0
+        for summary in index.list_threads(args.folder, min_size=args.min_size, limit=args.limit):
+            emit(
+                {
+                    "thread_id": summary.thread_id,
+                    "messages": summary.size,
+                    "first_id": summary.msg_id,
+                    "subject": summary.subject,
+                    "first_date": display_date(summary.first_epoch),
+                    "last_date": display_date(summary.last_epoch),
+                }
+            )
+    finally:
+        index.close()
+    return 0
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    from src.stats import StatsEngine
+
+    def on_progress(done: int, total: int) -> None:
+        sys.stderr.write(f"\r{done}/{total} fatias")
+        if done == total:
+            sys.stderr.write("\n")
+
+    engine = StatsEngine(
+        args.pst,
+        metadata_only=not args.full,
+        workers=args.workers,
+        top=args.top,
+        index_dir=None if args.no_index else args.index_dir,
+        on_progress=None if args.quiet else on_progress,
+    )
+    report = engine.run(open_reader(args), folder_ids=args.folder)
+    emit(report.to_dict(args.top))
+    return 0
+
+
+def cmd_metadata(args: argparse.Namespace) -> int:
+    from src.metadata_export import MetadataExporter
+
+    def on_progress(p) -> None:
+        sys.stderr.write(f"\r{p.shards_done}/{p.shards_total} fatias, {p.rows} linhas, {p.rows_per_sec:.1f} msg/s")
+        sys.stderr.flush()
+
+    exporter = MetadataExporter(
+        args.pst,
+        args.out,
+        fmt=args.format,
+        workers=args.workers,
+        chunk_rows=args.chunk_rows,
+        index_dir=None if args.no_index else args.index_dir,
+        on_progress=None if args.quiet else on_progress,
+    )
+    progress = exporter.run(open_reader(args), folder_ids=args.folder)
+    if not args.quiet:
+        sys.stderr.write("\n")
+    emit(
+        {
+            "format": exporter.fmt,
+            "rows": progress.rows,
+            "chunks": progress.chunks,
+            "seconds": round(progress.elapsed, 3),
+            "rows_per_sec": round(progress.rows_per_sec, 1),
+            "errors": progress.errors,
+        }
+    )
+    return 1 if progress.errors else 0
+
+
+def open_session(args: argparse.Namespace):
+    from src.session import PstSession
+
+    session = PstSession(index_dir=None if args.no_index else args.index_dir, workers=args.parallel)
+    for path, _entry, error in session.open_many(args.pst):
+        if error is not None:
+            sys.stderr.write(f"erro: {path}: {error}\n")
+    return session
+
+
+def cmd_search_all(args: argparse.Namespace) -> int:
+    from concurrent.futures import ThreadPoolExecutor
+    from src.index.search import SearchIndex, update_search_index
+
+    if args.no_index:
+        raise ValueError("search-all precisa do índice persistente (sem --no-index)")
+    session = open_session(args)
+    try:
+        entries = session.entries()
+        if not args.no_update:
+            def update(entry) -> None:
+                # Handle próprio por PST: as atualizações correm em paralelo
+                with session.lease(entry.key) as reader:
+                    index = SearchIndex(reader.index_path)
+                    try:
+                        update_search_index(reader, index)
+                    finally:
+                        index.close()
+
+            with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+                list(pool.map(update, [e for e in entries if e.index_path]))
+        paths = {e.key: e.path for e in entries}
+        for key, hit in session.search(args.query, limit=args.limit):
+            emit(
+                {
+                    "pst": paths[key],
+                    "id": hit.msg_id,
+                    "folder_id": hit.folder_id,
+                    "subject": hit.subject,
+                    "sender": hit.sender,
+                    "date": hit.date,
+                    "rank": round(hit.rank, 4),
+                }
+            )
+    finally:
+        session.close()
+    return 0
+
+
+def cmd_export_all(args: argparse.Namespace) -> int:
+    session = open_session(args)
+
+    def on_progress(key: str, p) -> None:
+        sys.stderr.write(f"{session.entry(key).name}: {p.shards_done}/{p.shards_total} fatias, {p.messages} mensagens\n")
+
+    try:
+        results = session.export(args.out, args.format, args.workers, on_progress=None if args.quiet else on_progress)
+        errors = 0
+        for entry in session.entries():
+            progress = results.get(entry.key)
+            if progress is None:
+                continue
+            errors += len(progress.errors)
+            emit(
+                {
+                    "pst": entry.path,
+                    "messages": progress.messages,
+                    "bytes": progress.bytes_written,
+                    "seconds": round(progress.elapsed, 3),
+                    "errors": progress.errors,
+                }
+            )
+    finally:
+        session.close()
+    return 1 if errors else 0
+
+
+def _safe_dir(msg_id: str) -> str:
+    return msg_id.replace(":", "_").replace("@", "")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Leitor de PST em linha de comando")
+    base = argparse.ArgumentParser(add_help=False)
+    base.add_argument("--index-dir", default=default_index_dir(), help="diretório do índice persistente")
+    base.add_argument("--no-index", action="store_true", help="não usar o índice persistente")
+    base.add_argument("--trace", default=None, help="gravar spans/contadores de tempo neste arquivo ao terminar")
+    base.add_argument(
+        "--trace-format", choices=("json", "chrome"), default=None, help="formato do --trace (padrão: chrome se *.trace.json)"
+    )
+    common = argparse.ArgumentParser(add_help=False, parents=[base])
+    common.add_argument("pst", help="arquivo .pst")
+    # Vários PSTs numa sessão (abertos em paralelo)
+    multi = argparse.ArgumentParser(add_help=False, parents=[base])
+    multi.add_argument("pst", nargs="+", help="arquivos .pst")
+    multi.add_argument("--parallel", type=int, default=4, help="PSTs processados ao mesmo tempo")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("tree", parents=[common], help="árvore de pastas")
+    p.add_argument("--json", action="store_true", help="uma pasta por linha em JSON")
+    p.set_defaults(func=cmd_tree)
+
+    p = sub.add_parser("list", parents=[common], help="mensagens em JSON lines")
+    p.add_argument("--folder", action="append", help="ID da pasta (repetível; padrão: todas)")
+    p.add_argument(
+        "--sort",
+        type=sort_spec_arg,
+        default=None,
+        help="ordenar cada pasta: coluna[:asc|desc] separadas por vírgula (subject, sender, date)",
+    )
+    p.add_argument("--reverse", action="store_true", help="inverter todas as chaves")
+    p.add_argument("--since", type=date_arg, default=None, help="só mensagens enviadas a partir desta data (UTC)")
+    p.add_argument("--until", type=date_arg, default=None, help="só mensagens enviadas antes desta data (UTC)")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("export", parents=[common], help="exportação em massa")
+    p.add_argument("out", help="diretório de saída")
+    p.add_argument("--format", choices=("eml", "mbox", "txt"), default="eml")
+    p.add_argument("--folder", action="append", help="ID da pasta (repetível; padrão: todas)")
+    p.add_argument("--workers", type=int, default=None, help="processos (padrão: núcleos da CPU)")
+    p.add_argument("--shard-size", type=int, default=1000, help="mensagens por fatia")
+    p.add_argument("--checkpoint", default=None, help="arquivo de checkpoint para retomada")
+    p.add_argument("--quiet", action="store_true", help="sem progresso no stderr")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("extract", parents=[common], help="extrair anexos")
+    p.add_argument("out", help="diretório de saída")
+    p.add_argument("--folder", action="append", help="ID da pasta (repetível; padrão: todas)")
+    p.add_argument("--message", action="append", help="ID da mensagem (repetível)")
+    p.add_argument("--no-hash", action="store_true", help="não calcular SHA-256")
+    p.add_argument("--dedup", action="store_true", help="repositório por conteúdo: cada anexo gravado uma vez (SHA-256)")
+    p.add_argument("--link", choices=("hardlink", "copy"), default=None, help="com --dedup: anexos também na pasta de cada mensagem")
+    p.add_argument("--manifest", default=None, help="com --dedup: exportar o manifesto em JSON lines")
+    p.add_argument("--quiet", action="store_true", help="sem resumo no stderr")
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("search", parents=[common], help="buscar mensagens (índice de texto completo)")
+    p.add_argument("query", help='consulta: termos, "frase", campo:termo (subject, from, to, body, attachment), -termo')
+    p.add_argument("--folder", action="append", help="ID da pasta (repetível; padrão: todas)")
+    p.add_argument("--limit", type=int, default=100, help="máximo de resultados")
+    p.add_argument("--no-update", action="store_true", help="não atualizar o índice antes da busca")
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("thread", parents=[common], help="conversas de todas as pastas (Message-ID/References)")
+    p.add_argument("--message", default=None, help="ID de uma mensagem: a conversa dela em árvore (uma linha por mensagem)")
+    p.add_argument("--folder", default=None, help="sem --message: só conversas com mensagens desta pasta")
+    p.add_argument("--min-size", type=int, default=2, help="sem --message: mínimo de mensagens por conversa")
+    p.add_argument("--limit", type=int, default=100, help="sem --message: máximo de conversas (mais recentes primeiro)")
+    p.add_argument("--no-update", action="store_true", help="não atualizar o índice de conversas antes da consulta")
+    p.set_defaults(func=cmd_thread)
+
+    p = sub.add_parser("stats", parents=[common], help="estatísticas do PST em JSON")
+    p.add_argument("--folder", action="append", help="ID da pasta (repetível; padrão: todas)")
+    p.add_argument("--full", action="store_true", help="ler corpos/anexos sem tamanho ou tipo declarado")
+    p.add_argument("--workers", type=int, default=1, help="processos em paralelo (por fatia de pasta)")
+    p.add_argument("--top", type=int, default=10, help="quantos maiores itens listar")
+    p.add_argument("--quiet", action="store_true", help="sem progresso no stderr")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("metadata", parents=[common], help="metadados de todas as mensagens (JSONL, CSV ou colunar)")
+    p.add_argument("out", help="arquivo de saída")
+    p.add_argument(
+        "--format",
+        choices=("jsonl", "csv", "columnar"),
+        default=None,
+        help="formato (padrão: pela extensão; .pstcol é colunar, senão jsonl)",
+    )
+    p.add_argument("--folder", action="append", help="ID da pasta (repetível; padrão: todas)")
+    p.add_argument("--workers", type=int, default=1, help="processos em paralelo (por fatia de pasta)")
+    p.add_argument("--chunk-rows", type=int, default=5000, help="linhas por bloco gravado")
+    p.add_argument("--quiet", action="store_true", help="sem progresso no stderr")
+    p.set_defaults(func=cmd_metadata)
+
+    p = sub.add_parser("search-all", parents=[multi], help="buscar em vários PSTs ao mesmo tempo")
+    p.add_argument("--query", "-q", required=True, help="consulta (mesma sintaxe de search)")
+    p.add_argument("--limit", type=int, default=100, help="máximo de resultados no total")
+    p.add_argument("--no-update", action="store_true", help="não atualizar os índices antes da busca")
+    p.set_defaults(func=cmd_search_all)
+
+    p = sub.add_parser("export-all", parents=[multi], help="exportar vários PSTs ao mesmo tempo")
+    p.add_argument("--out", required=True, help="diretório de saída (uma subpasta por PST)")
+    p.add_argument("--format", choices=("eml", "mbox", "txt"), default="eml")
+    p.add_argument("--workers", type=int, default=1, help="processos por PST")
+    p.add_argument("--quiet", action="store_true", help="sem progresso no stderr")
+    p.set_defaults(func=cmd_export_all)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        instrumentation.enable()
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # Saída fechada (ex.: "| head"): encerrar em silêncio
+        sys.stderr.close()
+        return 0
+    except (RuntimeError, KeyError, ValueError) as exc:
+        sys.stderr.write(f"erro: {exc}\n")
+        return 2
+    finally:
+        if args.trace:
+            instrumentation.export(args.trace, args.trace_format)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+import hashlib
+import re
+import sqlite3
+import threading
+
+from src.index.sidecar import source_signature
+from src.index.threads import ThreadIndex, update_thread_index
+from src.models import PstEmail
+
+SEARCH_SCHEMA_VERSION = 3
+# Texto de corpo indexado por mensagem
+MAX_BODY_CHARS = 200_000
+
+# Campos aceitos em consultas "campo:termo" -> coluna FTS
+FIELD_ALIASES = {
+    "subject": "subject",
+    "assunto": "subject",
+    "from": "sender",
+    "de": "sender",
+    "to": "recipients",
+    "para": "recipients",
+    "cc": "recipients",
+    "body": "body",
+    "corpo": "body",
+    "attachment": "attachments",
+    "anexo": "attachments",
+}
+
+_TOKEN = re.compile(r'(-?)(?:(\w+):)?("[^"]*"|\S+)')
+
+
+@dataclass
+class SearchHit:
+    msg_id: str
+    folder_id: str
+    subject: str
+    sender: str
+    date: Optional[str]
+    rank: float
+
+    def to_email(self) -> PstEmail:
+        return PstEmail(
+            id=self.msg_id,
+            subject=self.subject,
+            sender=self.sender,
+            to="",
+            cc="",
+            date=self.date,
+            body_text=None,
+            body_html=None,
+            attachments=[],
+        )
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Converte a consulta do usuário em expressão MATCH do FTS5.
+
+    Termos soltos buscam em todos os campos (por prefixo); ``campo:termo``
+    restringe a um campo; aspas buscam frase exata; ``-termo`` exclui.
+    """
+    positives: List[str] = []
+    negatives: List[str] = []
+    for neg, field, term in _TOKEN.findall(query):
+        column = FIELD_ALIASES.get(field.lower()) if field else None
+        if field and column is None:
+            # Prefixo desconhecido: tratar "x:y" como texto comum
+            term = f"{field}:{term}"
+        if term.startswith('"') and term.endswith('"') and len(term) >= 2:
+            text = term[1:-1]
+            expr = '"' + text.replace('"', '""') + '"'
+        else:
+            text = term
+            expr = '"' + text.replace('"', '""') + '"*'
+        if not text.strip():
+            continue
+        if column:
+            expr = f"{column} : {expr}"
+        (negatives if neg else positives).append(expr)
+    if not positives:
+        return None
+    match = " AND ".join(positives)
+    for expr in negatives:
+        match = f"({match}) NOT {expr}"
+    return match
+
+
+class SearchIndex:
+    """Índice invertido (SQLite FTS5) guardado no arquivo do índice persistente.
+
+    Cobre assunto, remetente, destinatários, corpo (texto ou HTML convertido)
+    e nomes de anexos de todas as pastas; é atualizado pasta a pasta conforme
+    o número de mensagens muda.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'search_schema'").fetchone()
+            if row and row[0] != str(SEARCH_SCHEMA_VERSION):
+                for table in ("search_fts", "search_docs", "search_folders"):
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_docs ("
+                " id INTEGER PRIMARY KEY, msg_id TEXT UNIQUE, folder_id TEXT,"
+                " subject TEXT, sender TEXT, date TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS search_docs_folder ON search_docs (folder_id)")
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+                " subject, sender, recipients, body, attachments,"
+                " tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_folders ("
+                " folder_id TEXT PRIMARY KEY, message_count INTEGER, source TEXT, fingerprint TEXT)"
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('search_schema', ?)", (str(SEARCH_SCHEMA_VERSION),))
+
+    # Manutenção
+    def folder_state(self, folder_id: str) -> Optional[Tuple[int, Optional[str], Optional[str]]]:
+        """(contagem, estado do PST, resumo das prévias) da última indexação da pasta."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_count, source, fingerprint FROM search_folders WHERE folder_id = ?", (folder_id,)
+            ).fetchone()
+            return (row[0], row[1], row[2]) if row else None
+
+    def is_current(self, folder_id: str, message_count: int, source: Optional[str] = None) -> bool:
+        """Pasta indexada com a mesma contagem e do mesmo estado do PST (``source_signature``)."""
+        state = self.folder_state(folder_id)
+        return state is not None and state[:2] == (message_count, source)
+
+    def clear_folder(self, folder_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM search_fts WHERE rowid IN (SELECT id FROM search_docs WHERE folder_id = ?)", (folder_id,)
+            )
+            self._conn.execute("DELETE FROM search_docs WHERE folder_id = ?", (folder_id,))
+            self._conn.execute("DELETE FROM search_folders WHERE folder_id = ?", (folder_id,))
+
+    def add_messages(self, folder_id: str, messages: Iterable[PstEmail]) -> None:
+        with self._lock, self._conn:
+            for msg in messages:
+                cur = self._conn.execute(
+                    "INSERT OR REPLACE INTO search_docs (msg_id, folder_id, subject, sender, date) VALUES (?, ?, ?, ?, ?)",
+                    (msg.id, folder_id, msg.subject, msg.sender, msg.date),
+                )
+                body = (msg.body_text or "")[:MAX_BODY_CHARS]
+                names = " ".join(att.name for att in msg.attachments)
+                self._conn.execute(
+                    "INSERT INTO search_fts (rowid, subject, sender, recipients, body, attachments) VALUES (?, ?, ?, ?, ?, ?)",
+                    (cur.lastrowid, msg.subject, msg.sender, f"{msg.to} {msg.cc}", body, names),
+                )
+
+    def finish_folder(
+        self, folder_id: str, message_count: int, source: Optional[str] = None, fingerprint: Optional[str] = None
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_folders VALUES (?, ?, ?, ?)", (folder_id, message_count, source, fingerprint)
+            )
+
+    def prune(self, folder_ids: Iterable[str]) -> None:
+        """Remove pastas que não existem mais no PST."""
+        keep = set(folder_ids)
+        with self._lock:
+            known = [r[0] for r in self._conn.execute("SELECT DISTINCT folder_id FROM search_docs")]
+        for folder_id in known:
+            if folder_id not in keep:
+                self.clear_folder(folder_id)
+
+    # Consulta
+    def search(self, query: str, folder_ids: Optional[Iterable[str]] = None, limit: int = 500) -> List[SearchHit]:
+        match = build_match_query(query)
+        if match is None:
+            return []
+        sql = (
+            "SELECT d.msg_id, d.folder_id, d.subject, d.sender, d.date,"
+            " bm25(search_fts, 5.0, 3.0, 2.0, 1.0, 2.0) AS score"
+            " FROM search_fts JOIN search_docs d ON d.id = search_fts.rowid"
+            " WHERE search_fts MATCH ?"
+        )
+        params: List = [match]
+        folder_ids = list(folder_ids or [])
+        if folder_ids:
+            sql += f" AND d.folder_id IN ({','.join('?' * len(folder_ids))})"
+            params.extend(folder_ids)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            try:
+                rows = self._conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as exc:
+                raise ValueError(f"Consulta inválida: {query}") from exc
+        return [SearchHit(*row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def update_search_index(
+    reader,
+    index: SearchIndex,
+    stop: Optional[threading.Event] = None,
+    on_folder: Optional[Callable[[str, int], None]] = None,
+) -> Tuple[int, int]:
+    """Indexa as pastas novas ou alteradas; retorna (pastas, mensagens) indexadas.
+
+    PST sem gravações desde a indexação (tamanho/mtime, como no índice
+    persistente): nada é lido. Gravado: cada pasta com a mesma contagem é
+    comparada pelo resumo das prévias (``folder_fingerprint``) e só as que
+    mudaram são refeitas; edições só no corpo, sem mudar as prévias, não são
+    vistas.
+    """
+    folders = 0
+    messages = 0
+    seen: List[str] = []
+    source = source_signature(reader.path)
+    for folder, path, _depth in reader.walk_folders():
+        if stop is not None and stop.is_set():
+            return folders, messages
+        seen.append(folder.id)
+        count = reader.count_messages(folder.id)
+        state = index.folder_state(folder.id)
+        if state is not None and state[:2] == (count, source):
+            continue
+        fingerprint = folder_fingerprint(reader, folder.id)
+        if state is not None and (state[0], state[2]) == (count, fingerprint):
+            # Outra parte do PST foi gravada; esta pasta continua igual
+            index.finish_folder(folder.id, count, source, fingerprint)
+            continue
+        index.clear_folder(folder.id)
+        batch: List[PstEmail] = []
+        for preview in reader.iter_folder_messages(folder.id):
+            if stop is not None and stop.is_set():
+                return folders, messages
+            try:
+                batch.append(reader.get_message(preview.id))
+            except KeyError:
+                continue
+            if len(batch) >= 200:
+                index.add_messages(folder.id, batch)
+                messages += len(batch)
+                batch = []
+        index.add_messages(folder.id, batch)
+        messages += len(batch)
+        index.finish_folder(folder.id, count, source, fingerprint)
+        folders += 1
+        if on_folder:
+            on_folder(path, count)
+    index.prune(seen)
+    return folders, messages
+
+
+def folder_fingerprint(reader, folder_id: str) -> str:
+    """Resumo das prévias da pasta (id, assunto, remetente, data, anexos), sem ler corpos."""
+    digest = hashlib.blake2b(digest_size=16)
+    for msg in reader.iter_folder_messages(folder_id):
+        row = "\x1f".join((msg.id, msg.subject or "", msg.sender or "", msg.date or "", str(msg.attachment_count)))
+        digest.update(row.encode("utf-8", "surrogatepass") + b"\x1e")
+    return digest.hexdigest()
+
+
+class SearchIndexer(threading.Thread):
+    """Constrói/atualiza os índices de conversas e de busca em segundo plano.
+
+    Usa um leitor próprio (handle pypff separado), sem disputar o arquivo com
+    a thread de I/O da interface.
+    """
+
+    def __init__(self, pst_path: str, index_dir: str, on_finished: Optional[Callable[[], None]] = None) -> None:
+        super().__init__(name="pst-search-index", daemon=True)
+        self.pst_path = pst_path
+        self.index_dir = index_dir
+        self.on_finished = on_finished
+        self.finished = threading.Event()
+        self.error: Optional[BaseException] = None
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        from src.pst_reader import PstReader
+
+        reader = PstReader(index_dir=self.index_dir, lazy_folders=True)
+        try:
+            reader.open(self.pst_path)
+            if reader.index_path is None:
+                return
+            # Conversas primeiro: só cabeçalhos, bem mais rápido que o texto completo
+            threads = ThreadIndex(reader.index_path)
+            try:
+                update_thread_index(reader, threads, self._stop_event)
+            finally:
+                threads.close()
+            index = SearchIndex(reader.index_path)
+            try:
+                update_search_index(reader, index, self._stop_event)
+            finally:
+                index.close()
+        except Exception as exc:
+            self.error = exc
+        finally:
+            # Handle e caches do leitor não sobrevivem à indexação
+            reader.close()
+            self.finished.set()
+            if self.on_finished and not self._stop_event.is_set():
+                self.on_finished()
@@ -0,0 +1,339 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+
+SCHEMA_VERSION = 5
+
+FolderRow = Tuple[str, Optional[str], int, str, int, int]
+PreviewRow = Tuple[str, int, str, str, Optional[str], int]
+# Linha gravada: prévia + envio em época UTC (coluna indexada para filtros de data)
+IndexRow = Tuple[str, int, str, str, Optional[str], int, Optional[int]]
+
+
+def default_index_dir() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pstreader", "index")
+
+
+def source_signature(path: str) -> str:
+    """Tamanho e mtime do PST: muda a cada gravação, mesmo com a contagem de mensagens igual."""
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+class SidecarIndex:
+    """Índice SQLite persistente de um PST (árvore de pastas e prévias).
+
+    O arquivo é identificado pelo caminho absoluto do PST; tamanho e mtime
+    ficam na tabela ``meta`` e definem se o índice ainda é válido.
+    """
+
+    def __init__(self, index_dir: str, pst_path: str) -> None:
+        self.pst_path = os.path.abspath(pst_path)
+        st = os.stat(self.pst_path)
+        self.size = st.st_size
+        self.mtime = st.st_mtime_ns
+        os.makedirs(index_dir, exist_ok=True)
+        key = hashlib.sha1(self.pst_path.encode("utf-8")).hexdigest()
+        self.db_path = os.path.join(index_dir, f"{key}.sqlite")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        # WAL: leitores (UI, índice de busca, processos de exportação) não bloqueiam a escrita
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row and row[0] != str(SCHEMA_VERSION):
+                # Esquema antigo: descartar tudo e reconstruir
+                self._conn.execute("DROP TABLE IF EXISTS folders")
+                self._conn.execute("DROP TABLE IF EXISTS messages")
+                self._conn.execute("DROP TABLE IF EXISTS sort_index")
+                self._conn.execute("DROP TABLE IF EXISTS message_ids")
+                self._conn.execute("DELETE FROM meta")
+            # verified: a linha foi conferida com o PST desde a última mudança do arquivo
+            # children_synced: a lista de subpastas foi conferida com o PST
+            # ids_synced: message_ids tem todas as mensagens da pasta
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS folders ("
+                " id TEXT PRIMARY KEY, parent_id TEXT, position INTEGER, name TEXT,"
+                " subfolder_count INTEGER, message_count INTEGER, indexed_count INTEGER,"
+                " verified INTEGER DEFAULT 0, children_synced INTEGER DEFAULT 0, ids_synced INTEGER DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent_id, position)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id TEXT PRIMARY KEY, folder_id TEXT, position INTEGER, subject TEXT,"
+                " sender TEXT, date TEXT, attachment_count INTEGER, timestamp INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS messages_folder ON messages (folder_id, position)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS messages_time ON messages (folder_id, timestamp)")
+            # Identificador estável -> posição na pasta, gravado a cada leitura de
+            # mensagens do PST: abrir uma mensagem pelo id não percorre a pasta
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS message_ids (id TEXT PRIMARY KEY, folder_id TEXT, position INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS message_ids_folder ON message_ids (folder_id)")
+            # Ordens pré-calculadas por coluna; válidas para o indexed_count gravado
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sort_index ("
+                " folder_id TEXT, key TEXT, indexed_count INTEGER, sort_order BLOB, ranks BLOB,"
+                " PRIMARY KEY (folder_id, key))"
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(SCHEMA_VERSION),))
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self) -> bool:
+        with self._lock:
+            return (
+                self._meta("path") == self.pst_path
+                and self._meta("size") == str(self.size)
+                and self._meta("mtime") == str(self.mtime)
+            )
+
+    def mark_fresh(self) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [("path", self.pst_path), ("size", str(self.size)), ("mtime", str(self.mtime))],
+            )
+
+    def invalidate(self) -> None:
+        """Marca todas as pastas como não conferidas (o PST mudou).
+
+        Prévias, ordens e o mapa de ids são descartados: com a mesma
+        contagem, o conteúdo das pastas pode ter mudado.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE folders SET verified = 0, children_synced = 0, indexed_count = NULL, ids_synced = 0"
+            )
+            self._conn.execute("DELETE FROM messages")
+            self._conn.execute("DELETE FROM sort_index")
+            self._conn.execute("DELETE FROM message_ids")
+            self._conn.execute("DELETE FROM meta WHERE key = 'root_synced'")
+
+    # Pastas
+    def load_folders(self) -> List[FolderRow]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, parent_id, position, name, subfolder_count, message_count"
+                " FROM folders ORDER BY parent_id, position"
+            ).fetchall()
+
+    def load_children(self, parent_id: Optional[str]) -> Optional[List[FolderRow]]:
+        """Subpastas conferidas de ``parent_id`` (None = raiz) ou None se desconhecidas."""
+        with self._lock:
+            if parent_id is None:
+                synced = self._meta("root_synced") == "1"
+            else:
+                row = self._conn.execute("SELECT children_synced FROM folders WHERE id = ?", (parent_id,)).fetchone()
+                synced = bool(row and row[0])
+            if not synced:
+                return None
+            return self._conn.execute(
+                "SELECT id, parent_id, position, name, subfolder_count, message_count"
+                " FROM folders WHERE parent_id IS ? ORDER BY position",
+                (parent_id,),
+            ).fetchall()
+
+    def sync_children(self, parent_id: Optional[str], rows: Iterable[FolderRow]) -> None:
+        """Substitui as subpastas de ``parent_id`` mantendo prévias inalteradas.
+
+        Pastas cujo número de mensagens mudou perdem as prévias e o mapa de
+        ids e serão reindexadas na próxima listagem; pastas removidas saem do
+        índice junto com seus descendentes.
+        """
+        rows = list(rows)
+        with self._lock, self._conn:
+            old = {
+                fid: (count, indexed)
+                for fid, count, indexed in self._conn.execute(
+                    "SELECT id, message_count, indexed_count FROM folders WHERE parent_id IS ?", (parent_id,)
+                )
+            }
+            for fid, _parent, position, name, subs, count in rows:
+                prev = old.pop(fid, None)
+                indexed = prev[1] if prev and prev[0] == count else None
+                if prev and indexed is None:
+                    self._conn.execute("DELETE FROM messages WHERE folder_id = ?", (fid,))
+                    self._conn.execute("DELETE FROM sort_index WHERE folder_id = ?", (fid,))
+                if prev and prev[0] != count:
+                    self._conn.execute("DELETE FROM message_ids WHERE folder_id = ?", (fid,))
+                    self._conn.execute("UPDATE folders SET ids_synced = 0 WHERE id = ?", (fid,))
+                self._conn.execute(
+                    "INSERT INTO folders (id, parent_id, position, name, subfolder_count, message_count,"
+                    " indexed_count, verified) VALUES (?, ?, ?, ?, ?, ?, ?, 1)"
+                    " ON CONFLICT(id) DO UPDATE SET parent_id = excluded.parent_id,"
+                    " position = excluded.position, name = excluded.name,"
+                    " subfolder_count = excluded.subfolder_count, message_count = excluded.message_count,"
+                    " indexed_count = excluded.indexed_count, verified = 1",
+                    (fid, parent_id, position, name, subs, count, indexed),
+                )
+            for fid in old:
+                self._delete_subtree(fid)
+            if parent_id is None:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('root_synced', '1')")
+            else:
+                self._conn.execute("UPDATE folders SET children_synced = 1 WHERE id = ?", (parent_id,))
+
+    def _delete_subtree(self, folder_id: str) -> None:
+        children = [r[0] for r in self._conn.execute("SELECT id FROM folders WHERE parent_id = ?", (folder_id,))]
+        for child in children:
+            self._delete_subtree(child)
+        self._conn.execute("DELETE FROM messages WHERE folder_id = ?", (folder_id,))
+        self._conn.execute("DELETE FROM sort_index WHERE folder_id = ?", (folder_id,))
+        self._conn.execute("DELETE FROM message_ids WHERE folder_id = ?", (folder_id,))
+        self._conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+
+    # Prévias
+    def _indexed_count(self, folder_id: str) -> Optional[int]:
+        row = self._conn.execute(
+            "SELECT indexed_count FROM folders WHERE id = ? AND verified = 1", (folder_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def count_previews(self, folder_id: str) -> Optional[int]:
+        with self._lock:
+            return self._indexed_count(folder_id)
+
+    def load_previews(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Optional[List[PreviewRow]]:
+        """Prévias indexadas da pasta (faixa opcional) ou None se a pasta não foi indexada."""
+        with self._lock:
+            if self._indexed_count(folder_id) is None:
+                return None
+            return self._conn.execute(
+                "SELECT id, position, subject, sender, date, attachment_count"
+                " FROM messages WHERE folder_id = ? ORDER BY position LIMIT ? OFFSET ?",
+                (folder_id, -1 if count is None else count, max(start, 0)),
+            ).fetchall()
+
+    def load_previews_between(
+        self, folder_id: str, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Optional[List[PreviewRow]]:
+        """Prévias com envio em [since, until) (época UTC), na ordem da pasta."""
+        with self._lock:
+            if self._indexed_count(folder_id) is None:
+                return None
+            return self._conn.execute(
+                "SELECT id, position, subject, sender, date, attachment_count FROM messages"
+                " WHERE folder_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY position",
+                (folder_id, -(2**63) if since is None else since, 2**63 - 1 if until is None else until),
+            ).fetchall()
+
+    def load_previews_at(self, folder_id: str, positions: Sequence[int]) -> Optional[List[PreviewRow]]:
+        """Prévias nas posições dadas, na mesma ordem (None se a pasta não foi indexada)."""
+        with self._lock:
+            if self._indexed_count(folder_id) is None:
+                return None
+            by_position = {}
+            for i in range(0, len(positions), 500):
+                chunk = list(positions[i : i + 500])
+                for row in self._conn.execute(
+                    "SELECT id, position, subject, sender, date, attachment_count FROM messages"
+                    f" WHERE folder_id = ? AND position IN ({','.join('?' * len(chunk))})",
+                    [folder_id, *chunk],
+                ):
+                    by_position[row[1]] = row
+        return [by_position[p] for p in positions if p in by_position]
+
+    def save_previews(self, folder_id: str, rows: Iterable[IndexRow]) -> None:
+        self.append_previews(folder_id, rows, reset=True)
+        self.finish_previews(folder_id)
+
+    def append_previews(self, folder_id: str, rows: Iterable[IndexRow], reset: bool = False) -> None:
+        """Grava parte das prévias; a pasta só conta como indexada após finish_previews."""
+        with self._lock, self._conn:
+            if reset:
+                self._conn.execute("DELETE FROM messages WHERE folder_id = ?", (folder_id,))
+                self._conn.execute("DELETE FROM sort_index WHERE folder_id = ?", (folder_id,))
+                self._conn.execute("UPDATE folders SET indexed_count = NULL WHERE id = ?", (folder_id,))
+            rows = list(rows)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(mid, folder_id, pos, subj, sender, date, ac, ts) for mid, pos, subj, sender, date, ac, ts in rows],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO message_ids VALUES (?, ?, ?)", [(row[0], folder_id, row[1]) for row in rows]
+            )
+
+    def finish_previews(self, folder_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE folders SET indexed_count = (SELECT COUNT(*) FROM messages WHERE folder_id = ?),"
+                " ids_synced = 1 WHERE id = ?",
+                (folder_id, folder_id),
+            )
+
+    # Identificadores de mensagem
+    def locate_message(self, msg_id: str) -> Optional[Tuple[str, int]]:
+        """(pasta, posição) de ``msg_id`` numa pasta conferida, ou None se desconhecido."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT m.folder_id, m.position FROM message_ids m JOIN folders f ON f.id = m.folder_id"
+                " WHERE m.id = ? AND f.verified = 1",
+                (msg_id,),
+            ).fetchone()
+            return (row[0], row[1]) if row else None
+
+    def has_message_ids(self, folder_id: str) -> bool:
+        """True se todas as mensagens da pasta já estão em ``message_ids``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ids_synced FROM folders WHERE id = ? AND verified = 1", (folder_id,)
+            ).fetchone()
+            return bool(row and row[0])
+
+    def save_message_ids(self, folder_id: str, rows: Iterable[Tuple[str, int]], complete: bool = False) -> None:
+        """Grava pares (id, posição) lidos do PST.
+
+        ``complete``: ``rows`` tem a pasta inteira e substitui o mapa gravado.
+        """
+        with self._lock, self._conn:
+            if complete:
+                self._conn.execute("DELETE FROM message_ids WHERE folder_id = ?", (folder_id,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO message_ids VALUES (?, ?, ?)", [(mid, folder_id, pos) for mid, pos in rows]
+            )
+            if complete:
+                self._conn.execute("UPDATE folders SET ids_synced = 1 WHERE id = ?", (folder_id,))
+
+    # Ordenação
+    def load_sort_index(self, folder_id: str, key: str) -> Optional[Tuple[bytes, bytes]]:
+        with self._lock:
+            indexed = self._indexed_count(folder_id)
+            if indexed is None:
+                return None
+            row = self._conn.execute(
+                "SELECT sort_order, ranks FROM sort_index WHERE folder_id = ? AND key = ? AND indexed_count = ?",
+                (folder_id, key, indexed),
+            ).fetchone()
+            return (row[0], row[1]) if row else None
+
+    def save_sort_index(self, folder_id: str, key: str, order: bytes, ranks: bytes) -> None:
+        with self._lock, self._conn:
+            indexed = self._indexed_count(folder_id)
+            if indexed is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sort_index VALUES (?, ?, ?, ?, ?)", (folder_id, key, indexed, order, ranks)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
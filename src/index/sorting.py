@@ -0,0 +1,96 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from src.previews import SORT_KEYS, PreviewBatch
+
+# [(coluna, decrescente)], da chave principal para as secundárias
+SortSpec = Sequence[Tuple[str, bool]]
+
+
+def parse_sort_spec(text: str) -> List[Tuple[str, bool]]:
+    """``"date:desc,sender"`` -> ``[("date", True), ("sender", False)]``."""
+    spec = []
+    for part in text.split(","):
+        key, _, direction = part.strip().partition(":")
+        if key not in SORT_KEYS or direction not in ("", "asc", "desc"):
+            raise ValueError(f"Ordenação inválida: {part!r} (use coluna[:asc|desc] com {', '.join(SORT_KEYS)})")
+        spec.append((key, direction == "desc"))
+    return spec
+
+
+@dataclass
+class SortIndex:
+    """Ordem pré-calculada de uma pasta por uma coluna.
+
+    ``order`` tem as posições das mensagens em ordem crescente da coluna;
+    ``ranks[posição]`` é o rank denso do valor (empates têm o mesmo rank,
+    -1 para posições sem mensagem), usado para combinar várias chaves.
+    """
+
+    key: str
+    order: array
+    ranks: array
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.order) + len(self.ranks)) * self.order.itemsize
+
+    def to_bytes(self) -> Tuple[bytes, bytes]:
+        return self.order.tobytes(), self.ranks.tobytes()
+
+    @classmethod
+    def from_bytes(cls, key: str, order: bytes, ranks: bytes) -> "SortIndex":
+        a, b = array("l"), array("l")
+        a.frombytes(order)
+        b.frombytes(ranks)
+        return cls(key, a, b)
+
+
+def build_sort_index(batch: PreviewBatch, key: str) -> SortIndex:
+    column = batch.sort_column(key)
+    positions = batch.positions
+    ranks = array("l", [-1]) * ((max(positions) + 1) if len(positions) else 0)
+    order = array("l")
+    rank = -1
+    previous = None
+    # sorted é estável: empates mantêm a ordem da pasta
+    for i in sorted(range(len(batch)), key=column.__getitem__):
+        value = column[i]
+        if rank < 0 or value != previous:
+            rank += 1
+            previous = value
+        ranks[positions[i]] = rank
+        order.append(positions[i])
+    return SortIndex(key, order, ranks)
+
+
+def combine(indexes: Dict[str, SortIndex], spec: SortSpec) -> array:
+    """Posições na ordem de ``spec`` a partir das ordens pré-calculadas.
+
+    Parte da ordem guardada da última chave e aplica ordenações estáveis
+    pelos ranks, sempre sobre inteiros. Decrescente reordena pelo rank em vez
+    de inverter a lista: empates seguem na ordem da pasta nos dois sentidos.
+    """
+    if not spec:
+        raise ValueError("Ordenação vazia")
+    last_key, last_reverse = spec[-1]
+    order: List[int] = list(indexes[last_key].order)
+    if last_reverse:
+        order.sort(key=indexes[last_key].ranks.__getitem__, reverse=True)
+    for key, reverse in reversed(spec[:-1]):
+        order.sort(key=indexes[key].ranks.__getitem__, reverse=reverse)
+    return array("l", order)
+
+
+def sort_batch(batch: PreviewBatch, spec: SortSpec) -> PreviewBatch:
+    """Lote reordenado por ``spec`` (ex.: resultados de busca, já em memória)."""
+    indexes = {key: build_sort_index(batch, key) for key, _reverse in spec}
+    at = {position: k for k, position in enumerate(batch.positions)}
+    return batch.take([at[position] for position in combine(indexes, spec)])
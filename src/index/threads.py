@@ -0,0 +1,406 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import base64
+import binascii
+import re
+import sqlite3
+import threading
+
+from src.index.sidecar import source_signature
+from src.instrumentation import traced
+from src.models import MessageHeaders
+
+THREAD_SCHEMA_VERSION = 2
+# Cabeçalhos de transporte lidos por mensagem (o resto do bloco é ignorado)
+MAX_HEADER_CHARS = 64 * 1024
+# Bytes do PR_CONVERSATION_INDEX que identificam a conversa (cabeçalho: data + GUID)
+CONVERSATION_KEY_BYTES = 22
+
+_THREAD_HEADERS = ("message-id", "in-reply-to", "references", "thread-index")
+_MSG_ID = re.compile(r"<([^<>\s]+)>")
+# Prefixos de resposta/encaminhamento (pt, en, de, es, fr, nórdicos) e marcas de lista
+_SUBJECT_PREFIX = re.compile(
+    r"^(?:\s*(?:(?:re|res|fw|fwd|enc|tr|aw|wg|sv|vs|rv|ref)\s*(?:\[\d+\]|\(\d+\))?\s*:|\[[^\]]*\]))+\s*",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class ThreadKeys:
+    # Message-ID sem "<>" (None se a mensagem não tiver)
+    message_key: Optional[str]
+    # Mensagem respondida (In-Reply-To ou última referência)
+    parent_key: Optional[str]
+    # Referências do início da conversa até a mãe, sem repetição
+    references: List[str]
+    conversation_key: Optional[str]
+    subject_key: Optional[str]
+    # Assunto com "Re:"/"Fwd:"... (o assunto pode ligar a mensagem à conversa)
+    is_reply: bool
+
+
+@dataclass
+class ThreadMessage:
+    msg_id: str
+    folder_id: str
+    subject: str
+    sender: str
+    epoch: Optional[int]
+    attachment_count: int
+    # Nível na árvore de respostas (0 = início da conversa ou mãe desconhecida)
+    depth: int = 0
+    parent_id: Optional[str] = None
+
+
+@dataclass
+class ThreadSummary:
+    thread_id: str
+    size: int
+    # Primeira mensagem da conversa (para abri-la)
+    msg_id: str
+    subject: str
+    first_epoch: Optional[int]
+    last_epoch: Optional[int]
+
+
+def parse_thread_headers(text: str) -> Tuple[Optional[str], List[str], Optional[str], Optional[bytes]]:
+    """(Message-ID, References, In-Reply-To, Thread-Index decodificado) do bloco de cabeçalhos."""
+    found: Dict[str, str] = {}
+    current: Optional[str] = None
+    for line in text[:MAX_HEADER_CHARS].splitlines():
+        if not line.strip():
+            if found or current:
+                break
+            continue
+        if line[0] in " \t":
+            if current is not None:
+                found[current] += " " + line.strip()
+            continue
+        name, sep, value = line.partition(":")
+        current = name.strip().lower() if sep else None
+        if current not in _THREAD_HEADERS or current in found:
+            # Só a primeira ocorrência de cada cabeçalho conta
+            current = None
+            continue
+        found[current] = value.strip()
+    ids = _MSG_ID.findall(found.get("message-id", ""))
+    message_id = ids[0] if ids else (found.get("message-id") or None)
+    references = _MSG_ID.findall(found.get("references", ""))
+    in_reply_to = _MSG_ID.findall(found.get("in-reply-to", ""))
+    thread_index = None
+    if found.get("thread-index"):
+        try:
+            thread_index = base64.b64decode("".join(found["thread-index"].split()), validate=False)
+        except (binascii.Error, ValueError):
+            thread_index = None
+    return message_id, references, in_reply_to[0] if in_reply_to else None, thread_index
+
+
+def normalize_subject(subject: str) -> Tuple[str, bool]:
+    """Assunto sem prefixos de resposta, minúsculo e com espaços simples; e se havia prefixo."""
+    stripped = _SUBJECT_PREFIX.sub("", subject or "")
+    return " ".join(stripped.split()).casefold(), len(stripped) != len(subject or "")
+
+
+def conversation_key(index: Optional[bytes]) -> Optional[str]:
+    if not index or len(index) < CONVERSATION_KEY_BYTES:
+        return None
+    return index[:CONVERSATION_KEY_BYTES].hex()
+
+
+def thread_keys(headers: MessageHeaders) -> ThreadKeys:
+    message_id, references, in_reply_to, thread_index = parse_thread_headers(headers.transport_headers or "")
+    refs: List[str] = []
+    for ref in references + ([in_reply_to] if in_reply_to else []):
+        if ref != message_id and ref not in refs:
+            refs.append(ref)
+    subject_key, is_reply = normalize_subject(headers.subject)
+    return ThreadKeys(
+        message_key=message_id,
+        parent_key=in_reply_to if in_reply_to and in_reply_to != message_id else (refs[-1] if refs else None),
+        references=refs,
+        conversation_key=conversation_key(headers.conversation_index or thread_index),
+        subject_key=subject_key or None,
+        is_reply=is_reply,
+    )
+
+
+def arrange_thread(messages: List[ThreadMessage], parents: Dict[str, Optional[str]], keys: Dict[str, Optional[str]]) -> List[ThreadMessage]:
+    """Ordena as mensagens (já em ordem de envio) em pré-ordem da árvore de respostas.
+
+    ``keys``/``parents`` dão o Message-ID de cada mensagem e o da mãe; mãe
+    ausente da conversa (apagada, em outro PST) torna a mensagem uma raiz.
+    """
+    by_key: Dict[str, ThreadMessage] = {}
+    for msg in messages:
+        key = keys.get(msg.msg_id)
+        # Cópias da mesma mensagem (Enviados e Caixa de Entrada): a primeira é a mãe das respostas
+        if key and key not in by_key:
+            by_key[key] = msg
+    children: Dict[Optional[str], List[ThreadMessage]] = {}
+    for msg in messages:
+        parent = by_key.get(parents.get(msg.msg_id) or "")
+        if parent is msg:
+            parent = None
+        msg.parent_id = parent.msg_id if parent is not None else None
+        children.setdefault(msg.parent_id, []).append(msg)
+    ordered: List[ThreadMessage] = []
+    seen = set()
+    stack = [(msg, 0) for msg in reversed(children.get(None, []))]
+    while stack:
+        msg, depth = stack.pop()
+        if msg.msg_id in seen:
+            continue
+        seen.add(msg.msg_id)
+        msg.depth = depth
+        ordered.append(msg)
+        stack.extend((child, depth + 1) for child in reversed(children.get(msg.msg_id, [])))
+    # Ciclos de referências (cabeçalhos quebrados): o que sobrou vai no fim, sem recuo
+    for msg in messages:
+        if msg.msg_id not in seen:
+            msg.depth, msg.parent_id = 0, None
+            ordered.append(msg)
+    return ordered
+
+
+class ThreadIndex:
+    """Índice de conversas (SQLite) guardado no arquivo do índice persistente.
+
+    Cada mensagem de todas as pastas ganha uma linha com suas chaves de
+    encadeamento e o ``thread_id`` da conversa, resolvido na gravação
+    (Message-ID/In-Reply-To/References; na falta deles, o índice de conversa
+    do PST e por fim o assunto normalizado). Abrir uma conversa é uma
+    consulta pelo ``thread_id``, sem ler pastas do PST.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'thread_schema'").fetchone()
+            if row and row[0] != str(THREAD_SCHEMA_VERSION):
+                for table in ("thread_messages", "thread_folders"):
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_messages ("
+                " msg_id TEXT PRIMARY KEY, folder_id TEXT, thread_id TEXT, message_key TEXT, parent_key TEXT,"
+                " conversation_key TEXT, subject_key TEXT, subject TEXT, sender TEXT, timestamp INTEGER,"
+                " attachment_count INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS thread_messages_thread ON thread_messages (thread_id, timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS thread_messages_key ON thread_messages (message_key)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS thread_messages_conversation ON thread_messages (conversation_key)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS thread_messages_subject ON thread_messages (subject_key, timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS thread_messages_folder ON thread_messages (folder_id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_folders (folder_id TEXT PRIMARY KEY, message_count INTEGER, source TEXT)"
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('thread_schema', ?)", (str(THREAD_SCHEMA_VERSION),))
+
+    # Manutenção
+    def is_current(self, folder_id: str, message_count: int, source: Optional[str] = None) -> bool:
+        """Pasta indexada com a mesma contagem e do mesmo estado do PST (``source_signature``)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_count, source FROM thread_folders WHERE folder_id = ?", (folder_id,)
+            ).fetchone()
+            return bool(row) and row[0] == message_count and row[1] == source
+
+    def clear_folder(self, folder_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM thread_messages WHERE folder_id = ?", (folder_id,))
+            self._conn.execute("DELETE FROM thread_folders WHERE folder_id = ?", (folder_id,))
+
+    @traced()
+    def add_messages(self, folder_id: str, messages: Iterable[MessageHeaders]) -> None:
+        with self._lock, self._conn:
+            for msg in messages:
+                keys = thread_keys(msg)
+                thread_id = self._assign(msg.id, keys, msg.epoch)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO thread_messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        msg.id,
+                        folder_id,
+                        thread_id,
+                        keys.message_key,
+                        keys.parent_key,
+                        keys.conversation_key,
+                        keys.subject_key,
+                        msg.subject,
+                        msg.sender,
+                        msg.epoch,
+                        msg.attachment_count,
+                    ),
+                )
+
+    def _assign(self, msg_id: str, keys: ThreadKeys, epoch: Optional[int]) -> str:
+        """Conversa da mensagem; une as conversas que ela liga.
+
+        As pastas chegam em qualquer ordem: uma resposta gravada antes da mãe
+        fica numa conversa provisória com o nome da mensagem que ela cita
+        (``mid:<Message-ID>``), e a mãe, ao chegar, move essa conversa para a
+        sua. Assim cada conversa é sempre um único ``thread_id``.
+        """
+        conn = self._conn
+        found: List[str] = []
+        if keys.references:
+            marks = ",".join("?" * len(keys.references))
+            found = [
+                r[0]
+                for r in conn.execute(
+                    f"SELECT DISTINCT thread_id FROM thread_messages WHERE message_key IN ({marks})", keys.references
+                )
+            ]
+        if not found and keys.conversation_key:
+            row = conn.execute(
+                "SELECT thread_id FROM thread_messages WHERE conversation_key = ? LIMIT 1", (keys.conversation_key,)
+            ).fetchone()
+            found = [row[0]] if row else []
+        if not found and not keys.references and keys.is_reply and keys.subject_key:
+            # Resposta sem cabeçalhos de encadeamento: a conversa mais recente
+            # com o mesmo assunto enviada antes dela (ou a mais recente de todas)
+            row = conn.execute(
+                "SELECT thread_id FROM thread_messages WHERE subject_key = ?"
+                " ORDER BY COALESCE(timestamp, 0) > ?, timestamp DESC LIMIT 1",
+                (keys.subject_key, 2**63 - 1 if epoch is None else epoch),
+            ).fetchone()
+            found = [row[0]] if row else []
+
+        if found:
+            thread_id = found[0]
+        elif keys.references:
+            thread_id = "mid:" + keys.references[0]
+        elif keys.message_key:
+            thread_id = "mid:" + keys.message_key
+        elif keys.conversation_key:
+            thread_id = "conv:" + keys.conversation_key
+        elif keys.is_reply and keys.subject_key:
+            thread_id = "subj:" + keys.subject_key
+        else:
+            thread_id = "msg:" + msg_id
+
+        merge = set(found[1:])
+        merge.update("mid:" + ref for ref in keys.references)
+        if keys.message_key:
+            merge.add("mid:" + keys.message_key)
+        if keys.conversation_key:
+            merge.add("conv:" + keys.conversation_key)
+        if keys.subject_key:
+            merge.add("subj:" + keys.subject_key)
+        merge.discard(thread_id)
+        if merge:
+            conn.execute(
+                f"UPDATE thread_messages SET thread_id = ? WHERE thread_id IN ({','.join('?' * len(merge))})",
+                [thread_id, *merge],
+            )
+        return thread_id
+
+    def finish_folder(self, folder_id: str, message_count: int, source: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO thread_folders VALUES (?, ?, ?)", (folder_id, message_count, source))
+
+    def prune(self, folder_ids: Iterable[str]) -> None:
+        """Remove pastas que não existem mais no PST."""
+        keep = set(folder_ids)
+        with self._lock:
+            known = [r[0] for r in self._conn.execute("SELECT folder_id FROM thread_folders")]
+        for folder_id in known:
+            if folder_id not in keep:
+                self.clear_folder(folder_id)
+
+    # Consulta
+    def thread_id(self, msg_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT thread_id FROM thread_messages WHERE msg_id = ?", (msg_id,)).fetchone()
+        return row[0] if row else None
+
+    @traced()
+    def load_thread(self, msg_id: str) -> List[ThreadMessage]:
+        """Conversa da mensagem (todas as pastas) em árvore; [] se ela ainda não foi indexada."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT msg_id, folder_id, subject, sender, timestamp, attachment_count, message_key, parent_key"
+                " FROM thread_messages WHERE thread_id = (SELECT thread_id FROM thread_messages WHERE msg_id = ?)"
+                " ORDER BY timestamp, msg_id",
+                (msg_id,),
+            ).fetchall()
+        messages = [ThreadMessage(mid, fid, subject, sender, ts, ac or 0) for mid, fid, subject, sender, ts, ac, _k, _p in rows]
+        keys = {row[0]: row[6] for row in rows}
+        parents = {row[0]: row[7] for row in rows}
+        return arrange_thread(messages, parents, keys)
+
+    def list_threads(self, folder_id: Optional[str] = None, min_size: int = 2, limit: int = 100) -> List[ThreadSummary]:
+        """Conversas com pelo menos ``min_size`` mensagens, as mais recentes primeiro."""
+        sql = "SELECT thread_id, COUNT(*), MIN(timestamp), MAX(timestamp) FROM thread_messages"
+        params: List = []
+        if folder_id is not None:
+            sql += " WHERE thread_id IN (SELECT thread_id FROM thread_messages WHERE folder_id = ?)"
+            params.append(folder_id)
+        sql += " GROUP BY thread_id HAVING COUNT(*) >= ? ORDER BY MAX(timestamp) DESC LIMIT ?"
+        params.extend([min_size, limit])
+        summaries: List[ThreadSummary] = []
+        with self._lock:
+            for thread_id, size, first, last in self._conn.execute(sql, params).fetchall():
+                msg_id, subject = self._conn.execute(
+                    "SELECT msg_id, subject FROM thread_messages WHERE thread_id = ? ORDER BY timestamp, msg_id LIMIT 1",
+                    (thread_id,),
+                ).fetchone()
+                summaries.append(ThreadSummary(thread_id, size, msg_id, subject, first, last))
+        return summaries
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def update_thread_index(
+    reader,
+    index: ThreadIndex,
+    stop: Optional[threading.Event] = None,
+    on_folder: Optional[Callable[[str, int], None]] = None,
+    page_size: int = 1000,
+) -> Tuple[int, int]:
+    """Indexa as conversas das pastas novas ou alteradas; retorna (pastas, mensagens) indexadas.
+
+    Lê só prévias e cabeçalhos de transporte (sem corpos nem anexos). Como
+    em ``update_search_index``, o PST gravado desde a indexação refaz a pasta.
+    """
+    folders = 0
+    messages = 0
+    seen: List[str] = []
+    source = source_signature(reader.path)
+    for folder, path, _depth in reader.walk_folders():
+        if stop is not None and stop.is_set():
+            return folders, messages
+        seen.append(folder.id)
+        count = reader.count_messages(folder.id)
+        if index.is_current(folder.id, count, source):
+            continue
+        index.clear_folder(folder.id)
+        start = 0
+        while start < count:
+            if stop is not None and stop.is_set():
+                return folders, messages
+            page = list(reader.iter_thread_headers(folder.id, start, page_size))
+            index.add_messages(folder.id, page)
+            messages += len(page)
+            start += page_size
+        index.finish_folder(folder.id, count, source)
+        folders += 1
+        if on_folder:
+            on_folder(path, count)
+    index.prune(seen)
+    return folders, messages
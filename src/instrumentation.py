@@ -0,0 +1,225 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import functools
+import json
+import os
+import threading
+import time
+
+# Spans guardados para exportação (os mais antigos são descartados)
+DEFAULT_MAX_SPANS = 200_000
+ENV_VAR = "PSTREADER_TRACE"
+
+
+@dataclass
+class Counter:
+    calls: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+    bytes: int = 0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ns / self.calls / 1e6 if self.calls else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_ms": round(self.total_ns / 1e6, 3),
+            "avg_ms": round(self.avg_ms, 4),
+            "max_ms": round(self.max_ns / 1e6, 3),
+            "bytes": self.bytes,
+        }
+
+
+# (nome, thread, início ns, duração ns, bytes)
+Span = Tuple[str, int, int, int, Optional[int]]
+
+
+class _State:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Counter] = {}
+        self.spans: Deque[Span] = deque(maxlen=DEFAULT_MAX_SPANS)
+        self.origin_ns = time.perf_counter_ns()
+
+
+_state = _State()
+
+
+def enable(max_spans: int = DEFAULT_MAX_SPANS) -> None:
+    """Liga a coleta (desligada por padrão: cada ponto custa só um teste de flag)."""
+    with _state.lock:
+        if _state.spans.maxlen != max_spans:
+            _state.spans = deque(_state.spans, maxlen=max_spans)
+        _state.enabled = True
+
+
+def disable() -> None:
+    _state.enabled = False
+
+
+def is_enabled() -> bool:
+    return _state.enabled
+
+
+def reset() -> None:
+    with _state.lock:
+        _state.counters.clear()
+        _state.spans.clear()
+        _state.origin_ns = time.perf_counter_ns()
+
+
+def record(name: str, start_ns: int, nbytes: Optional[int] = None) -> None:
+    """Fecha um span iniciado em ``start_ns`` (``time.perf_counter_ns``)."""
+    duration = time.perf_counter_ns() - start_ns
+    with _state.lock:
+        counter = _state.counters.get(name)
+        if counter is None:
+            counter = _state.counters[name] = Counter()
+        counter.calls += 1
+        counter.total_ns += duration
+        if duration > counter.max_ns:
+            counter.max_ns = duration
+        if nbytes:
+            counter.bytes += nbytes
+        _state.spans.append((name, threading.get_ident(), start_ns, duration, nbytes))
+
+
+def count(name: str, nbytes: int = 0, calls: int = 1) -> None:
+    """Contador sem tempo (ex.: bytes escritos, linhas inseridas)."""
+    if not _state.enabled:
+        return
+    with _state.lock:
+        counter = _state.counters.get(name)
+        if counter is None:
+            counter = _state.counters[name] = Counter()
+        counter.calls += calls
+        counter.bytes += nbytes
+
+
+class _Span:
+    __slots__ = ("name", "start", "nbytes")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.nbytes: Optional[int] = None
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        record(self.name, self.start, self.nbytes)
+
+
+class _NullSpan:
+    __slots__ = ()
+    nbytes = None
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        return None
+
+    def __setattr__(self, _name, _value) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str):
+    """``with span("nome") as s: ...; s.nbytes = n`` — não faz nada se desligado."""
+    return _Span(name) if _state.enabled else _NULL_SPAN
+
+
+def traced(name: Optional[str] = None, size: Optional[Callable[[object], Optional[int]]] = None):
+    """Decorador: tempo e chamadas da função (e bytes do resultado via ``size``).
+
+    O nome padrão é o ``__qualname__`` (ex.: ``PypffAdapter._index``).
+    """
+
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                record(label, start, size(result) if size is not None and result is not None else None)
+
+        return wrapper
+
+    return decorate
+
+
+def result_len(value) -> Optional[int]:
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+# Leitura e exportação
+def snapshot() -> Dict[str, Counter]:
+    with _state.lock:
+        return {name: Counter(c.calls, c.total_ns, c.max_ns, c.bytes) for name, c in _state.counters.items()}
+
+
+def to_json() -> dict:
+    with _state.lock:
+        origin = _state.origin_ns
+        spans: List[Span] = list(_state.spans)
+    return {
+        "counters": {name: c.to_dict() for name, c in sorted(snapshot().items())},
+        "spans": [
+            {"name": n, "thread": tid, "start_us": (start - origin) // 1000, "dur_us": dur // 1000, "bytes": nbytes}
+            for n, tid, start, dur, nbytes in spans
+        ],
+    }
+
+
+def to_chrome_trace() -> dict:
+    """Formato trace-event (chrome://tracing, Perfetto): um evento completo por span."""
+    with _state.lock:
+        origin = _state.origin_ns
+        spans = list(_state.spans)
+    pid = os.getpid()
+    events = []
+    for n, tid, start, dur, nbytes in spans:
+        event = {"name": n, "cat": n.partition(".")[0], "ph": "X", "ts": (start - origin) / 1000, "dur": dur / 1000, "pid": pid, "tid": tid}
+        if nbytes is not None:
+            event["args"] = {"bytes": nbytes}
+        events.append(event)
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export(path: str, fmt: Optional[str] = None) -> None:
+    """Grava o trace; ``fmt`` "json" ou "chrome" (padrão: pelo nome, ``*.trace.json`` = chrome)."""
+    if fmt is None:
+        fmt = "chrome" if path.endswith(".trace.json") else "json"
+    if fmt not in ("json", "chrome"):
+        raise ValueError(f"Formato de trace inválido: {fmt} (use json ou chrome)")
+    data = to_chrome_trace() if fmt == "chrome" else to_json()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+if os.environ.get(ENV_VAR):
+    enable()
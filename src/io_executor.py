@@ -0,0 +1,156 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional
+import itertools
+import queue
+import threading
+import time
+
+from src import instrumentation
+
+# Prioridades: pedidos do usuário passam na frente de trabalho de fundo
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class IoTask:
+    __slots__ = ("fn", "on_done", "on_error", "on_cancel", "key", "priority", "cancelled")
+
+    def __init__(self, fn, on_done, on_error, key: Optional[str], priority: int, on_cancel=None) -> None:
+        self.fn = fn
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.key = key
+        self.priority = priority
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class IoExecutor:
+    """Executa o I/O de PST numa única thread de trabalho.
+
+    pypff não é seguro para uso concorrente, então um só worker é dono do
+    handle do arquivo. Resultados voltam para a thread do Tk por polling com
+    ``after()``; tarefas com a mesma ``key`` substituem as anteriores ainda
+    pendentes (ex.: cliques rápidos em várias mensagens).
+    """
+
+    def __init__(self, root, poll_ms: int = 15, frame_budget_ms: float = 8.0) -> None:
+        self._root = root
+        self._poll_ms = poll_ms
+        self._frame_budget = frame_budget_ms / 1000.0
+        self._tasks: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._results: "queue.Queue" = queue.Queue()
+        self._seq = itertools.count()
+        self._latest: Dict[str, IoTask] = {}
+        self._lock = threading.Lock()
+        self._interactive_pending = 0
+        self._busy_callback: Optional[Callable[[bool], None]] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name="pst-io", daemon=True)
+        self._thread.start()
+        self._root.after(self._poll_ms, self._poll)
+
+    def set_busy_callback(self, callback: Callable[[bool], None]) -> None:
+        """callback(ocupado) na thread do Tk quando pedidos interativos começam/terminam."""
+        self._busy_callback = callback
+
+    def submit(
+        self,
+        fn: Callable[[], Any],
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[BaseException], None]] = None,
+        key: Optional[str] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ) -> IoTask:
+        """Enfileira ``fn``; ``on_done``/``on_error``/``on_cancel`` rodam na thread do Tk."""
+        task = IoTask(fn, on_done, on_error, key, priority, on_cancel)
+        became_busy = False
+        with self._lock:
+            if key is not None:
+                previous = self._latest.get(key)
+                if previous is not None:
+                    previous.cancel()
+                self._latest[key] = task
+            if priority <= PRIORITY_INTERACTIVE:
+                self._interactive_pending += 1
+                became_busy = self._interactive_pending == 1
+        if became_busy and self._busy_callback:
+            self._busy_callback(True)
+        self._tasks.put((priority, next(self._seq), task))
+        return task
+
+    def cancel(self, key_prefix: str = "") -> None:
+        """Cancela tarefas pendentes cuja key começa com ``key_prefix``."""
+        with self._lock:
+            for key, task in list(self._latest.items()):
+                if key.startswith(key_prefix):
+                    task.cancel()
+                    del self._latest[key]
+
+    def shutdown(self) -> None:
+        self._closed = True
+        self.cancel()
+        self._tasks.put((-1, next(self._seq), None))
+
+    def _worker(self) -> None:
+        while True:
+            _prio, _seq, task = self._tasks.get()
+            if task is None:
+                return
+            if task.cancelled:
+                self._results.put((task, None, None))
+                continue
+            try:
+                # Span por tipo de tarefa ("rows", "message", "index"...)
+                with instrumentation.span(f"io.{(task.key or 'task').partition(':')[0]}"):
+                    result = task.fn()
+            except BaseException as exc:  # repassado para on_error na thread do Tk
+                self._results.put((task, None, exc))
+            else:
+                self._results.put((task, result, None))
+
+    def _poll(self) -> None:
+        deadline = time.perf_counter() + self._frame_budget
+        while time.perf_counter() < deadline:
+            try:
+                task, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._finish(task, result, error)
+        if not self._closed:
+            self._root.after(self._poll_ms, self._poll)
+
+    def _finish(self, task: IoTask, result, error) -> None:
+        with self._lock:
+            if task.key is not None and self._latest.get(task.key) is task:
+                del self._latest[task.key]
+            if task.priority <= PRIORITY_INTERACTIVE:
+                self._interactive_pending -= 1
+                idle = self._interactive_pending == 0
+            else:
+                idle = False
+        try:
+            if task.cancelled:
+                # Substituída ou cancelada: quem pediu pode liberar o que reservou
+                if task.on_cancel:
+                    task.on_cancel()
+                return
+            # Tempo na thread do Tk (inserções em Treeview, renderização)
+            with instrumentation.span(f"ui.{(task.key or 'task').partition(':')[0]}"):
+                if error is not None:
+                    if task.on_error:
+                        task.on_error(error)
+                elif task.on_done:
+                    task.on_done(result)
+        finally:
+            if idle and self._busy_callback:
+                self._busy_callback(False)
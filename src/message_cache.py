@@ -0,0 +1,135 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import threading
+
+from src.models import PstEmail
+
+# Limite padrão do cache de mensagens completas
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Custo fixo estimado por mensagem e por anexo (objetos, dicionários)
+_MESSAGE_OVERHEAD = 512
+_ATTACHMENT_OVERHEAD = 160
+
+
+def estimate_size(msg: PstEmail) -> int:
+    """Tamanho aproximado em memória de uma mensagem decodificada."""
+    size = _MESSAGE_OVERHEAD
+    for text in (msg.id, msg.subject, msg.sender, msg.to, msg.cc, msg.date, msg.body_text, msg.body_html):
+        if text:
+            size += len(text)
+    for att in msg.attachments:
+        size += _ATTACHMENT_OVERHEAD + len(att.name or "") + len(att.mime_type or "")
+    return size
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    bytes_used: int = 0
+    max_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class MessageCache:
+    """LRU de mensagens completas limitado por bytes, não por entradas.
+
+    Também guarda outros objetos com tamanho informado em ``put`` (ex.: as
+    ordens de pasta do ``PstReader``), que dividem o mesmo limite. Um item
+    maior que o limite inteiro não é guardado. Seguro para uso entre a
+    thread de I/O e as demais.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        self.max_bytes = max(0, max_bytes)
+        self._items: "OrderedDict[str, Tuple[PstEmail, int]]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, msg_id: str) -> Optional[PstEmail]:
+        with self._lock:
+            item = self._items.get(msg_id)
+            if item is None:
+                self._misses += 1
+                return None
+            self._items.move_to_end(msg_id)
+            self._hits += 1
+            return item[0]
+
+    def __contains__(self, msg_id: str) -> bool:
+        with self._lock:
+            return msg_id in self._items
+
+    def put(self, msg: PstEmail, key: Optional[str] = None, size: Optional[int] = None) -> None:
+        key = msg.id if key is None else key
+        size = estimate_size(msg) if size is None else size
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (msg, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _key, (_msg, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def discard_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._items if k.startswith(prefix)]:
+                self._bytes -= self._items.pop(key)[1]
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, len(self._items), self._bytes, self.max_bytes)
+
+
+class CacheNamespace:
+    """Vista de um ``MessageCache`` compartilhado, com as chaves prefixadas.
+
+    Vários PSTs abertos dividem o mesmo limite de bytes (a LRU decide entre
+    todos eles); ``clear`` descarta só as mensagens deste PST.
+    """
+
+    def __init__(self, shared: MessageCache, prefix: str) -> None:
+        self.shared = shared
+        self.prefix = prefix
+
+    @property
+    def max_bytes(self) -> int:
+        return self.shared.max_bytes
+
+    def get(self, msg_id: str) -> Optional[PstEmail]:
+        return self.shared.get(self.prefix + msg_id)
+
+    def __contains__(self, msg_id: str) -> bool:
+        return self.prefix + msg_id in self.shared
+
+    def put(self, msg: PstEmail, key: Optional[str] = None, size: Optional[int] = None) -> None:
+        self.shared.put(msg, key=self.prefix + (msg.id if key is None else key), size=size)
+
+    def clear(self) -> None:
+        self.shared.discard_prefix(self.prefix)
+
+    def stats(self) -> CacheStats:
+        return self.shared.stats()
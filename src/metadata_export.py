@@ -0,0 +1,477 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+import csv
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+from src.instrumentation import span, traced
+from src.models import MessageMetadata
+from src.pst_reader import PstReader
+from src.utils.workers import init_worker_reader, worker_reader
+
+# Linhas por bloco gravado (e por fatia lida de uma pasta)
+CHUNK_ROWS = 5000
+# Fatias em andamento por processo: limita a memória com pastas grandes
+IN_FLIGHT_PER_WORKER = 2
+
+# (coluna, tipo): "str", "int", "time" (época UTC) ou "list" (de textos)
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("id", "str"),
+    ("folder_id", "str"),
+    ("folder", "str"),
+    ("subject", "str"),
+    ("sender", "str"),
+    ("to", "str"),
+    ("cc", "str"),
+    ("sent", "time"),
+    ("delivered", "time"),
+    ("created", "time"),
+    ("size", "int"),
+    ("body_size", "int"),
+    ("attachment_count", "int"),
+    ("attachment_bytes", "int"),
+    ("attachment_names", "list"),
+    ("attachment_types", "list"),
+)
+COLUMN_NAMES = tuple(name for name, _kind in COLUMNS)
+
+
+class MetadataChunk:
+    """Linhas de metadados em colunas (uma lista por coluna, na ordem de ``COLUMNS``)."""
+
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: Optional[Dict[str, list]] = None) -> None:
+        self.columns: Dict[str, list] = columns if columns is not None else {name: [] for name in COLUMN_NAMES}
+
+    def __len__(self) -> int:
+        # Blocos lidos com só algumas colunas (``read_columnar``) também têm tamanho
+        return len(next(iter(self.columns.values()), ()))
+
+    def append(self, meta: MessageMetadata, folder_id: str, folder_path: str) -> None:
+        c = self.columns
+        c["id"].append(meta.id)
+        c["folder_id"].append(folder_id)
+        c["folder"].append(folder_path)
+        c["subject"].append(meta.subject)
+        c["sender"].append(meta.sender)
+        c["to"].append(meta.to)
+        c["cc"].append(meta.cc)
+        c["sent"].append(meta.sent)
+        c["delivered"].append(meta.delivered)
+        c["created"].append(meta.created)
+        c["size"].append(meta.size)
+        c["body_size"].append(meta.body_size)
+        c["attachment_count"].append(max(meta.attachment_count, len(meta.attachments)))
+        c["attachment_bytes"].append(sum(att.size for att in meta.attachments))
+        c["attachment_names"].append([att.name for att in meta.attachments])
+        c["attachment_types"].append([att.mime_type for att in meta.attachments])
+
+    def extend(self, other: "MetadataChunk") -> None:
+        for name in COLUMN_NAMES:
+            self.columns[name].extend(other.columns[name])
+
+    def split(self, rows: int) -> "MetadataChunk":
+        """Remove e devolve as primeiras ``rows`` linhas."""
+        head = MetadataChunk({name: values[:rows] for name, values in self.columns.items()})
+        for values in self.columns.values():
+            del values[:rows]
+        return head
+
+    def records(self) -> Iterator[dict]:
+        names = list(self.columns)
+        for values in zip(*self.columns.values()):
+            yield dict(zip(names, values))
+
+
+def iso_time(epoch: Optional[int]) -> Optional[str]:
+    if epoch is None:
+        return None
+    try:
+        return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+# Gravadores
+class MetadataWriter:
+    """Destino do ``MetadataExporter``: recebe blocos de linhas em colunas.
+
+    Para um formato novo, basta uma subclasse com ``write_chunk`` (e
+    ``close``, se precisar) registrada com ``register_writer``.
+    """
+
+    extension = ""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.rows = 0
+
+    def write_chunk(self, chunk: MetadataChunk) -> None:  # pragma: no cover
+        raise NotImplementedError
+
+    def close(self) -> None:
+        return None
+
+
+class JsonlWriter(MetadataWriter):
+    """Uma linha JSON por mensagem; datas em ISO 8601 UTC."""
+
+    extension = ".jsonl"
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self._file = open(path, "w", encoding="utf-8", newline="\n")
+
+    def write_chunk(self, chunk: MetadataChunk) -> None:
+        times = [name for name, kind in COLUMNS if kind == "time"]
+        lines = []
+        for record in chunk.records():
+            for name in times:
+                record[name] = iso_time(record[name])
+            lines.append(json.dumps(record, ensure_ascii=False))
+        self._file.write("\n".join(lines) + "\n" if lines else "")
+        self.rows += len(chunk)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CsvWriter(MetadataWriter):
+    """CSV (RFC 4180) com cabeçalho; listas unidas por ``LIST_SEPARATOR``."""
+
+    extension = ".csv"
+    LIST_SEPARATOR = "; "
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        # BOM: o Excel reconhece o UTF-8
+        self._file = open(path, "w", encoding="utf-8-sig", newline="")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(COLUMN_NAMES)
+
+    def write_chunk(self, chunk: MetadataChunk) -> None:
+        kinds = [kind for _name, kind in COLUMNS]
+        columns = [chunk.columns[name] for name in COLUMN_NAMES]
+        for values in zip(*columns):
+            self._csv.writerow(
+                [
+                    iso_time(v) if kind == "time" else self.LIST_SEPARATOR.join(v) if kind == "list" else ("" if v is None else v)
+                    for v, kind in zip(values, kinds)
+                ]
+            )
+        self.rows += len(chunk)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+# Formato colunar binário ("pstcol"): blocos de linhas com as colunas
+# comprimidas separadamente e um rodapé JSON com o esquema e o deslocamento
+# de cada bloco (lido do fim do arquivo, como no Parquet).
+#
+#   MAGIC | bloco... | rodapé JSON | tamanho do rodapé (u64) | MAGIC
+#   bloco = linhas (u32) e, por coluna, tamanho (u32) + dados zlib
+#
+# Inteiros e datas: int64 little-endian, ``COLUMNAR_NULL`` para ausente.
+# Textos: deslocamentos int64 (linhas + 1) seguidos do UTF-8 concatenado.
+# Listas: quantidade por linha (int64) seguida dos itens como coluna de textos.
+COLUMNAR_MAGIC = b"PSTCOL1\x00"
+COLUMNAR_VERSION = 1
+COLUMNAR_NULL = -(2**63)
+
+
+def _int64_bytes(values: Iterable[int]) -> bytes:
+    data = array("q", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _int64_values(data: bytes) -> array:
+    values = array("q")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _encode_strings(values: List[str]) -> bytes:
+    blobs = [(v or "").encode("utf-8", "surrogatepass") for v in values]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return _int64_bytes(offsets) + b"".join(blobs)
+
+
+def _decode_strings(data: bytes, rows: int, pos: int = 0) -> Tuple[List[str], int]:
+    offsets = _int64_values(data[pos : pos + (rows + 1) * 8])
+    base = pos + (rows + 1) * 8
+    values = [data[base + offsets[k] : base + offsets[k + 1]].decode("utf-8", "surrogatepass") for k in range(rows)]
+    return values, base + offsets[rows]
+
+
+def encode_column(kind: str, values: list) -> bytes:
+    if kind in ("int", "time"):
+        return _int64_bytes(COLUMNAR_NULL if v is None else v for v in values)
+    if kind == "list":
+        return _int64_bytes(len(v) for v in values) + _encode_strings([item for v in values for item in v])
+    return _encode_strings(values)
+
+
+def decode_column(kind: str, data: bytes, rows: int) -> list:
+    if kind in ("int", "time"):
+        return [None if v == COLUMNAR_NULL else v for v in _int64_values(data)]
+    if kind == "list":
+        counts = _int64_values(data[: rows * 8])
+        items, _end = _decode_strings(data, sum(counts), rows * 8)
+        values, k = [], 0
+        for n in counts:
+            values.append(items[k : k + n])
+            k += n
+        return values
+    return _decode_strings(data, rows)[0]
+
+
+class ColumnarWriter(MetadataWriter):
+    """Arquivo colunar compacto (ver o formato acima); ``read_columnar`` lê de volta."""
+
+    extension = ".pstcol"
+
+    def __init__(self, path: str, level: int = 6) -> None:
+        super().__init__(path)
+        self.level = level
+        self._file = open(path, "wb")
+        self._file.write(COLUMNAR_MAGIC)
+        self._chunks: List[dict] = []
+
+    def write_chunk(self, chunk: MetadataChunk) -> None:
+        rows = len(chunk)
+        if not rows:
+            return
+        offset = self._file.tell()
+        parts = [struct.pack("<I", rows)]
+        for name, kind in COLUMNS:
+            data = zlib.compress(encode_column(kind, chunk.columns[name]), self.level)
+            parts.append(struct.pack("<I", len(data)))
+            parts.append(data)
+        self._file.write(b"".join(parts))
+        self._chunks.append({"offset": offset, "rows": rows})
+        self.rows += rows
+
+    def close(self) -> None:
+        footer = json.dumps(
+            {
+                "version": COLUMNAR_VERSION,
+                "columns": [list(c) for c in COLUMNS],
+                "rows": self.rows,
+                "chunks": self._chunks,
+            }
+        ).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(struct.pack("<Q", len(footer)))
+        self._file.write(COLUMNAR_MAGIC)
+        self._file.close()
+
+
+def read_columnar(path: str, columns: Optional[Iterable[str]] = None) -> Iterator[MetadataChunk]:
+    """Blocos do arquivo colunar; ``columns`` limita as colunas decodificadas."""
+    with open(path, "rb") as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"Não é um arquivo colunar: {path}")
+        f.seek(-(8 + len(COLUMNAR_MAGIC)), os.SEEK_END)
+        (footer_len,) = struct.unpack("<Q", f.read(8))
+        if f.read() != COLUMNAR_MAGIC:
+            raise ValueError(f"Arquivo colunar incompleto: {path}")
+        f.seek(-(8 + len(COLUMNAR_MAGIC) + footer_len), os.SEEK_END)
+        footer = json.loads(f.read(footer_len))
+        schema = [tuple(c) for c in footer["columns"]]
+        wanted = set(columns) if columns is not None else {name for name, _kind in schema}
+        for entry in footer["chunks"]:
+            f.seek(entry["offset"])
+            (rows,) = struct.unpack("<I", f.read(4))
+            chunk = MetadataChunk({})
+            for name, kind in schema:
+                (size,) = struct.unpack("<I", f.read(4))
+                if name not in wanted:
+                    f.seek(size, os.SEEK_CUR)
+                    continue
+                chunk.columns[name] = decode_column(kind, zlib.decompress(f.read(size)), rows)
+            yield chunk
+
+
+WRITERS: Dict[str, Type[MetadataWriter]] = {
+    "jsonl": JsonlWriter,
+    "csv": CsvWriter,
+    "columnar": ColumnarWriter,
+}
+
+
+def register_writer(name: str, writer: Type[MetadataWriter]) -> None:
+    WRITERS[name] = writer
+
+
+def format_for_path(path: str, default: str = "jsonl") -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return next((name for name, writer in WRITERS.items() if writer.extension == ext), default)
+
+
+# Exportação
+@dataclass
+class MetadataShard:
+    folder_id: str
+    path: str
+    start: int
+    count: int
+
+
+@dataclass
+class MetadataProgress:
+    shards_total: int = 0
+    shards_done: int = 0
+    rows: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class MetadataExporter:
+    """Metadados de todas as mensagens num arquivo analítico, em streaming.
+
+    As pastas são lidas em fatias de ``chunk_rows`` mensagens (em paralelo
+    com ``workers > 1``, um processo e um handle pypff por worker); as
+    fatias são regravadas em blocos de exatamente ``chunk_rows`` linhas, na
+    ordem das pastas. No máximo ``IN_FLIGHT_PER_WORKER`` fatias por worker
+    ficam em memória, seja qual for o tamanho do PST.
+    """
+
+    def __init__(
+        self,
+        pst_path: str,
+        out_path: str,
+        fmt: Optional[str] = None,
+        workers: int = 1,
+        chunk_rows: int = CHUNK_ROWS,
+        index_dir: Optional[str] = None,
+        on_progress: Optional[Callable[[MetadataProgress], None]] = None,
+    ) -> None:
+        self.pst_path = os.path.abspath(pst_path)
+        self.out_path = out_path
+        self.fmt = fmt or format_for_path(out_path)
+        if self.fmt not in WRITERS:
+            raise ValueError(f"Formato inválido: {self.fmt} (use {', '.join(sorted(WRITERS))})")
+        self.workers = max(1, workers)
+        self.chunk_rows = max(1, chunk_rows)
+        self.index_dir = index_dir
+        self.on_progress = on_progress
+
+    def plan(self, reader: PstReader, folder_ids: Optional[Iterable[str]] = None) -> List[MetadataShard]:
+        wanted = set(folder_ids or [])
+        shards: List[MetadataShard] = []
+        for folder, path, _depth in reader.walk_folders():
+            if wanted and folder.id not in wanted:
+                continue
+            total = reader.count_messages(folder.id)
+            for start in range(0, total, self.chunk_rows):
+                shards.append(MetadataShard(folder.id, path, start, min(self.chunk_rows, total - start)))
+        return shards
+
+    def run(self, reader: Optional[PstReader] = None, folder_ids: Optional[Iterable[str]] = None) -> MetadataProgress:
+        started = time.perf_counter()
+        # Leitor aberto aqui é fechado aqui; o recebido continua com quem chamou
+        owned = reader is None
+        if owned:
+            reader = PstReader(index_dir=self.index_dir, lazy_folders=True)
+        try:
+            if owned:
+                reader.open(self.pst_path)
+            progress = self._run(reader, folder_ids, started)
+        finally:
+            if owned:
+                reader.close()
+        progress.elapsed = time.perf_counter() - started
+        return progress
+
+    def _run(self, reader: PstReader, folder_ids: Optional[Iterable[str]], started: float) -> MetadataProgress:
+        shards = self.plan(reader, folder_ids)
+        progress = MetadataProgress(shards_total=len(shards))
+        writer = WRITERS[self.fmt](self.out_path)
+        pending = MetadataChunk()
+
+        def flush(final: bool = False) -> None:
+            while len(pending) >= self.chunk_rows or (final and len(pending)):
+                chunk = pending.split(self.chunk_rows)
+                with span("metadata.write_chunk"):
+                    writer.write_chunk(chunk)
+                progress.rows += len(chunk)
+                progress.chunks += 1
+
+        def record(result: Tuple[MetadataChunk, List[str]]) -> None:
+            chunk, errors = result
+            pending.extend(chunk)
+            progress.errors.extend(errors)
+            progress.shards_done += 1
+            flush()
+            progress.elapsed = time.perf_counter() - started
+            if self.on_progress:
+                self.on_progress(progress)
+
+        try:
+            if self.workers <= 1 or len(shards) <= 1:
+                for shard in shards:
+                    record(_collect_with(reader, shard))
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=init_worker_reader,
+                    initargs=(self.pst_path, self.index_dir),
+                ) as pool:
+                    # Janela limitada e consumida em ordem: memória constante e
+                    # saída na ordem das pastas
+                    window: Deque[Future] = deque()
+                    queued = iter(shards)
+                    limit = self.workers * IN_FLIGHT_PER_WORKER
+                    for shard in queued:
+                        window.append(pool.submit(_collect, shard))
+                        if len(window) >= limit:
+                            record(window.popleft().result())
+                    while window:
+                        record(window.popleft().result())
+            flush(final=True)
+        finally:
+            writer.close()
+        return progress
+
+
+def _collect(shard: MetadataShard) -> Tuple[MetadataChunk, List[str]]:
+    return _collect_with(worker_reader(), shard)
+
+
+@traced("metadata.collect")
+def _collect_with(reader: PstReader, shard: MetadataShard) -> Tuple[MetadataChunk, List[str]]:
+    chunk = MetadataChunk()
+    errors: List[str] = []
+    try:
+        for meta in reader.iter_message_metadata(shard.folder_id, shard.start, shard.count):
+            chunk.append(meta, shard.folder_id, shard.path)
+    except Exception as exc:
+        errors.append(f"{shard.folder_id}:{shard.start}: {exc}")
+    return chunk, errors
@@ -3,6 +3,7 @@
 """
 
 from dataclasses import dataclass
+from datetime import datetime
 from typing import List, Optional
 
 
@@ -11,6 +12,64 @@ class PstFolder:
     id: str
     name: str
     children: List["PstFolder"]
+    # Contagens lidas sem carregar as subpastas (modo preguiçoso)
+    subfolder_count: int = 0
+    message_count: int = 0
+
+
+@dataclass
+class PstAttachment:
+    index: int
+    name: str
+    size: int
+    mime_type: str
+    is_embedded: bool = False
+
+    @property
+    def label(self) -> str:
+        if self.is_embedded:
+            return f"mensagem incorporada {self.index} ({self.mime_type})"
+        return f"{self.name} ({self.mime_type})"
+
+
+@dataclass
+class ExtractedAttachment:
+    index: int
+    name: str
+    path: str
+    size: int
+    # Hash hexadecimal do conteúdo (None se não solicitado)
+    digest: Optional[str] = None
+
+
+@dataclass
+class StoredAttachment:
+    message_id: str
+    index: int
+    name: str
+    size: int
+    digest: str
+    # Arquivo único do conteúdo no repositório (endereçado pelo hash)
+    blob_path: str
+    # False se o conteúdo já estava no repositório (nada foi gravado)
+    new: bool
+    # Link (ou cópia) na pasta da mensagem, se solicitado
+    path: Optional[str] = None
+
+
+@dataclass
+class MessageHeaders:
+    """Campos de uma mensagem usados para montar conversas (``src.index.threads``)."""
+
+    id: str
+    subject: str
+    sender: str
+    epoch: Optional[int]
+    attachment_count: int
+    # Cabeçalhos de transporte como vieram no PST (vazio se ausentes)
+    transport_headers: str = ""
+    # PR_CONVERSATION_INDEX (Outlook/Exchange), se o adaptador expuser
+    conversation_index: Optional[bytes] = None
 
 
 @dataclass
@@ -23,4 +82,49 @@ class PstEmail:
     date: Optional[str]
     body_text: Optional[str]
     body_html: Optional[str]
-    attachments: List[str]
+    attachments: List[PstAttachment]
+    attachment_count: int = 0
+    # Datas em UTC (com fuso); ``date`` é o texto exibido do envio
+    timestamp: Optional[datetime] = None
+    delivery_time: Optional[datetime] = None
+    creation_time: Optional[datetime] = None
+
+    @property
+    def epoch(self) -> Optional[int]:
+        """Envio em segundos desde a época (None se sem data)."""
+        return int(self.timestamp.timestamp()) if self.timestamp is not None else None
+
+
+@dataclass
+class MessageStat:
+    """Métricas de uma mensagem para o relatório de estatísticas."""
+
+    id: str
+    subject: str
+    epoch: Optional[int]
+    # Bytes dos corpos (texto, HTML, RTF); 0 se o tamanho não é conhecido
+    body_size: int
+    # Metadados dos anexos (vazio quando só a contagem é conhecida)
+    attachments: List[PstAttachment]
+    attachment_count: int = 0
+
+
+@dataclass
+class MessageMetadata:
+    """Metadados de uma mensagem para exportação analítica (sem corpos)."""
+
+    id: str
+    subject: str
+    sender: str
+    to: str
+    cc: str
+    # Envio, entrega e criação em época UTC (None se ausentes)
+    sent: Optional[int]
+    delivered: Optional[int]
+    created: Optional[int]
+    # Tamanho da mensagem no PST ou no mbox (None se desconhecido)
+    size: Optional[int]
+    body_size: int
+    # Metadados dos anexos (tipos declarados ou pela extensão)
+    attachments: List[PstAttachment]
+    attachment_count: int = 0
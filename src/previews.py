@@ -0,0 +1,147 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from src.models import PstEmail
+from src.utils.dates import display_date, to_epoch, to_utc
+
+# Marcador de "sem data" na coluna de datas (época em segundos)
+NO_DATE = -(2**63)
+
+SORT_KEYS = ("subject", "sender", "date")
+
+
+def epoch_from_datetime(value) -> int:
+    """Segundos desde a época (UTC); datas sem fuso são tomadas como UTC."""
+    epoch = to_epoch(value)
+    return NO_DATE if epoch is None else epoch
+
+
+def epoch_from_text(text: Optional[str]) -> int:
+    return epoch_from_datetime(text)
+
+
+def format_epoch(epoch: int) -> str:
+    if epoch == NO_DATE:
+        return ""
+    return display_date(epoch) or ""
+
+
+class PreviewBatch:
+    """Prévias de mensagens em colunas paralelas.
+
+    Uma lista por campo (IDs, assuntos, remetentes) e ``array`` para datas
+    (época em segundos, ``NO_DATE`` se ausente) e contagens de anexos, em vez
+    de um ``PstEmail`` por mensagem. Remetentes repetidos compartilham a
+    mesma string.
+    """
+
+    __slots__ = ("folder_id", "start", "ids", "positions", "subjects", "senders", "dates", "attachment_counts", "_senders")
+
+    def __init__(self, folder_id: Optional[str] = None, start: int = 0) -> None:
+        self.folder_id = folder_id
+        # Posição da primeira linha na pasta
+        self.start = start
+        self.ids: List[str] = []
+        # Posição de cada linha na pasta (chave das permutações de ordenação)
+        self.positions = array("l")
+        self.subjects: List[str] = []
+        self.senders: List[str] = []
+        self.dates = array("q")
+        self.attachment_counts = array("l")
+        self._senders: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(
+        self,
+        msg_id: str,
+        subject: str,
+        sender: str,
+        date: int,
+        attachment_count: int = 0,
+        position: Optional[int] = None,
+    ) -> None:
+        sender = sender or ""
+        self.positions.append(self.start + len(self.ids) if position is None else position)
+        self.ids.append(msg_id)
+        self.subjects.append(subject or "")
+        self.senders.append(self._senders.setdefault(sender, sender))
+        self.dates.append(date)
+        self.attachment_counts.append(attachment_count or 0)
+
+    def append_email(self, msg: PstEmail, position: Optional[int] = None) -> None:
+        epoch = msg.epoch if msg.timestamp is not None else epoch_from_text(msg.date)
+        self.append(msg.id, msg.subject, msg.sender, epoch, msg.attachment_count, position)
+
+    @classmethod
+    def from_emails(cls, emails: Iterable[PstEmail], folder_id: Optional[str] = None) -> "PreviewBatch":
+        batch = cls(folder_id)
+        for msg in emails:
+            batch.append_email(msg)
+        return batch
+
+    def extend(self, other: "PreviewBatch") -> None:
+        for k in range(len(other)):
+            self.append(
+                other.ids[k], other.subjects[k], other.senders[k], other.dates[k], other.attachment_counts[k], other.positions[k]
+            )
+
+    # Acesso
+    def date_text(self, k: int) -> str:
+        return format_epoch(self.dates[k])
+
+    def email(self, k: int) -> PstEmail:
+        """Linha ``k`` como ``PstEmail`` (para código que ainda espera objetos)."""
+        return PstEmail(
+            id=self.ids[k],
+            subject=self.subjects[k],
+            sender=self.senders[k],
+            to="",
+            cc="",
+            date=self.date_text(k) or None,
+            body_text=None,
+            body_html=None,
+            attachments=[],
+            attachment_count=self.attachment_counts[k],
+            timestamp=None if self.dates[k] == NO_DATE else to_utc(self.dates[k]),
+        )
+
+    def slice(self, start: int, count: int) -> "PreviewBatch":
+        return self.take(range(start, min(start + count, len(self))))
+
+    def take(self, order: Sequence[int]) -> "PreviewBatch":
+        batch = PreviewBatch(self.folder_id)
+        batch.ids = [self.ids[i] for i in order]
+        batch.positions = array("l", (self.positions[i] for i in order))
+        batch.subjects = [self.subjects[i] for i in order]
+        batch.senders = [self.senders[i] for i in order]
+        batch.dates = array("q", (self.dates[i] for i in order))
+        batch.attachment_counts = array("l", (self.attachment_counts[i] for i in order))
+        batch._senders = self._senders
+        return batch
+
+    # Ordenação sobre as colunas
+    def sort_column(self, key: str) -> Sequence:
+        """Valores comparáveis da coluna ``key`` (texto sem caixa, data em época)."""
+        if key == "date":
+            return self.dates
+        if key == "subject":
+            return [s.casefold() for s in self.subjects]
+        if key == "sender":
+            # Remetentes são compartilhados: uma chave por remetente distinto
+            folded = {s: s.casefold() for s in self._senders}
+            return [folded.get(s) or s.casefold() for s in self.senders]
+        raise ValueError(f"Coluna de ordenação inválida: {key} (use {', '.join(SORT_KEYS)})")
+
+    def sort_order(self, key: str = "date", reverse: bool = False) -> List[int]:
+        """Permutação de índices que ordena o lote pela coluna ``key``."""
+        column = self.sort_column(key)
+        # sorted é estável: empates mantêm a ordem da pasta
+        return sorted(range(len(self)), key=column.__getitem__, reverse=reverse)
@@ -2,48 +2,150 @@
 @author João Gbriel de Almeida
 """
 
-from typing import List
+from array import array
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+import importlib.util
+import os
 import shutil
 
-from src.models import PstFolder, PstEmail
+from src.attachment_store import AttachmentStore
+from src.instrumentation import result_len, traced
+from src.index.sorting import SortIndex, SortSpec, build_sort_index, combine
+from src.index.threads import ThreadIndex, ThreadMessage
+from src.message_cache import DEFAULT_CACHE_BYTES, CacheNamespace, CacheStats, MessageCache
+from src.models import ExtractedAttachment, MessageHeaders, MessageMetadata, MessageStat, PstAttachment, PstFolder, PstEmail, StoredAttachment
+from src.previews import PreviewBatch
+from src.utils.dates import DateLike, to_epoch
+from src.utils.exporters import NameAllocator, copy_chunks, sanitize_filename
 
+# Chaves das ordens de pasta no cache de mensagens (IDs de mensagem não têm NUL)
+SORT_CACHE_PREFIX = "sort\x00"
 
 class BaseAdapter:
+    # Arquivo SQLite do índice persistente, se o adaptador mantiver um
+    index_path: Optional[str] = None
+
     def open(self, path: str) -> None:  # pragma: no cover
         raise NotImplementedError
 
+    def close(self) -> None:
+        return None
+
     def get_root_folders(self) -> List[PstFolder]:  # pragma: no cover
         raise NotImplementedError
 
-    def list_messages(self, folder_id: str) -> List[PstEmail]:  # pragma: no cover
+    def get_sub_folders(self, folder_id: str) -> List[PstFolder]:  # pragma: no cover
+        raise NotImplementedError
+
+    def list_messages(self, folder_id: str, since: DateLike = None, until: DateLike = None) -> List[PstEmail]:  # pragma: no cover
+        raise NotImplementedError
+
+    def count_messages(self, folder_id: str) -> int:  # pragma: no cover
         raise NotImplementedError
 
+    def iter_messages(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[PstEmail]:  # pragma: no cover
+        raise NotImplementedError
+
+    def preview_batch(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> PreviewBatch:
+        batch = PreviewBatch(folder_id, start)
+        for msg in self.iter_messages(folder_id, start, count):
+            batch.append_email(msg)
+        return batch
+
+    def preview_batch_at(self, folder_id: str, positions: List[int]) -> PreviewBatch:
+        full = self.preview_batch(folder_id)
+        at = {p: k for k, p in enumerate(full.positions)}
+        return full.take([at[p] for p in positions if p in at])
+
+    def sort_index(self, folder_id: str, key: str) -> SortIndex:
+        return build_sort_index(self.preview_batch(folder_id), key)
+
+    def index_messages(self, folder_id: str, start: int, count: int) -> Optional[int]:
+        # Adaptadores sem índice persistente não têm o que indexar
+        return None
+
+    def iter_message_stats(
+        self, folder_id: str, start: int = 0, count: Optional[int] = None, metadata_only: bool = True
+    ) -> Iterator[MessageStat]:
+        for msg in self.iter_messages(folder_id, start, count):
+            if metadata_only:
+                yield MessageStat(msg.id, msg.subject, msg.epoch, 0, [], msg.attachment_count)
+                continue
+            full = self.get_message(msg.id)
+            body_size = sum(len(b.encode("utf-8")) for b in (full.body_text, full.body_html) if b)
+            yield MessageStat(msg.id, msg.subject, full.epoch, body_size, full.attachments, len(full.attachments))
+
+    def iter_message_metadata(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[MessageMetadata]:
+        for msg in self.iter_messages(folder_id, start, count):
+            full = self.get_message(msg.id)
+            body_size = sum(len(b.encode("utf-8")) for b in (full.body_text, full.body_html) if b)
+            yield MessageMetadata(
+                id=msg.id,
+                subject=full.subject,
+                sender=full.sender,
+                to=full.to,
+                cc=full.cc,
+                sent=full.epoch,
+                delivered=to_epoch(full.delivery_time),
+                created=to_epoch(full.creation_time),
+                size=None,
+                body_size=body_size,
+                attachments=full.attachments,
+                attachment_count=len(full.attachments),
+            )
+
+    def iter_thread_headers(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[MessageHeaders]:
+        # Sem cabeçalhos de transporte: as conversas saem só do assunto
+        for msg in self.iter_messages(folder_id, start, count):
+            yield MessageHeaders(msg.id, msg.subject, msg.sender, msg.epoch, msg.attachment_count)
+
     def get_message(self, msg_id: str) -> PstEmail:  # pragma: no cover
         raise NotImplementedError
 
     def export_eml(self, msg_id: str, out_path: str) -> None:  # pragma: no cover
         raise NotImplementedError
 
-    def get_attachments(self, msg_id: str) -> List[str]:  # pragma: no cover
+    def write_eml(self, msg_id: str, out: BinaryIO) -> int:  # pragma: no cover
+        """Grava a mensagem em EML num arquivo binário aberto; devolve os bytes escritos."""
         raise NotImplementedError
 
-    def save_attachments(self, msg_id: str, output_dir: str) -> List[str]:  # returns saved file paths
+    def get_attachments(self, msg_id: str) -> List[PstAttachment]:  # pragma: no cover
+        raise NotImplementedError
+
+    def iter_attachment_data(self, msg_id: str) -> Iterator[Tuple[int, str, str, Iterator[bytes]]]:  # pragma: no cover
+        """(índice, nome, tipo MIME, blocos do conteúdo) de cada anexo que não é mensagem incorporada."""
         raise NotImplementedError
 
 
 class PstReader:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        index_dir: Optional[str] = None,
+        lazy_folders: bool = False,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+        cache: Optional[CacheNamespace] = None,
+    ) -> None:
         self.adapter: BaseAdapter | None = None
+        # Caminho absoluto do PST aberto
+        self.path: Optional[str] = None
+        # Diretório do índice SQLite persistente (None desativa o índice)
+        self.index_dir = index_dir
+        # Ler apenas o primeiro nível de pastas na abertura
+        self.lazy_folders = lazy_folders
+        # Mensagens completas já decodificadas (0 desativa); ``cache`` divide
+        # o limite com outros PSTs abertos (ver ``src.session``)
+        self.cache = cache if cache is not None else MessageCache(cache_bytes)
 
+    @traced()
     def open(self, path: str) -> None:
+        self.cache.clear()
+        self.path = os.path.abspath(path)
         # Prefer pypff
-        try:
+        if importlib.util.find_spec("pypff") is not None:
             from src.adapters.pypff_adapter import PypffAdapter  # lazy import
-        except ImportError:
-            self.adapter = None
-        else:
+
             try:
-                adapter = PypffAdapter()
+                adapter = PypffAdapter(index_dir=self.index_dir, lazy=self.lazy_folders)
                 adapter.open(path)
                 self.adapter = adapter
                 return
@@ -55,7 +157,7 @@ class PstReader:
         if shutil.which("readpst"):
             from src.adapters.readpst_adapter import ReadPstAdapter
 
-            adapter = ReadPstAdapter()
+            adapter = ReadPstAdapter(index_dir=self.index_dir)
             adapter.open(path)
             self.adapter = adapter
             return
@@ -64,25 +166,192 @@ class PstReader:
             "Nenhum adaptador disponível: instale pypff/libpff ou disponibilize readpst no PATH."
         )
 
+    def close(self) -> None:
+        """Fecha o handle do PST e descarta o que está em memória (pode ser reaberto com ``open``)."""
+        adapter, self.adapter = self.adapter, None
+        self.cache.clear()
+        if adapter is not None:
+            adapter.close()
+
+    @property
+    def is_open(self) -> bool:
+        return self.adapter is not None
+
+    @property
+    def index_path(self) -> Optional[str]:
+        return self.adapter.index_path if self.adapter else None
+
     def _require(self):
         if not self.adapter:
             raise RuntimeError("PST não aberto")
         return self.adapter
 
+    @traced()
     def get_root_folders(self) -> List[PstFolder]:
         return self._require().get_root_folders()
 
-    def list_messages(self, folder_id: str) -> List[PstEmail]:
-        return self._require().list_messages(folder_id)
+    @traced()
+    def get_sub_folders(self, folder_id: str) -> List[PstFolder]:
+        return self._require().get_sub_folders(folder_id)
+
+    def walk_folders(self) -> Iterator[Tuple[PstFolder, str, int]]:
+        """(pasta, caminho, profundidade) em pré-ordem, lendo subpastas sob demanda."""
+        stack: List[Tuple[PstFolder, str, int]] = [(f, f.name, 0) for f in reversed(self.get_root_folders())]
+        while stack:
+            folder, path, depth = stack.pop()
+            yield folder, path, depth
+            if folder.subfolder_count:
+                for child in reversed(self.get_sub_folders(folder.id)):
+                    stack.append((child, f"{path}/{child.name}", depth + 1))
+
+    @traced(size=result_len)
+    def list_messages(self, folder_id: str, since: DateLike = None, until: DateLike = None) -> List[PstEmail]:
+        """Prévias da pasta; ``since``/``until`` filtram o envio em [since, until) (UTC)."""
+        return self._require().list_messages(folder_id, since, until)
 
+    @traced()
+    def count_messages(self, folder_id: str) -> int:
+        return self._require().count_messages(folder_id)
+
+    def iter_folder_messages(self, folder_id: str, page_size: int = 1000) -> Iterator[PstEmail]:
+        """Todas as prévias da pasta, lidas em páginas (memória constante)."""
+        start = 0
+        while True:
+            page = list(self.iter_messages(folder_id, start, page_size))
+            yield from page
+            if len(page) < page_size:
+                return
+            start += page_size
+
+    def iter_messages(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[PstEmail]:
+        return self._require().iter_messages(folder_id, start, count)
+
+    @traced(size=result_len)
+    def preview_batch(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> PreviewBatch:
+        """Prévias da faixa em colunas (ver ``PreviewBatch``)."""
+        return self._require().preview_batch(folder_id, start, count)
+
+    def iter_preview_batches(self, folder_id: str, page_size: int = 1000) -> Iterator[PreviewBatch]:
+        start = 0
+        while True:
+            batch = self.preview_batch(folder_id, start, page_size)
+            if len(batch):
+                yield batch
+            if len(batch) < page_size:
+                return
+            start += page_size
+
+    @traced(size=result_len)
+    def preview_batch_at(self, folder_id: str, positions: List[int]) -> PreviewBatch:
+        """Prévias das posições dadas, na ordem dada."""
+        return self._require().preview_batch_at(folder_id, positions)
+
+    @traced()
+    def sort_order(self, folder_id: str, spec: SortSpec) -> array:
+        """Posições da pasta ordenadas por ``spec`` ([(coluna, decrescente)], principal primeiro)."""
+        return combine({key: self._sort_index(folder_id, key) for key, _reverse in spec}, spec)
+
+    def _sort_index(self, folder_id: str, key: str) -> SortIndex:
+        # No cache de mensagens: numa sessão, as ordens entram no mesmo limite de bytes
+        cache_key = f"{SORT_CACHE_PREFIX}{folder_id}/{key}"
+        found = self.cache.get(cache_key)
+        if found is None:
+            found = self._require().sort_index(folder_id, key)
+            self.cache.put(found, key=cache_key, size=found.nbytes)
+        return found
+
+    @traced()
+    def index_messages(self, folder_id: str, start: int, count: int) -> Optional[int]:
+        return self._require().index_messages(folder_id, start, count)
+
+    def iter_message_stats(
+        self, folder_id: str, start: int = 0, count: Optional[int] = None, metadata_only: bool = True
+    ) -> Iterator[MessageStat]:
+        """Métricas por mensagem para ``src.stats`` (não passa pelo cache de mensagens)."""
+        return self._require().iter_message_stats(folder_id, start, count, metadata_only)
+
+    def iter_message_metadata(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[MessageMetadata]:
+        """Metadados da faixa para ``src.metadata_export`` (não passa pelo cache de mensagens)."""
+        return self._require().iter_message_metadata(folder_id, start, count)
+
+    def iter_thread_headers(self, folder_id: str, start: int = 0, count: Optional[int] = None) -> Iterator[MessageHeaders]:
+        """Prévias com cabeçalhos de encadeamento para ``src.index.threads``."""
+        return self._require().iter_thread_headers(folder_id, start, count)
+
+    @traced()
+    def conversation(self, msg_id: str) -> List[ThreadMessage]:
+        """Conversa da mensagem em todas as pastas, do índice de conversas.
+
+        Só consulta o índice (preenchido por ``update_thread_index``, na
+        indexação de fundo); [] se a mensagem ainda não foi indexada.
+        """
+        if self._require().index_path is None:
+            raise RuntimeError("Conversas precisam do índice persistente")
+        index = ThreadIndex(self.index_path)
+        try:
+            return index.load_thread(msg_id)
+        finally:
+            index.close()
+
+    @traced()
     def get_message(self, msg_id: str) -> PstEmail:
-        return self._require().get_message(msg_id)
+        msg = self.cache.get(msg_id)
+        if msg is None:
+            msg = self._require().get_message(msg_id)
+            self.cache.put(msg)
+        return msg
+
+    @traced()
+    def prefetch(self, msg_id: str) -> bool:
+        """Decodifica e guarda no cache se ainda não estiver lá; True se leu o PST."""
+        if msg_id in self.cache:
+            return False
+        self.cache.put(self._require().get_message(msg_id))
+        return True
 
+    @property
+    def cache_stats(self) -> CacheStats:
+        return self.cache.stats()
+
+    @traced()
+    def get_attachments(self, msg_id: str) -> List[PstAttachment]:
+        msg = self.cache.get(msg_id)
+        if msg is not None:
+            return list(msg.attachments)
+        return self._require().get_attachments(msg_id)
+
+    @traced()
     def export_eml(self, msg_id: str, out_path: str) -> None:
         return self._require().export_eml(msg_id, out_path)
 
-    def get_attachments(self, msg_id: str) -> List[str]:
-        return self._require().get_attachments(msg_id)
+    @traced(size=lambda n: n)
+    def write_eml(self, msg_id: str, out: BinaryIO) -> int:
+        """EML da mensagem num arquivo já aberto (ex.: uma entrada de mbox)."""
+        return self._require().write_eml(msg_id, out)
 
+    @traced()
     def save_attachments(self, msg_id: str, output_dir: str) -> List[str]:
-        return self._require().save_attachments(msg_id, output_dir)
+        return [item.path for item in self.extract_attachments(msg_id, output_dir, hash_name=None)]
+
+    @traced()
+    def extract_attachments(self, msg_id: str, output_dir: str, hash_name: Optional[str] = "sha256") -> List[ExtractedAttachment]:
+        """Grava os anexos em blocos de tamanho fixo, calculando o hash durante a cópia."""
+        adapter = self._require()
+        os.makedirs(output_dir, exist_ok=True)
+        names = NameAllocator(output_dir)
+        saved: List[ExtractedAttachment] = []
+        for index, name, _mime, chunks in adapter.iter_attachment_data(msg_id):
+            out_path = names.reserve(sanitize_filename(name))
+            size, digest = copy_chunks(chunks, out_path, hash_name)
+            if not size:
+                os.remove(out_path)
+                names.release(out_path)
+                continue
+            saved.append(ExtractedAttachment(index=index, name=os.path.basename(out_path), path=out_path, size=size, digest=digest))
+        return saved
+
+    @traced()
+    def store_attachments(self, msg_id: str, store: AttachmentStore, link_dir: Optional[str] = None) -> List[StoredAttachment]:
+        """Anexos no repositório endereçado pelo conteúdo (cada conteúdo gravado uma vez)."""
+        adapter = self._require()
+        return store.store_message(self.path or "", msg_id, adapter.iter_attachment_data(msg_id), link_dir)
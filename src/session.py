@@ -0,0 +1,314 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import os
+import threading
+import time
+
+from src.index.search import SearchHit, SearchIndex
+from src.message_cache import DEFAULT_CACHE_BYTES, CacheNamespace, CacheStats, MessageCache
+from src.pst_reader import PstReader
+from src.utils.exporters import sanitize_filename
+
+# Separador entre a chave do PST e o ID local de pasta/mensagem ("p3|156:12")
+SEP = "|"
+# Handles pypff abertos ao mesmo tempo; os menos usados são fechados
+DEFAULT_MAX_OPEN = 8
+# PST sem uso há mais que isso é fechado por ``evict_idle``
+DEFAULT_IDLE_SECONDS = 300.0
+DEFAULT_WORKERS = 4
+
+T = TypeVar("T")
+
+
+def qualify(key: str, local_id: str) -> str:
+    return f"{key}{SEP}{local_id}"
+
+
+def split_id(qualified_id: str) -> Tuple[str, str]:
+    key, sep, local_id = qualified_id.partition(SEP)
+    if not sep:
+        raise KeyError(f"ID sem PST: {qualified_id}")
+    return key, local_id
+
+
+@dataclass
+class SessionEntry:
+    key: str
+    path: str
+    reader: PstReader
+    # Índice persistente, conhecido depois da primeira abertura (busca com o PST fechado)
+    index_path: Optional[str] = None
+    last_used: float = 0.0
+    leases: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def is_open(self) -> bool:
+        return self.reader.is_open
+
+
+class PstSession:
+    """Catálogo de vários PSTs abertos ao mesmo tempo.
+
+    Cada PST ganha uma chave curta (``p1``, ``p2``...) que prefixa os IDs de
+    pastas e mensagens (``qualify``/``split_id``). Mensagens decodificadas e
+    ordens de pastas (``sort_order``) de todos dividem um só ``MessageCache``
+    (um limite de bytes). Fora do limite ficam a árvore de pastas e o mapa
+    de IDs de cada PST aberto, por isso no máximo ``max_open`` handles ficam
+    abertos e PSTs ociosos são fechados. Um PST fechado é reaberto sob
+    demanda em ``lease``/``run`` (rápido com o índice persistente); o leitor
+    só é usado dentro deles, para não ser fechado no meio de uma chamada.
+    """
+
+    def __init__(
+        self,
+        index_dir: Optional[str] = None,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+        max_open: int = DEFAULT_MAX_OPEN,
+        idle_seconds: float = DEFAULT_IDLE_SECONDS,
+        workers: int = DEFAULT_WORKERS,
+        lazy_folders: bool = True,
+    ) -> None:
+        self.index_dir = index_dir
+        self.max_open = max(1, max_open)
+        self.idle_seconds = idle_seconds
+        self.workers = max(1, workers)
+        self.lazy_folders = lazy_folders
+        self.cache = MessageCache(cache_bytes)
+        self._entries: Dict[str, SessionEntry] = {}
+        self._lock = threading.RLock()
+        self._next = 1
+
+    # Catálogo
+    def entries(self) -> List[SessionEntry]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def entry(self, key: str) -> SessionEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            raise KeyError(f"PST não está na sessão: {key}")
+        return entry
+
+    def find(self, path: str) -> Optional[SessionEntry]:
+        path = os.path.abspath(path)
+        with self._lock:
+            return next((e for e in self._entries.values() if e.path == path), None)
+
+    def add(self, path: str) -> SessionEntry:
+        """Abre o PST e o inclui na sessão (ou devolve a entrada existente)."""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self.find(path)
+            if entry is None:
+                key = f"p{self._next}"
+                self._next += 1
+                reader = PstReader(
+                    index_dir=self.index_dir,
+                    lazy_folders=self.lazy_folders,
+                    cache=CacheNamespace(self.cache, key + SEP),
+                )
+                entry = self._entries[key] = SessionEntry(key, path, reader)
+        try:
+            with self.lease(entry.key):
+                pass
+        except Exception:
+            with self._lock:
+                self._entries.pop(entry.key, None)
+            raise
+        return entry
+
+    def open_many(
+        self,
+        paths: Iterable[str],
+        on_opened: Optional[Callable[[str, Optional[SessionEntry], Optional[BaseException]], None]] = None,
+    ) -> List[Tuple[str, Optional[SessionEntry], Optional[BaseException]]]:
+        """Abre vários PSTs em paralelo; devolve (caminho, entrada, erro) na ordem de ``paths``.
+
+        ``on_opened`` é chamado na thread do pool, a cada PST concluído.
+        """
+        paths = list(paths)
+        results: Dict[str, Tuple[Optional[SessionEntry], Optional[BaseException]]] = {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, max(1, len(paths)))) as pool:
+            futures = {pool.submit(self.add, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    results[path] = (future.result(), None)
+                except Exception as exc:
+                    results[path] = (None, exc)
+                if on_opened:
+                    on_opened(path, *results[path])
+        return [(path, *results[path]) for path in paths]
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            with entry.lock:
+                entry.reader.close()
+
+    def close(self) -> None:
+        for entry in self.entries():
+            self.remove(entry.key)
+
+    # Uso
+    @contextmanager
+    def lease(self, key: str) -> Iterator[PstReader]:
+        """Leitor aberto do PST (reabre se foi fechado); não é fechado até o fim do bloco."""
+        entry = self.entry(key)
+        # O lease vem antes da abertura: ``_evict`` não fecha o que já tem lease
+        with self._lock:
+            entry.leases += 1
+        try:
+            with entry.lock:
+                if not entry.reader.is_open:
+                    entry.reader.open(entry.path)
+                    entry.index_path = entry.reader.index_path
+                entry.last_used = time.monotonic()
+            self._enforce_max_open(keep=key)
+            yield entry.reader
+        finally:
+            with self._lock:
+                entry.leases -= 1
+                entry.last_used = time.monotonic()
+
+    def run(self, key: str, fn: Callable[[PstReader], T]) -> T:
+        """``fn(leitor)`` dentro de um ``lease`` (ex.: jobs da thread de I/O)."""
+        with self.lease(key) as reader:
+            return fn(reader)
+
+    @contextmanager
+    def resolve(self, qualified_id: str) -> Iterator[Tuple[PstReader, str]]:
+        """(leitor, ID local) de um ID qualificado, dentro de um ``lease``."""
+        key, local_id = split_id(qualified_id)
+        with self.lease(key) as reader:
+            yield reader, local_id
+
+    def _enforce_max_open(self, keep: str) -> None:
+        with self._lock:
+            others = [e for e in self._entries.values() if e.is_open and e.key != keep]
+        excess = len(others) + 1 - self.max_open
+        # Em uso (lease) não fecha: o limite pode ficar excedido até o fim do uso
+        for entry in sorted((e for e in others if not e.leases), key=lambda e: e.last_used)[: max(0, excess)]:
+            self._evict(entry)
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """Fecha os PSTs sem uso há mais de ``idle_seconds``; devolve as chaves fechadas."""
+        now = time.monotonic() if now is None else now
+        closed = []
+        for entry in self.entries():
+            if entry.is_open and not entry.leases and now - entry.last_used > self.idle_seconds:
+                if self._evict(entry):
+                    closed.append(entry.key)
+        return closed
+
+    def _evict(self, entry: SessionEntry) -> bool:
+        # Abrindo agora (lock ocupado): fica para a próxima
+        if not entry.lock.acquire(blocking=False):
+            return False
+        try:
+            # Um lease novo depois desta checagem espera o lock e reabre o PST
+            with self._lock:
+                if entry.leases or not entry.reader.is_open:
+                    return False
+            entry.reader.close()
+            return True
+        finally:
+            entry.lock.release()
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        return self.cache.stats()
+
+    # Operações em todos os PSTs
+    def search(self, query: str, limit: int = 500) -> List[Tuple[str, SearchHit]]:
+        """Busca nos índices de todos os PSTs em paralelo; (chave, resultado) por relevância.
+
+        Usa só os índices de busca já construídos (``SearchIndexer``), sem
+        reabrir PSTs fechados; IDs de ``SearchHit`` continuam locais ao PST.
+        """
+        targets = [(e.key, e.index_path) for e in self.entries() if e.index_path]
+
+        def run(key: str, db_path: str) -> List[Tuple[str, SearchHit]]:
+            index = SearchIndex(db_path)
+            try:
+                return [(key, hit) for hit in index.search(query, limit=limit)]
+            finally:
+                index.close()
+
+        hits: List[Tuple[str, SearchHit]] = []
+        if not targets:
+            return hits
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(targets))) as pool:
+            for part in pool.map(lambda t: run(*t), targets):
+                hits.extend(part)
+        # bm25: menor é melhor (as escalas de PSTs diferentes são próximas, não idênticas)
+        hits.sort(key=lambda kh: kh[1].rank)
+        return hits[:limit]
+
+    def export(
+        self,
+        out_dir: str,
+        fmt: str = "eml",
+        workers_per_pst: int = 1,
+        keys: Optional[Iterable[str]] = None,
+        on_progress: Optional[Callable[[str, object], None]] = None,
+    ) -> Dict[str, object]:
+        """Exporta os PSTs em paralelo, cada um em ``out_dir/<nome do PST>``.
+
+        Cada PST roda um ``BulkExporter`` (com ``workers_per_pst`` processos);
+        devolve o ``ExportProgress`` final por chave.
+        """
+        from src.bulk_export import BulkExporter
+
+        wanted = set(keys or [])
+        entries = [e for e in self.entries() if not wanted or e.key in wanted]
+        names: Dict[str, int] = {}
+        for entry in entries:
+            stem = os.path.splitext(entry.name)[0]
+            names[stem] = names.get(stem, 0) + 1
+
+        def run(entry: SessionEntry):
+            stem = os.path.splitext(entry.name)[0]
+            # Nomes repetidos (mesmo arquivo em pastas diferentes): sufixo com a chave
+            folder = sanitize_filename(stem if names[stem] == 1 else f"{stem}-{entry.key}", default=entry.key)
+            exporter = BulkExporter(
+                entry.path,
+                os.path.join(out_dir, folder),
+                fmt=fmt,
+                workers=workers_per_pst,
+                index_dir=self.index_dir,
+                on_progress=(lambda p, key=entry.key: on_progress(key, p)) if on_progress else None,
+            )
+            return exporter.run()
+
+        results: Dict[str, object] = {}
+        if not entries:
+            return results
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(entries))) as pool:
+            futures = {pool.submit(run, entry): entry.key for entry in entries}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        return results
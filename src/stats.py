@@ -0,0 +1,243 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import heapq
+import os
+import time
+
+from src.models import MessageStat
+from src.pst_reader import PstReader
+from src.utils.workers import init_worker_reader, worker_reader
+
+DEFAULT_TOP = 10
+SHARD_SIZE = 5000
+
+
+@dataclass
+class StatsShard:
+    folder_id: str
+    start: int
+    count: int
+
+
+@dataclass
+class FolderStats:
+    """Totais de uma pasta (ou de uma fatia dela), combináveis com ``merge``."""
+
+    folder_id: str
+    messages: int = 0
+    body_bytes: int = 0
+    attachments: int = 0
+    attachment_bytes: int = 0
+    first_epoch: Optional[int] = None
+    last_epoch: Optional[int] = None
+    # tipo MIME -> [quantidade, bytes]
+    mime_types: Dict[str, List[int]] = field(default_factory=dict)
+    # Min-heaps limitados: (bytes, id, assunto) e (bytes, id da mensagem, nome, tipo)
+    largest_messages: List[Tuple[int, str, str]] = field(default_factory=list)
+    largest_attachments: List[Tuple[int, str, str, str]] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    def add(self, stat: MessageStat, top: int = DEFAULT_TOP) -> None:
+        attachment_bytes = 0
+        for att in stat.attachments:
+            attachment_bytes += att.size
+            entry = self.mime_types.setdefault(att.mime_type or "desconhecido", [0, 0])
+            entry[0] += 1
+            entry[1] += att.size
+            _push(self.largest_attachments, (att.size, stat.id, att.name, att.mime_type), top)
+        self.messages += 1
+        self.body_bytes += stat.body_size
+        self.attachments += max(stat.attachment_count, len(stat.attachments))
+        self.attachment_bytes += attachment_bytes
+        if stat.epoch is not None:
+            self.first_epoch = stat.epoch if self.first_epoch is None else min(self.first_epoch, stat.epoch)
+            self.last_epoch = stat.epoch if self.last_epoch is None else max(self.last_epoch, stat.epoch)
+        _push(self.largest_messages, (stat.body_size + attachment_bytes, stat.id, stat.subject), top)
+
+    def merge(self, other: "FolderStats", top: int = DEFAULT_TOP) -> None:
+        self.messages += other.messages
+        self.body_bytes += other.body_bytes
+        self.attachments += other.attachments
+        self.attachment_bytes += other.attachment_bytes
+        for epoch in (other.first_epoch, other.last_epoch):
+            if epoch is not None:
+                self.first_epoch = epoch if self.first_epoch is None else min(self.first_epoch, epoch)
+                self.last_epoch = epoch if self.last_epoch is None else max(self.last_epoch, epoch)
+        for mime, (count, nbytes) in other.mime_types.items():
+            entry = self.mime_types.setdefault(mime, [0, 0])
+            entry[0] += count
+            entry[1] += nbytes
+        for item in other.largest_messages:
+            _push(self.largest_messages, item, top)
+        for item in other.largest_attachments:
+            _push(self.largest_attachments, item, top)
+        self.errors.extend(other.errors)
+
+
+@dataclass
+class StatsReport:
+    metadata_only: bool
+    folders: List[Tuple[str, str]] = field(default_factory=list)  # (id, caminho) em pré-ordem
+    per_folder: Dict[str, FolderStats] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def to_dict(self, top: int = DEFAULT_TOP) -> dict:
+        total = FolderStats("")
+        per_folder = []
+        for folder_id, path in self.folders:
+            stats = self.per_folder.get(folder_id) or FolderStats(folder_id)
+            total.merge(stats, top)
+            per_folder.append(
+                {
+                    "id": folder_id,
+                    "path": path,
+                    "messages": stats.messages,
+                    "body_bytes": stats.body_bytes,
+                    "attachments": stats.attachments,
+                    "attachment_bytes": stats.attachment_bytes,
+                }
+            )
+        n = total.messages
+        return {
+            "metadata_only": self.metadata_only,
+            "folders": len(self.folders),
+            "messages": n,
+            "body_bytes": total.body_bytes,
+            "avg_body_bytes": round(total.body_bytes / n, 1) if n else 0,
+            "attachments": total.attachments,
+            "attachment_bytes": total.attachment_bytes,
+            "avg_attachment_bytes": round(total.attachment_bytes / total.attachments, 1) if total.attachments else 0,
+            "first_epoch": total.first_epoch,
+            "last_epoch": total.last_epoch,
+            "mime_types": {
+                mime: {"count": count, "bytes": nbytes}
+                for mime, (count, nbytes) in sorted(total.mime_types.items(), key=lambda kv: -kv[1][0])
+            },
+            "largest_messages": [
+                {"id": msg_id, "subject": subject, "bytes": size}
+                for size, msg_id, subject in sorted(total.largest_messages, reverse=True)
+            ],
+            "largest_attachments": [
+                {"message_id": msg_id, "name": name, "mime_type": mime, "bytes": size}
+                for size, msg_id, name, mime in sorted(total.largest_attachments, reverse=True)
+            ],
+            "errors": total.errors,
+            "elapsed": round(self.elapsed, 3),
+            "per_folder": per_folder,
+        }
+
+
+class StatsEngine:
+    """Estatísticas do PST inteiro numa passada de streaming.
+
+    As pastas são divididas em fatias de ``shard_size`` mensagens; cada fatia
+    vira um ``FolderStats`` (somas, contagens por tipo e heaps limitados dos
+    maiores itens), então a memória não cresce com o número de mensagens.
+    Com ``workers > 1`` as fatias vão para um pool de processos, cada um com
+    seu handle pypff, como na exportação em massa.
+    """
+
+    def __init__(
+        self,
+        pst_path: str,
+        metadata_only: bool = True,
+        workers: int = 1,
+        top: int = DEFAULT_TOP,
+        shard_size: int = SHARD_SIZE,
+        index_dir: Optional[str] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> None:
+        self.pst_path = os.path.abspath(pst_path)
+        self.metadata_only = metadata_only
+        self.workers = max(1, workers)
+        self.top = top
+        self.shard_size = max(1, shard_size)
+        self.index_dir = index_dir
+        self.on_progress = on_progress
+
+    def plan(self, reader: PstReader, folder_ids: Optional[Iterable[str]] = None) -> Tuple[List[Tuple[str, str]], List[StatsShard]]:
+        wanted = set(folder_ids or [])
+        folders: List[Tuple[str, str]] = []
+        shards: List[StatsShard] = []
+        for folder, path, _depth in reader.walk_folders():
+            if wanted and folder.id not in wanted:
+                continue
+            folders.append((folder.id, path))
+            total = reader.count_messages(folder.id)
+            for start in range(0, total, self.shard_size):
+                shards.append(StatsShard(folder.id, start, min(self.shard_size, total - start)))
+        return folders, shards
+
+    def run(self, reader: Optional[PstReader] = None, folder_ids: Optional[Iterable[str]] = None) -> StatsReport:
+        started = time.perf_counter()
+        # Leitor aberto aqui é fechado aqui; o recebido continua com quem chamou
+        owned = reader is None
+        if owned:
+            reader = PstReader(index_dir=self.index_dir, lazy_folders=True)
+        try:
+            if owned:
+                reader.open(self.pst_path)
+            report = self._run(reader, folder_ids)
+        finally:
+            if owned:
+                reader.close()
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _run(self, reader: PstReader, folder_ids: Optional[Iterable[str]]) -> StatsReport:
+        folders, shards = self.plan(reader, folder_ids)
+        report = StatsReport(self.metadata_only, folders)
+        done = 0
+
+        def record(partial: FolderStats) -> None:
+            nonlocal done
+            current = report.per_folder.get(partial.folder_id)
+            if current is None:
+                report.per_folder[partial.folder_id] = partial
+            else:
+                current.merge(partial, self.top)
+            done += 1
+            if self.on_progress:
+                self.on_progress(done, len(shards))
+
+        if self.workers <= 1 or len(shards) <= 1:
+            for shard in shards:
+                record(_collect_with(reader, shard, self.metadata_only, self.top))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_worker_reader,
+                initargs=(self.pst_path, self.index_dir),
+            ) as pool:
+                futures = [pool.submit(_collect, shard, self.metadata_only, self.top) for shard in shards]
+                for future in as_completed(futures):
+                    record(future.result())
+        return report
+
+
+def _push(heap: list, item: tuple, top: int) -> None:
+    if len(heap) < top:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+def _collect(shard: StatsShard, metadata_only: bool, top: int) -> FolderStats:
+    return _collect_with(worker_reader(), shard, metadata_only, top)
+
+
+def _collect_with(reader: PstReader, shard: StatsShard, metadata_only: bool, top: int) -> FolderStats:
+    stats = FolderStats(shard.folder_id)
+    try:
+        for stat in reader.iter_message_stats(shard.folder_id, shard.start, shard.count, metadata_only):
+            stats.add(stat, top)
+    except Exception as exc:
+        stats.errors.append(f"{shard.folder_id}:{shard.start}: {exc}")
+    return stats
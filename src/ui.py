@@ -2,12 +2,37 @@
 @author João Gbriel de Almeida
 """
 
+import json
+import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from typing import Optional
-
-from src.pst_reader import PstReader
-from src.models import PstFolder, PstEmail
+from typing import Dict, List, Optional, Tuple
+
+from src.io_executor import IoExecutor, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from src.models import PstAttachment, PstFolder, PstEmail
+from src.previews import NO_DATE, PreviewBatch, epoch_from_text
+from src.index.search import SearchIndexer
+from src.index.sorting import SortSpec, sort_batch
+from src.index.sidecar import default_index_dir
+from src.session import SEP, PstSession, SessionEntry, qualify, split_id
+from src.stats import StatsEngine
+from src import instrumentation
+from src.widgets import InstrumentationPanel, VirtualMessageList
+
+# Filho provisório de pastas ainda não expandidas (modo preguiçoso)
+PLACEHOLDER_PREFIX = "__placeholder__:"
+# Mensagens por bloco na indexação de fundo de uma pasta
+INDEX_CHUNK = 500
+# Mensagens seguintes decodificadas de antemão ao selecionar uma
+PREFETCH_ROWS = 5
+# Índices de busca construídos ao mesmo tempo (um handle próprio cada)
+MAX_INDEXERS = 2
+# Intervalo entre verificações de PSTs ociosos (fechados pela sessão)
+EVICT_INTERVAL_MS = 30_000
+# Recuo máximo (níveis) de respostas na visão de conversa
+MAX_THREAD_INDENT = 12
 
 try:
     from tkhtmlview import HTMLLabel  # type: ignore
@@ -18,7 +43,18 @@ except Exception:  # pragma: no cover
 class AppUI:
     def __init__(self, root: tk.Tk) -> None:
         self.root = root
-        self.reader: Optional[PstReader] = None
+        # PSTs abertos: nós de primeiro nível da árvore, cache de mensagens compartilhado
+        self.session = PstSession(index_dir=default_index_dir())
+        # Todo I/O de PST passa pela thread de trabalho do executor
+        self.io = IoExecutor(root)
+        self._io_status = ""
+        self._indexers: Dict[str, SearchIndexer] = {}
+        self._index_queue: List[SessionEntry] = []
+        self._stats_queue: Optional["queue.Queue"] = None
+        # O que a lista mostra: uma pasta (de um PST) ou resultados de busca em memória
+        self._pst_key: Optional[str] = None
+        self._folder_id: Optional[str] = None
+        self._results: Optional[PreviewBatch] = None
 
         # Tema ttk
         try:
@@ -32,11 +68,15 @@ class AppUI:
         self._build_toolbar()
         self._build_layout()
         self._build_statusbar()
+        self.io.set_busy_callback(self._set_busy)
+        self.root.after(1000, self._tick_indexers)
+        self.root.after(EVICT_INTERVAL_MS, self._tick_evict)
 
     def _build_menu(self) -> None:
         menu_bar = tk.Menu(self.root)
         file_menu = tk.Menu(menu_bar, tearoff=0)
         file_menu.add_command(label="Abrir PST...", command=self._on_open_pst)
+        file_menu.add_command(label="Fechar PST", command=self._on_close_pst)
         file_menu.add_separator()
         file_menu.add_command(label="Sair", command=self.root.quit)
         menu_bar.add_cascade(label="Arquivo", menu=file_menu)
@@ -44,9 +84,14 @@ class AppUI:
         action_menu = tk.Menu(menu_bar, tearoff=0)
         action_menu.add_command(label="Exportar EML", command=self._export_selected_eml)
         action_menu.add_command(label="Salvar Anexos", command=self._save_attachments)
+        action_menu.add_command(label="Ver Conversa", command=self._show_conversation)
+        action_menu.add_separator()
+        action_menu.add_command(label="Estatísticas do PST...", command=self._on_stats)
         menu_bar.add_cascade(label="Ações", menu=action_menu)
 
         help_menu = tk.Menu(menu_bar, tearoff=0)
+        help_menu.add_command(label="Depuração...", command=self._on_debug_panel)
+        help_menu.add_separator()
         help_menu.add_command(label="Sobre", command=self._on_about)
         menu_bar.add_cascade(label="Ajuda", menu=help_menu)
 
@@ -68,20 +113,15 @@ class AppUI:
         self.tree = ttk.Treeview(left_frame, columns=("name",), show="tree")
         self.tree.pack(fill=tk.BOTH, expand=True)
         self.tree.bind("<<TreeviewSelect>>", self._on_folder_selected)
+        self.tree.bind("<<TreeviewOpen>>", self._on_folder_open)
         self.paned.add(left_frame, weight=1)
 
         # Centro: lista de mensagens
         center_frame = ttk.Frame(self.paned)
-        columns = ("assunto", "remetente", "data")
-        self.msg_list = ttk.Treeview(center_frame, columns=columns, show="headings")
-        self.msg_list.heading("assunto", text="Assunto")
-        self.msg_list.heading("remetente", text="Remetente")
-        self.msg_list.heading("data", text="Data")
-        self.msg_list.column("assunto", width=400, anchor=tk.W)
-        self.msg_list.column("remetente", width=200, anchor=tk.W)
-        self.msg_list.column("data", width=150, anchor=tk.W)
+        self.msg_list = VirtualMessageList(center_frame)
         self.msg_list.pack(fill=tk.BOTH, expand=True)
-        self.msg_list.bind("<<TreeviewSelect>>", self._on_message_selected)
+        self.msg_list.bind_select(self._on_message_selected)
+        self.msg_list.bind_sort(self._on_sort)
         self._build_msg_context_menu()
         self.paned.add(center_frame, weight=2)
 
@@ -124,28 +164,72 @@ class AppUI:
         sb.pack(fill=tk.X, side=tk.BOTTOM)
         self.status_var = tk.StringVar(value="Pronto")
         ttk.Label(sb, textvariable=self.status_var, anchor=tk.W).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # Resumo da instrumentação (vazio enquanto desligada)
+        self.trace_var = tk.StringVar(value="")
+        ttk.Label(sb, textvariable=self.trace_var, anchor=tk.E).pack(side=tk.RIGHT)
+        self._debug_panel: Optional[InstrumentationPanel] = None
+        self.root.after(1000, self._tick_trace)
+
+    def _tick_trace(self) -> None:
+        if instrumentation.is_enabled():
+            io = [c for name, c in instrumentation.snapshot().items() if name.startswith("io.")]
+            busy_ms = sum(c.total_ns for c in io) / 1e6
+            self.trace_var.set(f"I/O: {sum(c.calls for c in io)} tarefas, {busy_ms:.0f} ms")
+        elif self.trace_var.get():
+            self.trace_var.set("")
+        self.root.after(1000, self._tick_trace)
+
+    def _on_debug_panel(self) -> None:
+        if self._debug_panel is not None and self._debug_panel.winfo_exists():
+            self._debug_panel.lift()
+            return
+        self._debug_panel = InstrumentationPanel(self.root)
 
     def _build_msg_context_menu(self) -> None:
         self.msg_menu = tk.Menu(self.root, tearoff=0)
         self.msg_menu.add_command(label="Exportar EML", command=self._export_selected_eml)
         self.msg_menu.add_command(label="Salvar Anexos", command=self._save_attachments)
-        self.msg_list.bind("<Button-3>", self._on_msg_right_click)
+        self.msg_menu.add_command(label="Ver Conversa", command=self._show_conversation)
+        self.msg_list.tree.bind("<Button-3>", self._on_msg_right_click)
 
     def _on_msg_right_click(self, event) -> None:
         try:
-            row = self.msg_list.identify_row(event.y)
-            if row:
-                self.msg_list.selection_set(row)
+            self.msg_list.select_at(event.y)
             self.msg_menu.tk_popup(event.x_root, event.y_root)
         finally:
             self.msg_menu.grab_release()
 
     def _set_busy(self, busy: bool) -> None:
         self.root.config(cursor="watch" if busy else "")
-        self.root.update_idletasks()
-        if not busy:
+        # Só limpa mensagens de progresso; resultados ("N mensagem(ns)") ficam
+        if not busy and self.status_var.get() == self._io_status:
             self.status_var.set("Pronto")
 
+    def _run_io(
+        self,
+        fn,
+        on_done=None,
+        key: Optional[str] = None,
+        status: Optional[str] = None,
+        error_title: str = "Erro",
+        priority: int = PRIORITY_INTERACTIVE,
+        on_failed=None,
+    ):
+        """Executa ``fn`` na thread de I/O; ``on_done`` roda de volta na thread do Tk.
+
+        ``on_failed()`` roda se a tarefa falhar ou for cancelada (sem resultado).
+        """
+        if status:
+            self._io_status = status
+            self.status_var.set(status)
+
+        def on_error(exc: BaseException) -> None:
+            if on_failed:
+                on_failed()
+            messagebox.showerror(error_title, str(exc))
+
+        return self.io.submit(fn, on_done=on_done, on_error=on_error, key=key, priority=priority, on_cancel=on_failed)
+
     def _on_about(self) -> None:
         messagebox.showinfo(
             "Sobre",
@@ -156,66 +240,333 @@ class AppUI:
         )
 
     def _on_open_pst(self) -> None:
-        path = filedialog.askopenfilename(title="Escolher arquivo PST", filetypes=[("Outlook PST", "*.pst"), ("Todos", "*.*")])
-        if not path:
+        paths = filedialog.askopenfilenames(title="Escolher arquivos PST", filetypes=[("Outlook PST", "*.pst"), ("Todos", "*.*")])
+        if not paths:
             return
-        try:
-            self._set_busy(True)
-            self.status_var.set("Abrindo PST...")
-            self.reader = PstReader()
-            self.reader.open(path)
-            self._load_tree()
+        session = self.session
+
+        def open_all():
+            # Abertura em paralelo (pool da sessão); pastas de primeiro nível de cada PST
+            opened = []
+            for path, entry, error in session.open_many(paths):
+                roots = session.run(entry.key, lambda reader: reader.get_root_folders()) if entry is not None else []
+                opened.append((path, entry, error, roots))
+            return opened
+
+        def on_done(opened) -> None:
+            failed = []
+            for path, entry, error, roots in opened:
+                if error is not None:
+                    failed.append(f"{os.path.basename(path)}: {error}")
+                    continue
+                self._add_pst_node(entry, roots)
+                self._queue_search_indexer(entry)
+            self.status_var.set(f"{len(self.session)} PST(s) aberto(s)")
+            if failed:
+                messagebox.showerror("Erro ao abrir PST", "\n".join(failed))
+
+        self._run_io(open_all, on_done, key="open", status=f"Abrindo {len(paths)} PST(s)...", error_title="Erro ao abrir PST")
+
+    def _on_close_pst(self) -> None:
+        key = self._selected_key()
+        if key is None:
+            return
+        indexer = self._indexers.pop(key, None)
+        if indexer is not None:
+            indexer.stop()
+        self._index_queue = [e for e in self._index_queue if e.key != key]
+        if self._pst_key == key or self._results is not None:
+            self.io.cancel()
             self._clear_messages()
             self._clear_preview()
-        except Exception as exc:  # pragma: no cover
-            messagebox.showerror("Erro ao abrir PST", str(exc))
-        finally:
-            self._set_busy(False)
+        if self.tree.exists(key):
+            self.tree.delete(key)
+
+        def on_done(_result) -> None:
+            self.status_var.set(f"{len(self.session)} PST(s) aberto(s)")
 
-    def _load_tree(self) -> None:
-        if not self.reader:
+        self._run_io(lambda: self.session.remove(key), on_done, error_title="Fechar PST")
+
+    def _selected_key(self) -> Optional[str]:
+        # PST do nó selecionado na árvore (o próprio nó do PST ou uma pasta dele)
+        selected = self.tree.selection()
+        if not selected:
+            return self._pst_key
+        node_id = selected[0]
+        if node_id.startswith(PLACEHOLDER_PREFIX):
+            node_id = node_id[len(PLACEHOLDER_PREFIX) :]
+        return node_id.partition(SEP)[0]
+
+    def _row_target(self, row_id: str) -> Tuple[str, str]:
+        # Linhas de pasta têm IDs locais; resultados de busca, IDs com o PST
+        if SEP in row_id:
+            return split_id(row_id)
+        return self._pst_key or "", row_id
+
+    def _on_stats(self) -> None:
+        key = self._selected_key()
+        if key is None or key not in self.session or self._stats_queue is not None:
             return
-        self.tree.delete(*self.tree.get_children())
-        for folder in self.reader.get_root_folders():
-            node = self.tree.insert("", tk.END, iid=folder.id, text=folder.name)
-            self._insert_children(node, folder)
+        entry = self.session.entry(key)
+        # Passada longa: thread e handle próprios (como o índice de busca), sem
+        # ocupar a thread de I/O da interface; resultados voltam por polling
+        results: "queue.Queue" = queue.Queue()
+        engine = StatsEngine(
+            entry.path,
+            index_dir=self.session.index_dir,
+            on_progress=lambda done, total: results.put(("progress", (done, total))),
+        )
+
+        def work() -> None:
+            try:
+                results.put(("done", engine.run().to_dict()))
+            except Exception as exc:
+                results.put(("error", exc))
 
-    def _insert_children(self, node_id: str, folder: PstFolder) -> None:
+        self._stats_queue = results
+        self.status_var.set(f"Calculando estatísticas de {entry.name}...")
+        threading.Thread(target=work, name="pst-stats", daemon=True).start()
+        self.root.after(200, self._poll_stats)
+
+    def _poll_stats(self) -> None:
+        results = self._stats_queue
+        if results is None:
+            return
+        while True:
+            try:
+                kind, value = results.get_nowait()
+            except queue.Empty:
+                self.root.after(200, self._poll_stats)
+                return
+            if kind == "progress":
+                self.status_var.set(f"Estatísticas: {value[0]}/{value[1]} fatias")
+                continue
+            self._stats_queue = None
+            self.status_var.set("Pronto")
+            if kind == "error":
+                messagebox.showerror("Estatísticas", str(value))
+            else:
+                self._show_stats(value)
+            return
+
+    def _show_stats(self, report: dict) -> None:
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        win = tk.Toplevel(self.root)
+        win.title("Estatísticas do PST")
+        win.geometry("700x500")
+        summary = (
+            f"{report['messages']} mensagem(ns) em {report['folders']} pasta(s); "
+            f"{report['attachments']} anexo(s), {report['attachment_bytes']} bytes"
+        )
+        ttk.Label(win, text=summary, anchor=tk.W).pack(fill=tk.X, padx=4, pady=2)
+        body = tk.Text(win, wrap=tk.NONE)
+        body.insert("1.0", text)
+        body.configure(state=tk.DISABLED)
+
+        def save() -> None:
+            path = filedialog.asksaveasfilename(
+                parent=win, defaultextension=".json", filetypes=[("JSON", "*.json")], title="Salvar estatísticas"
+            )
+            if path:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(text)
+
+        ttk.Button(win, text="Salvar JSON...", command=save).pack(side=tk.BOTTOM, anchor=tk.E, padx=4, pady=4)
+        body.pack(fill=tk.BOTH, expand=True)
+
+    def _queue_search_indexer(self, entry: SessionEntry) -> None:
+        # Índice de busca construído/atualizado em segundo plano, com handle próprio
+        if entry.index_path is None or entry.key in self._indexers:
+            return
+        self._index_queue.append(entry)
+        self._start_indexers()
+
+    def _start_indexers(self) -> None:
+        running = sum(1 for indexer in self._indexers.values() if not indexer.finished.is_set())
+        while self._index_queue and running < MAX_INDEXERS:
+            entry = self._index_queue.pop(0)
+            indexer = self._indexers[entry.key] = SearchIndexer(entry.path, default_index_dir())
+            indexer.start()
+            running += 1
+
+    def _tick_indexers(self) -> None:
+        if self._index_queue:
+            self._start_indexers()
+        self.root.after(1000, self._tick_indexers)
+
+    def _tick_evict(self) -> None:
+        # Na thread de I/O: não concorre com leituras do mesmo PST
+        self.io.submit(self.session.evict_idle, key="evict", priority=PRIORITY_BACKGROUND)
+        self.root.after(EVICT_INTERVAL_MS, self._tick_evict)
+
+    def _add_pst_node(self, entry: SessionEntry, roots: List[PstFolder]) -> None:
+        if self.tree.exists(entry.key):
+            return
+        node = self.tree.insert("", tk.END, iid=entry.key, text=entry.name, open=True)
+        for folder in roots:
+            child_id = self.tree.insert(node, tk.END, iid=qualify(entry.key, folder.id), text=folder.name)
+            self._insert_children(entry.key, child_id, folder)
+
+    def _insert_children(self, key: str, node_id: str, folder: PstFolder) -> None:
+        if folder.subfolder_count and not folder.children:
+            # Subpastas ainda não lidas: seta de expansão via filho provisório
+            self.tree.insert(node_id, tk.END, iid=PLACEHOLDER_PREFIX + node_id, text="Carregando...")
+            return
         for child in folder.children:
-            child_id = self.tree.insert(node_id, tk.END, iid=child.id, text=child.name)
-            self._insert_children(child_id, child)
+            child_id = self.tree.insert(node_id, tk.END, iid=qualify(key, child.id), text=child.name)
+            self._insert_children(key, child_id, child)
 
-    def _on_folder_selected(self, _event=None) -> None:
-        if not self.reader:
+    def _on_folder_open(self, _event=None) -> None:
+        node_id = self.tree.focus()
+        placeholder = PLACEHOLDER_PREFIX + node_id
+        if not node_id or SEP not in node_id or not self.tree.exists(placeholder):
             return
+        key, folder_id = split_id(node_id)
+        session = self.session
+
+        def on_done(children: List[PstFolder]) -> None:
+            if not self.tree.exists(placeholder):
+                return
+            self.tree.delete(placeholder)
+            for child in children:
+                child_id = self.tree.insert(node_id, tk.END, iid=qualify(key, child.id), text=child.name)
+                self._insert_children(key, child_id, child)
+
+        self._run_io(
+            lambda: session.run(key, lambda reader: reader.get_sub_folders(folder_id)),
+            on_done,
+            key=f"subfolders:{node_id}",
+            error_title="Pastas",
+        )
+
+    def _on_folder_selected(self, _event=None) -> None:
         selected = self.tree.selection()
-        if not selected:
+        if not selected or selected[0].startswith(PLACEHOLDER_PREFIX) or SEP not in selected[0]:
             return
-        folder_id = selected[0]
-        self._populate_messages(folder_id)
+        key, folder_id = split_id(selected[0])
+        self._populate_messages(key, folder_id)
 
-    def _populate_messages(self, folder_id: str) -> None:
+    def _populate_messages(self, key: str, folder_id: str) -> None:
         self._clear_messages()
-        if not self.reader:
+        self.io.cancel("rows:")
+        if key not in self.session:
             return
-        for msg in self.reader.list_messages(folder_id):
-            self.msg_list.insert("", tk.END, iid=msg.id, values=(msg.subject, msg.sender, msg.date or ""))
-        self.status_var.set(f"{len(self.msg_list.get_children())} mensagem(ns)")
+        session = self.session
+        self._pst_key = key
+        self._folder_id = folder_id
+
+        def loader(start: int, count: int, done, failed) -> None:
+            self._run_io(
+                lambda: session.run(key, lambda reader: reader.preview_batch(folder_id, start, count)),
+                done,
+                key=f"rows:{folder_id}:{start}",
+                error_title="Mensagens",
+                on_failed=failed,
+            )
+
+        def on_count(total: int) -> None:
+            if (self._pst_key, self._folder_id) != (key, folder_id):
+                return
+            self.msg_list.set_source(total, loader)
+            self.status_var.set(f"{total} mensagem(ns)")
+            self._index_folder(key, folder_id, 0)
+            if self.msg_list.sort_spec:
+                self._sort_folder(key, folder_id, self.msg_list.sort_spec)
+
+        self._run_io(
+            lambda: session.run(key, lambda reader: reader.count_messages(folder_id)), on_count, key="count", error_title="Mensagens"
+        )
+
+    def _on_sort(self, spec: SortSpec) -> None:
+        if self._results is not None:
+            self._show_results(self._results)
+        elif self._pst_key is not None and self._folder_id is not None:
+            self._sort_folder(self._pst_key, self._folder_id, spec)
+
+    def _sort_folder(self, key: str, folder_id: str, spec: SortSpec) -> None:
+        session = self.session
+
+        # A ordem (posições) é calculada uma vez; as linhas continuam vindo em blocos
+        def on_done(order) -> None:
+            if (self._pst_key, self._folder_id) != (key, folder_id) or self._results is not None:
+                return
+
+            def loader(start: int, count: int, done, failed) -> None:
+                positions = order[start : start + count].tolist()
+                self._run_io(
+                    lambda: session.run(key, lambda reader: reader.preview_batch_at(folder_id, positions)),
+                    done,
+                    key=f"rows:{folder_id}:sorted:{start}",
+                    error_title="Mensagens",
+                    on_failed=failed,
+                )
+
+            self.io.cancel("rows:")
+            self.msg_list.set_source(len(order), loader)
+
+        self._run_io(
+            lambda: session.run(key, lambda reader: reader.sort_order(folder_id, spec)),
+            on_done,
+            key="sort",
+            status="Ordenando...",
+            error_title="Ordenar",
+        )
+
+    def _show_results(self, results: PreviewBatch) -> None:
+        self._results = results
+        spec = self.msg_list.sort_spec
+        shown = sort_batch(results, spec) if spec else results
+        self.msg_list.set_source(len(shown), lambda start, count, done, _failed: done(shown.slice(start, count)))
+
+    def _index_folder(self, key: str, folder_id: str, start: int) -> None:
+        session = self.session
+
+        # Indexação de fundo em blocos: pedidos interativos passam na frente
+        def on_done(next_start: Optional[int]) -> None:
+            if next_start is not None and key in session:
+                self._index_folder(key, folder_id, next_start)
+
+        self.io.submit(
+            lambda: session.run(key, lambda reader: reader.index_messages(folder_id, start, INDEX_CHUNK)),
+            on_done=on_done,
+            key="index",
+            priority=PRIORITY_BACKGROUND,
+        )
 
     def _on_message_selected(self, _event=None) -> None:
-        if not self.reader:
-            return
         selected = self.msg_list.selection()
         if not selected:
             return
-        msg_id = selected[0]
-        self._set_busy(True)
-        try:
-            msg = self.reader.get_message(msg_id)
+        key, msg_id = self._row_target(selected[0])
+        if key not in self.session:
+            return
+        session = self.session
+
+        def on_done(msg: PstEmail) -> None:
             self._show_message(msg)
-            self._load_attachments(msg_id)
-        finally:
-            self._set_busy(False)
+            # Metadados dos anexos já vêm na mensagem completa
+            self._load_attachments(msg.attachments)
+            self._prefetch_neighbors()
+
+        # key fixa: seleções rápidas descartam as cargas ainda pendentes
+        self.io.cancel("prefetch:")
+        self._run_io(lambda: session.run(key, lambda reader: reader.get_message(msg_id)), on_done, key="message", error_title="Mensagem")
+
+    def _prefetch_neighbors(self) -> None:
+        # Próximas linhas vão para o cache em segundo plano (navegação por setas)
+        index = self.msg_list.selected_index()
+        if index is None:
+            return
+        session = self.session
+        for k, row_id in enumerate(self.msg_list.row_ids(index + 1, PREFETCH_ROWS)):
+            key, msg_id = self._row_target(row_id)
+            if key not in session:
+                continue
+            self.io.submit(
+                lambda key=key, msg_id=msg_id: session.run(key, lambda reader: reader.prefetch(msg_id)),
+                key=f"prefetch:{k}",
+                priority=PRIORITY_BACKGROUND,
+            )
 
     def _show_message(self, msg: PstEmail) -> None:
         self._clear_preview()
@@ -235,72 +586,136 @@ class AppUI:
             if self.text_preview is not None:
                 self.text_preview.insert("1.0", text)
 
-    def _load_attachments(self, msg_id: str) -> None:
+    def _load_attachments(self, attachments: List[PstAttachment]) -> None:
         self.attach_list.delete(0, tk.END)
-        if not self.reader:
-            return
-        try:
-            names = self.reader.get_attachments(msg_id)
-        except Exception:
-            names = []
-        for name in names:
-            self.attach_list.insert(tk.END, name)
+        for att in attachments:
+            self.attach_list.insert(tk.END, att.label)
 
     def _save_attachments(self) -> None:
-        if not self.reader:
-            return
         selected = self.msg_list.selection()
         if not selected:
             return
-        msg_id = selected[0]
+        key, msg_id = self._row_target(selected[0])
+        if key not in self.session:
+            return
         out_dir = filedialog.askdirectory(title="Selecionar pasta para salvar anexos")
         if not out_dir:
             return
-        try:
-            self._set_busy(True)
-            self.status_var.set("Salvando anexos...")
-            saved = self.reader.save_attachments(msg_id, out_dir)
-        except Exception as exc:  # pragma: no cover
-            messagebox.showerror("Salvar Anexos", str(exc))
-            return
-        finally:
-            self._set_busy(False)
-        messagebox.showinfo("Salvar Anexos", f"{len(saved)} anexo(s) salvo(s).")
+        session = self.session
+
+        def on_done(saved: List[str]) -> None:
+            messagebox.showinfo("Salvar Anexos", f"{len(saved)} anexo(s) salvo(s).")
+
+        self._run_io(
+            lambda: session.run(key, lambda reader: reader.save_attachments(msg_id, out_dir)),
+            on_done,
+            status="Salvando anexos...",
+            error_title="Salvar Anexos",
+        )
 
     def _export_selected_eml(self) -> None:
-        if not self.reader:
-            return
         selected = self.msg_list.selection()
         if not selected:
             return
-        msg_id = selected[0]
+        key, msg_id = self._row_target(selected[0])
+        if key not in self.session:
+            return
         path = filedialog.asksaveasfilename(title="Salvar como .eml", defaultextension=".eml", filetypes=[("EML", "*.eml"), ("Todos", "*.*")])
         if not path:
             return
-        try:
-            self._set_busy(True)
-            self.status_var.set("Exportando EML...")
-            self.reader.export_eml(msg_id, path)
-        except Exception as exc:  # pragma: no cover
-            messagebox.showerror("Exportar EML", str(exc))
-        finally:
-            self._set_busy(False)
+        session = self.session
+        self._run_io(
+            lambda: session.run(key, lambda reader: reader.export_eml(msg_id, path)),
+            status="Exportando EML...",
+            error_title="Exportar EML",
+        )
+
+    def _show_conversation(self) -> None:
+        selected = self.msg_list.selection()
+        if not selected:
+            return
+        key, msg_id = self._row_target(selected[0])
+        if key not in self.session:
+            return
+        session = self.session
+        indexing = key in {e.key for e in self._index_queue} or (
+            key in self._indexers and not self._indexers[key].finished.is_set()
+        )
+
+        def load() -> PreviewBatch:
+            # Uma consulta ao índice de conversas (todas as pastas), sem ler o PST
+            results = PreviewBatch()
+            for msg in session.run(key, lambda reader: reader.conversation(msg_id)):
+                indent = "    " * min(msg.depth, MAX_THREAD_INDENT)
+                epoch = NO_DATE if msg.epoch is None else msg.epoch
+                results.append(qualify(key, msg.msg_id), indent + msg.subject, msg.sender, epoch, msg.attachment_count)
+            return results
+
+        def on_done(results: PreviewBatch) -> None:
+            if not len(results):
+                self.status_var.set("Conversa ainda não indexada" + (" (índice em construção)" if indexing else ""))
+                return
+            self._clear_messages()
+            self._show_results(results)
+            suffix = " (índice em construção)" if indexing else ""
+            self.status_var.set(f"Conversa: {len(results)} mensagem(ns){suffix}")
+
+        self._run_io(load, on_done, key="thread", status="Abrindo conversa...", error_title="Conversa")
 
     def _apply_search(self) -> None:
-        term = (self.search_var.get() or "").strip().lower()
-        selected = self.tree.selection()
-        if not selected or not self.reader:
+        term = (self.search_var.get() or "").strip()
+        if not term or not len(self.session):
             return
-        folder_id = selected[0]
+        session = self.session
         self._clear_messages()
-        for msg in self.reader.list_messages(folder_id):
-            blob = " ".join([msg.subject or "", msg.sender or "", (msg.body_text or ""), (msg.body_html or "")]).lower()
-            if term in blob:
-                self.msg_list.insert("", tk.END, iid=msg.id, values=(msg.subject, msg.sender, msg.date or ""))
-        self.status_var.set(f"{len(self.msg_list.get_children())} resultado(s)")
+        if not any(entry.index_path for entry in session.entries()):
+            self._scan_folder_search(term.lower())
+            return
+        indexing = bool(self._index_queue) or any(not i.finished.is_set() for i in self._indexers.values())
+
+        def search() -> PreviewBatch:
+            # Consulta nos índices de todos os PSTs em paralelo, ordenada por relevância
+            results = PreviewBatch()
+            for key, hit in session.search(term):
+                results.append(qualify(key, hit.msg_id), hit.subject, hit.sender, epoch_from_text(hit.date))
+            return results
+
+        def on_done(results: PreviewBatch) -> None:
+            self._show_results(results)
+            suffix = " (índice em construção)" if indexing else ""
+            self.status_var.set(f"{len(results)} resultado(s){suffix}")
+
+        self._run_io(search, on_done, key="search", status="Buscando...", error_title="Buscar")
+
+    def _scan_folder_search(self, term: str) -> None:
+        # Sem índice persistente: varre as prévias da pasta selecionada
+        selected = self.tree.selection()
+        if not selected or selected[0].startswith(PLACEHOLDER_PREFIX) or SEP not in selected[0]:
+            return
+        key, folder_id = split_id(selected[0])
+        session = self.session
+
+        def search() -> PreviewBatch:
+            batch = session.run(key, lambda reader: reader.preview_batch(folder_id))
+            # Remetentes se repetem: cada um é testado uma só vez
+            senders = {s: term in s.lower() for s in set(batch.senders)}
+            found = batch.take(
+                [k for k, subject in enumerate(batch.subjects) if senders[batch.senders[k]] or term in subject.lower()]
+            )
+            found.ids = [qualify(key, msg_id) for msg_id in found.ids]
+            return found
+
+        def on_done(results: PreviewBatch) -> None:
+            self._show_results(results)
+            self.status_var.set(f"{len(results)} resultado(s)")
+
+        self._run_io(search, on_done, key="search", status="Buscando...", error_title="Buscar")
 
     def _clear_messages(self) -> None:
-        self.msg_list.delete(*self.msg_list.get_children())
+        self._pst_key = None
+        self._folder_id = None
+        self._results = None
+        self.msg_list.clear()
 
     def _clear_preview(self) -> None:
         self.header_text.delete("1.0", tk.END)
@@ -0,0 +1,64 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Union
+
+DateLike = Union[datetime, int, float, str, None]
+
+DISPLAY_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def to_utc(value: DateLike) -> Optional[datetime]:
+    """Data em UTC (``datetime`` com fuso) ou None se ausente/inválida.
+
+    Aceita ``datetime`` (sem fuso = UTC, como o pypff entrega os FILETIME),
+    época em segundos e texto ISO 8601 ou RFC 2822 (cabeçalho ``Date``).
+    """
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(value, datetime):
+            dt = value
+        elif isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, timezone.utc)
+        else:
+            text = str(value).strip()
+            try:
+                dt = datetime.fromisoformat(text)
+            except ValueError:
+                dt = parsedate_to_datetime(text)
+        if dt.tzinfo is None:
+            return dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone.utc)
+    except (TypeError, ValueError, IndexError, OverflowError, OSError):
+        return None
+
+
+def to_epoch(value: DateLike) -> Optional[int]:
+    dt = to_utc(value)
+    if dt is None:
+        return None
+    try:
+        return int(dt.timestamp())
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def display_date(value: DateLike) -> Optional[str]:
+    """Texto exibido nas listas (UTC, sem fuso explícito)."""
+    dt = to_utc(value)
+    return dt.strftime(DISPLAY_FORMAT) if dt is not None else None
+
+
+def in_range(epoch: Optional[int], since: Optional[int] = None, until: Optional[int] = None) -> bool:
+    """``since <= epoch < until``; sem data fica de fora de qualquer filtro."""
+    if since is None and until is None:
+        return True
+    if epoch is None:
+        return False
+    return (since is None or epoch >= since) and (until is None or epoch < until)
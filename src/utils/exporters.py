@@ -2,31 +2,69 @@
 @author João Gbriel de Almeida
 """
 
-from email.message import EmailMessage
-from typing import Optional
+from typing import BinaryIO, Dict, Iterable, Optional, Set, Tuple
+import hashlib
+import os
+import re
+import time
+
 from src.models import PstEmail
+from src.instrumentation import traced
+
+
+def sanitize_filename(name: str, default: str = "anexo") -> str:
+    name = name.strip().replace("\n", " ").replace("\r", " ")
+    name = re.sub(r"[<>:\\/\|\?\*]", "_", name)
+    return name or default
+
 
+class NameAllocator:
+    """Nomes livres num diretório: "nome (1).ext", "nome (2).ext"... se já existir.
 
-def build_eml(msg: PstEmail) -> str:
-    em = EmailMessage()
-    em["Subject"] = msg.subject or ""
-    em["From"] = msg.sender or ""
-    em["To"] = msg.to or ""
-    if msg.cc:
-        em["Cc"] = msg.cc
-    if msg.date:
-        em["Date"] = msg.date
+    O diretório é listado uma vez; depois os nomes são reservados em memória,
+    sem um ``os.path.exists`` por tentativa. Vale para quem é o único a
+    gravar no diretório durante a extração.
+    """
 
-    # Preferir HTML se presente; incluir alternativa texto simples
-    if msg.body_html and msg.body_text:
-        em.set_content(msg.body_text)
-        em.add_alternative(msg.body_html, subtype="html")
-    elif msg.body_html:
-        em.add_alternative(msg.body_html, subtype="html")
-    else:
-        em.set_content(msg.body_text or "")
+    def __init__(self, output_dir: str) -> None:
+        self.output_dir = output_dir
+        try:
+            self._taken: Set[str] = {name.lower() for name in os.listdir(output_dir)}
+        except FileNotFoundError:
+            self._taken = set()
+        # Próximo sufixo por nome base: evita refazer a sequência 1, 2, 3...
+        self._next: Dict[str, int] = {}
 
-    return em.as_string()
+    def reserve(self, name: str) -> str:
+        candidate = name
+        if candidate.lower() in self._taken:
+            base, ext = os.path.splitext(name)
+            k = self._next.get(name.lower(), 1)
+            candidate = f"{base} ({k}){ext}"
+            while candidate.lower() in self._taken:
+                k += 1
+                candidate = f"{base} ({k}){ext}"
+            self._next[name.lower()] = k + 1
+        # Sem diferenciar maiúsculas: no Windows "A.pdf" e "a.pdf" colidem
+        self._taken.add(candidate.lower())
+        return os.path.join(self.output_dir, candidate)
+
+    def release(self, path: str) -> None:
+        self._taken.discard(os.path.basename(path).lower())
+
+
+@traced("exporters.copy_chunks", size=lambda r: r[0])
+def copy_chunks(chunks: Iterable[bytes], out_path: str, hash_name: Optional[str] = None) -> Tuple[int, Optional[str]]:
+    """Grava os blocos em ``out_path``, calculando o hash durante a cópia."""
+    hasher = hashlib.new(hash_name) if hash_name else None
+    written = 0
+    with open(out_path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            written += len(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+    return written, hasher.hexdigest() if hasher is not None else None
 
 
 def build_txt(msg: PstEmail) -> str:
@@ -39,3 +77,71 @@ def build_txt(msg: PstEmail) -> str:
         "",
     ]
     return "\n".join(headers) + (msg.body_text or "")
+
+
+def mbox_from_line(sender: str = "") -> str:
+    # Linha separadora de cada entrada do mbox (o corpo vai por MboxrdWriter)
+    addr = (sender or "").strip()
+    if "@" not in addr or " " in addr:
+        addr = "MAILER-DAEMON"
+    return f"From {addr} {time.asctime(time.gmtime())}\n"
+
+
+class MboxrdWriter:
+    """Arquivo binário que grava o corpo de uma entrada mboxrd em streaming.
+
+    Recebe a mensagem em blocos (ex.: de ``MimeWriter``), troca CRLF por LF
+    e escapa as linhas ``>*From `` com mais um ``>``, mesmo quando o início
+    da linha chega dividido entre dois blocos. ``finish`` fecha a entrada
+    (quebra de linha final e linha em branco); a linha "From " separadora
+    fica com quem chama (``mbox_from_line``).
+    """
+
+    def __init__(self, out: BinaryIO) -> None:
+        self.out = out
+        self.written = 0
+        # Início de linha ainda indefinido (menos de 5 bytes além dos ">") e/ou "\r" final
+        self._carry = b""
+        self._line_start = True
+        self._last = b"\n"
+
+    def write(self, data: bytes) -> int:
+        size = len(data)
+        data = self._carry + bytes(data)
+        self._carry = b""
+        if data.endswith(b"\r"):
+            data, self._carry = data[:-1], b"\r"
+        data = data.replace(b"\r\n", b"\n")
+        parts = []
+        pos, end = 0, len(data)
+        while pos < end:
+            nl = data.find(b"\n", pos)
+            if self._line_start:
+                head = data[pos:end if nl < 0 else nl + 1].lstrip(b">")
+                if nl < 0 and len(head) < 5 and b"From ".startswith(head):
+                    self._carry = data[pos:] + self._carry
+                    break
+                if head.startswith(b"From "):
+                    parts.append(b">")
+            if nl < 0:
+                parts.append(data[pos:])
+                self._line_start = False
+                break
+            parts.append(data[pos : nl + 1])
+            pos = nl + 1
+            self._line_start = True
+        self._emit(b"".join(parts))
+        return size
+
+    def finish(self) -> None:
+        # Sobra sem quebra de linha: curta demais para ser "From "
+        carry, self._carry = self._carry, b""
+        self._emit(carry)
+        self._emit(b"\n\n" if self._last != b"\n" else b"\n")
+        self._line_start = True
+
+    def _emit(self, data: bytes) -> None:
+        if data:
+            self.out.write(data)
+            self.written += len(data)
+            self._last = data[-1:]
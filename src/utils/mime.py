@@ -0,0 +1,228 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from email import policy, quoprimime
+from email.header import Header
+from email.utils import encode_rfc2231, format_datetime
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+import base64
+import re
+import uuid
+
+from src.instrumentation import count, traced
+
+CRLF = b"\r\n"
+# Bytes por linha base64 (76 caracteres); blocos codificados são múltiplos disso
+B64_LINE_BYTES = 57
+# Mensagens incorporadas dentro de incorporadas: além disso, viram anexo vazio
+# (protege de ciclos em PSTs corrompidos)
+MAX_EMBED_DEPTH = 8
+
+# Cabeçalhos da estrutura MIME original: a estrutura é refeita pelo gravador
+STRUCTURAL_HEADERS = frozenset(
+    ("mime-version", "content-type", "content-transfer-encoding", "content-length", "content-disposition", "content-id")
+)
+_HEADER_NAME = re.compile(r"^([!-9;-~]+):")
+_MIME_TYPE = re.compile(r"^[\w.+-]+/[\w.+-]+$")
+
+
+@dataclass
+class MimeAttachment:
+    name: str
+    mime_type: str
+    # Conteúdo em blocos (None para mensagem incorporada)
+    chunks: Optional[Iterable[bytes]] = None
+    embedded: Optional["MimeMessage"] = None
+
+
+@dataclass
+class MimeMessage:
+    """Uma mensagem a gravar; anexos são lidos sob demanda, durante a gravação."""
+
+    subject: str = ""
+    sender: str = ""
+    to: str = ""
+    cc: str = ""
+    timestamp: Optional[datetime] = None
+    body_text: Optional[str] = None
+    body_html: Optional[str] = None
+    # Cabeçalhos de transporte originais (vazio se o PST não os tiver)
+    transport_headers: str = ""
+    attachments: Iterable[MimeAttachment] = field(default_factory=list)
+
+
+def parse_header_block(text: str) -> List[Tuple[str, str]]:
+    """(nome, linhas brutas) de cada cabeçalho, com as continuações, na ordem original.
+
+    Linhas antes do primeiro cabeçalho (ex.: "Microsoft Mail Internet Headers
+    Version 2.0") são ignoradas; o bloco termina na primeira linha em branco.
+    """
+    headers: List[Tuple[str, str]] = []
+    lines: List[str] = []
+    name: Optional[str] = None
+    for line in (text or "").splitlines():
+        if not line.strip():
+            if headers or name:
+                break
+            continue
+        if line[0] in " \t":
+            if name is not None:
+                lines.append(line)
+            continue
+        if name is not None:
+            headers.append((name, "\r\n".join(lines)))
+        match = _HEADER_NAME.match(line)
+        name, lines = (match.group(1), [line]) if match else (None, [])
+    if name is not None:
+        headers.append((name, "\r\n".join(lines)))
+    return headers
+
+
+def fold_header(name: str, value: str) -> bytes:
+    try:
+        return policy.SMTP.fold(name, value).encode("ascii")
+    except Exception:
+        # Valor que o parser de endereços recusa: codificado como texto livre
+        return f"{name}: {Header(value, 'utf-8').encode()}".encode("ascii") + CRLF
+
+
+def param(key: str, value: str) -> str:
+    """Parâmetro de cabeçalho; fora do ASCII, codificado como RFC 2231 (``key*=utf-8''...``)."""
+    if value.isascii():
+        return '%s="%s"' % (key, value.replace("\\", "\\\\").replace('"', '\\"'))
+    return f"{key}*={encode_rfc2231(value, 'utf-8')}"
+
+
+def iter_base64(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Base64 em linhas de 76 caracteres (CRLF), bloco a bloco: memória limitada ao maior bloco."""
+    pending = b""
+    for chunk in chunks:
+        if pending:
+            chunk = pending + chunk
+        cut = len(chunk) - len(chunk) % B64_LINE_BYTES
+        if cut:
+            yield base64.encodebytes(chunk[:cut]).replace(b"\n", CRLF)
+        pending = bytes(chunk[cut:])
+    if pending:
+        yield base64.encodebytes(pending).replace(b"\n", CRLF)
+
+
+def quoted_printable(text: str) -> bytes:
+    # quoprimime trabalha com caracteres de 1 byte: o texto vai como UTF-8 visto em latin-1
+    data = text.replace("\r\n", "\n").encode("utf-8").decode("latin-1")
+    return quoprimime.body_encode(data, maxlinelen=76, eol="\r\n").encode("ascii")
+
+
+class MimeWriter:
+    """Grava mensagens MIME direto num arquivo binário, parte a parte.
+
+    Os cabeçalhos de transporte do PST são mantidos (Message-ID, Received,
+    etc.), exceto os da estrutura MIME, que é refeita: corpos em
+    quoted-printable, anexos em base64 codificado bloco a bloco conforme são
+    lidos do PST, e mensagens incorporadas como ``message/rfc822`` gravadas
+    recursivamente. Nada da mensagem é montado inteiro em memória.
+    """
+
+    def __init__(self, out: BinaryIO) -> None:
+        self.out = out
+        self.written = 0
+
+    def _write(self, data: bytes) -> None:
+        self.out.write(data)
+        self.written += len(data)
+
+    @traced("mime.write_message", size=lambda n: n)
+    def write_message(self, message: MimeMessage) -> int:
+        """Grava a mensagem; devolve os bytes escritos."""
+        start = self.written
+        self._write_message(message, 0)
+        count("mime.bytes", self.written - start)
+        return self.written - start
+
+    def _write_message(self, message: MimeMessage, depth: int) -> None:
+        self._write_top_headers(message)
+        attachments = iter(message.attachments)
+        first = next(attachments, None)
+        if first is None:
+            self._write_body(message)
+            return
+        boundary = self._boundary()
+        self._write(b"MIME-Version: 1.0\r\n")
+        self._write(f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n\r\n'.encode("ascii"))
+        self._write(b"This is a multi-part message in MIME format.\r\n")
+        self._write(f"--{boundary}\r\n".encode("ascii"))
+        self._write_body(message, mime_version=False)
+        for attachment in _chain(first, attachments):
+            self._write(f"\r\n--{boundary}\r\n".encode("ascii"))
+            self._write_attachment(attachment, depth)
+        self._write(f"\r\n--{boundary}--\r\n".encode("ascii"))
+
+    def _write_top_headers(self, message: MimeMessage) -> None:
+        present = set()
+        for name, raw in parse_header_block(message.transport_headers):
+            lower = name.lower()
+            present.add(lower)
+            if lower not in STRUCTURAL_HEADERS:
+                self._write(raw.encode("utf-8", "surrogateescape") + CRLF)
+        # Sem cabeçalhos de transporte (rascunhos, itens internos do Exchange):
+        # os campos do PST completam o que faltar
+        timestamp = message.timestamp
+        for name, value in (
+            ("Date", format_datetime(timestamp) if timestamp is not None else ""),
+            ("From", message.sender),
+            ("To", message.to),
+            ("Cc", message.cc),
+            ("Subject", message.subject),
+        ):
+            if value and name.lower() not in present:
+                self._write(fold_header(name, value))
+
+    def _write_body(self, message: MimeMessage, mime_version: bool = True) -> None:
+        if mime_version:
+            self._write(b"MIME-Version: 1.0\r\n")
+        if message.body_text and message.body_html:
+            boundary = self._boundary()
+            self._write(f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n\r\n'.encode("ascii"))
+            self._write(f"--{boundary}\r\n".encode("ascii"))
+            self._write_text("plain", message.body_text)
+            self._write(f"\r\n--{boundary}\r\n".encode("ascii"))
+            self._write_text("html", message.body_html)
+            self._write(f"\r\n--{boundary}--\r\n".encode("ascii"))
+        elif message.body_html:
+            self._write_text("html", message.body_html)
+        else:
+            self._write_text("plain", message.body_text or "")
+
+    def _write_text(self, subtype: str, text: str) -> None:
+        self._write(f'Content-Type: text/{subtype}; charset="utf-8"\r\n'.encode("ascii"))
+        self._write(b"Content-Transfer-Encoding: quoted-printable\r\n\r\n")
+        self._write(quoted_printable(text))
+
+    def _write_attachment(self, attachment: MimeAttachment, depth: int) -> None:
+        if attachment.embedded is not None and depth < MAX_EMBED_DEPTH:
+            self._write(b"Content-Type: message/rfc822\r\n")
+            if attachment.name:
+                self._write(f"Content-Disposition: attachment; {param('filename', attachment.name)}\r\n".encode("ascii"))
+            self._write(CRLF)
+            self._write_message(attachment.embedded, depth + 1)
+            return
+        name = attachment.name or "anexo"
+        mime_type = attachment.mime_type if _MIME_TYPE.match(attachment.mime_type or "") else "application/octet-stream"
+        self._write(f"Content-Type: {mime_type}; {param('name', name)}\r\n".encode("ascii"))
+        self._write(f"Content-Disposition: attachment; {param('filename', name)}\r\n".encode("ascii"))
+        self._write(b"Content-Transfer-Encoding: base64\r\n\r\n")
+        for block in iter_base64(attachment.chunks or ()):
+            self._write(block)
+
+    def _boundary(self) -> str:
+        return f"----=_Part_{uuid.uuid4().hex}"
+
+
+def _chain(first, rest: Iterator) -> Iterator:
+    yield first
+    yield from rest
@@ -0,0 +1,166 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+import hashlib
+import re
+import threading
+
+from src.instrumentation import result_len, traced
+
+# HTML além deste tamanho é descartado antes da conversão
+MAX_HTML_CHARS = 1_000_000
+# Texto produzido no modo de prévia (exibição rápida)
+PREVIEW_CHARS = 4000
+# Conversões memorizadas (por hash do corpo), limitadas pelo total de
+# caracteres de texto guardado: poucas mensagens enormes não prendem memória
+MEMO_CHARS = 2_000_000
+
+_BLOCK_TAGS = frozenset(
+    ("p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "hr")
+)
+_SKIP_TAGS = frozenset(("script", "style", "head", "title"))
+_BLANK_LINES = re.compile(r"\n[ \t]*\n(?:[ \t]*\n)+")
+_SPACES = re.compile(r"[ \t\r\f\v\xa0]+")
+
+_memo: "OrderedDict[Tuple[bytes, str, int], str]" = OrderedDict()
+_memo_chars = 0
+_memo_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    return (text or "").replace("\r\n", "\n").replace("\r", "\n")
+
+
+@traced(size=result_len)
+def html_to_text(html: str, preview: bool = False, max_chars: int = MAX_HTML_CHARS) -> str:
+    """Converte HTML de corpo de mensagem em texto.
+
+    O modo normal usa html2text (Markdown leve); ``preview=True`` usa um
+    extrator simples de texto, bem mais rápido, limitado a ``PREVIEW_CHARS``.
+    Resultados são memorizados pelo hash do HTML.
+    """
+    if not html:
+        return ""
+    html = html[:max_chars]
+    mode = "preview" if preview else "full"
+    key = (hashlib.blake2b(html.encode("utf-8", "surrogatepass"), digest_size=16).digest(), mode, max_chars)
+    with _memo_lock:
+        text = _memo.get(key)
+        if text is not None:
+            _memo.move_to_end(key)
+            return text
+    if preview:
+        text = html_to_plain(html, PREVIEW_CHARS)
+    else:
+        converter = _converter()
+        if converter is None:
+            text = html_to_plain(html)
+        else:
+            try:
+                text = normalize_text(converter.handle(html))
+            except Exception:
+                text = html_to_plain(html)
+    _remember(key, text)
+    return text
+
+
+def _remember(key: Tuple[bytes, str, int], text: str) -> None:
+    global _memo_chars
+    # Texto maior que o limite inteiro não é guardado
+    if len(text) > MEMO_CHARS:
+        return
+    with _memo_lock:
+        old = _memo.pop(key, None)
+        if old is not None:
+            _memo_chars -= len(old)
+        _memo[key] = text
+        _memo_chars += len(text)
+        while _memo_chars > MEMO_CHARS:
+            _key, evicted = _memo.popitem(last=False)
+            _memo_chars -= len(evicted)
+
+
+def html_to_plain(html: str, limit: Optional[int] = None) -> str:
+    """Extrai apenas o texto visível (sem Markdown), parando em ``limit`` caracteres."""
+    parser = _PlainTextParser(limit)
+    try:
+        parser.feed(html)
+        parser.close()
+    except _Enough:
+        pass
+    text = _BLANK_LINES.sub("\n\n", "".join(parser.parts)).strip("\n")
+    return text[:limit] if limit is not None else text
+
+
+def clear_memo() -> None:
+    global _memo_chars
+    with _memo_lock:
+        _memo.clear()
+        _memo_chars = 0
+
+
+def memo_chars() -> int:
+    """Caracteres de texto guardados na memória de conversões."""
+    with _memo_lock:
+        return _memo_chars
+
+
+def _converter():
+    # Um conversor novo por mensagem, e não um por thread reaproveitado como
+    # pedido originalmente: HTML2Text guarda estado entre chamadas (um
+    # <blockquote> aberto marcaria com "> " as mensagens seguintes). Criar um
+    # custa microssegundos, contra milissegundos da conversão; o ganho de
+    # velocidade fica com o memo acima
+    try:
+        import html2text  # type: ignore
+    except Exception:
+        return None
+    conv = html2text.HTML2Text()
+    conv.ignore_links = False
+    conv.ignore_images = True
+    conv.body_width = 0
+    return conv
+
+
+class _Enough(Exception):
+    pass
+
+
+class _PlainTextParser(HTMLParser):
+    def __init__(self, limit: Optional[int]) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._size = 0
+        self._limit = limit
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs) -> None:
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_endtag(self, tag) -> None:
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_data(self, data) -> None:
+        if self._skip:
+            return
+        data = _SPACES.sub(" ", data.replace("\n", " "))
+        if data.strip():
+            self._append(data)
+
+    def _append(self, text: str) -> None:
+        self.parts.append(text)
+        self._size += len(text)
+        if self._limit is not None and self._size >= self._limit:
+            raise _Enough
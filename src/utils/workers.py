@@ -0,0 +1,26 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from src.pst_reader import PstReader
+
+# Processos de trabalho: cada um mantém seu próprio leitor aberto
+_READER: Optional[PstReader] = None
+
+
+def init_worker_reader(pst_path: str, index_dir: Optional[str]) -> None:
+    """``initializer`` dos pools de processos: abre o leitor deste processo."""
+    global _READER
+    _READER = PstReader(index_dir=index_dir, lazy_folders=True)
+    _READER.open(pst_path)
+
+
+def worker_reader() -> PstReader:
+    """Leitor aberto por ``init_worker_reader`` neste processo."""
+    if _READER is None:
+        raise RuntimeError("processo de trabalho sem leitor; use init_worker_reader como initializer")
+    return _READER
@@ -0,0 +1,365 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from src import instrumentation
+from src.instrumentation import traced
+from src.previews import PreviewBatch
+
+# loader(start, count, done, failed): busca as linhas [start, start + count) e
+# chama done(lote) quando prontas (imediatamente ou mais tarde), ou failed()
+# se a busca falhar ou for cancelada
+RowLoader = Callable[[int, int, Callable[[PreviewBatch], None], Callable[[], None]], None]
+
+# Coluna do Treeview -> coluna de ordenação das prévias
+COLUMN_KEYS = {"assunto": "subject", "remetente": "sender", "data": "date"}
+COLUMN_TITLES = {"assunto": "Assunto", "remetente": "Remetente", "data": "Data"}
+MAX_SORT_KEYS = 3
+
+
+class VirtualMessageList(ttk.Frame):
+    """Lista de mensagens virtualizada.
+
+    O Treeview contém apenas as linhas visíveis; as prévias são buscadas em
+    blocos (``PreviewBatch``) pelo ``loader`` conforme a rolagem, com uma
+    margem de pré-busca acima e abaixo da janela visível.
+
+    Clicar num cabeçalho torna a coluna a chave principal de ordenação (ou
+    inverte o sentido, se já for); as anteriores viram chaves secundárias.
+    A ordenação em si fica com quem fornece o ``loader`` (``bind_sort``).
+    """
+
+    def __init__(self, master, block_size: int = 200, prefetch_blocks: int = 1, **kwargs) -> None:
+        super().__init__(master, **kwargs)
+        columns = ("assunto", "remetente", "data")
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="browse")
+        for column in columns:
+            self.tree.heading(column, text=COLUMN_TITLES[column], command=lambda c=column: self._on_heading(c))
+        self.tree.column("assunto", width=400, anchor=tk.W)
+        self.tree.column("remetente", width=200, anchor=tk.W)
+        self.tree.column("data", width=150, anchor=tk.W)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.block_size = block_size
+        self.prefetch_blocks = prefetch_blocks
+        self._loader: Optional[RowLoader] = None
+        self._generation = 0
+        self._total = 0
+        self._offset = 0
+        self._visible = 20
+        self._blocks: Dict[int, PreviewBatch] = {}
+        self._pending_blocks: Set[int] = set()
+        self._selected: Optional[int] = None
+        self._select_pending = False
+        self._in_refresh = False
+        self._select_callbacks: List[Callable[[], None]] = []
+        # [(coluna, decrescente)], chave principal primeiro
+        self._sort: List[Tuple[str, bool]] = []
+        self._sort_callbacks: List[Callable[[List[Tuple[str, bool]]], None]] = []
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda _e: self._scroll(-3))
+        self.tree.bind("<Button-5>", lambda _e: self._scroll(3))
+        self.tree.bind("<Up>", lambda _e: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda _e: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda _e: self._move_selection(-self._visible))
+        self.tree.bind("<Next>", lambda _e: self._move_selection(self._visible))
+        self.tree.bind("<Home>", lambda _e: self._move_selection(-self._total))
+        self.tree.bind("<End>", lambda _e: self._move_selection(self._total))
+
+    # API pública
+    def set_source(self, total: int, loader: Optional[RowLoader]) -> None:
+        self._generation += 1
+        self._total = max(total, 0)
+        self._loader = loader
+        self._blocks.clear()
+        self._pending_blocks.clear()
+        self._offset = 0
+        self._selected = None
+        self._select_pending = False
+        self._refresh()
+
+    def clear(self) -> None:
+        self.set_source(0, None)
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    def bind_select(self, callback: Callable[[], None]) -> None:
+        self._select_callbacks.append(callback)
+
+    def bind_sort(self, callback: Callable[[List[Tuple[str, bool]]], None]) -> None:
+        """``callback(spec)`` a cada clique em cabeçalho."""
+        self._sort_callbacks.append(callback)
+
+    @property
+    def sort_spec(self) -> List[Tuple[str, bool]]:
+        return list(self._sort)
+
+    def set_sort(self, spec: List[Tuple[str, bool]]) -> None:
+        """Define a ordenação exibida nos cabeçalhos, sem avisar ``bind_sort``."""
+        self._sort = list(spec)[:MAX_SORT_KEYS]
+        self._update_headings()
+
+    def selection(self) -> Tuple[str, ...]:
+        row = self._row(self._selected) if self._selected is not None else None
+        return (row[0].ids[row[1]],) if row else ()
+
+    def selected_index(self) -> Optional[int]:
+        return self._selected
+
+    def row_ids(self, start: int, count: int) -> List[str]:
+        """IDs já carregados na faixa (para pré-busca de vizinhos)."""
+        ids = []
+        for i in range(start, min(start + count, self._total)):
+            row = self._row(i)
+            if row:
+                ids.append(row[0].ids[row[1]])
+        return ids
+
+    def _row(self, index: int) -> Optional[Tuple[PreviewBatch, int]]:
+        batch = self._blocks.get(index // self.block_size)
+        k = index % self.block_size
+        return (batch, k) if batch is not None and k < len(batch) else None
+
+    def select_at(self, y: int) -> bool:
+        slot = self.tree.identify_row(y)
+        if not slot:
+            return False
+        self.select_index(self._offset + self.tree.index(slot))
+        return True
+
+    def select_index(self, index: int) -> None:
+        if not self._total:
+            return
+        index = max(0, min(index, self._total - 1))
+        if index < self._offset:
+            self._offset = index
+        elif index >= self._offset + self._visible:
+            self._offset = index - self._visible + 1
+        changed = index != self._selected
+        self._selected = index
+        self._refresh()
+        if changed:
+            self._notify_select()
+
+    # Eventos
+    def _on_heading(self, column: str) -> None:
+        key = COLUMN_KEYS[column]
+        if self._sort and self._sort[0][0] == key:
+            spec = [(key, not self._sort[0][1])] + self._sort[1:]
+        else:
+            spec = [(key, False)] + [s for s in self._sort if s[0] != key]
+        self.set_sort(spec)
+        for callback in self._sort_callbacks:
+            callback(self.sort_spec)
+
+    def _update_headings(self) -> None:
+        rank = {key: (i, reverse) for i, (key, reverse) in enumerate(self._sort)}
+        for column, key in COLUMN_KEYS.items():
+            text = COLUMN_TITLES[column]
+            if key in rank:
+                i, reverse = rank[key]
+                text += " ▼" if reverse else " ▲"
+                if i:
+                    text += str(i + 1)
+            self.tree.heading(column, text=text)
+
+    def _on_configure(self, event) -> None:
+        try:
+            row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        except (tk.TclError, ValueError):
+            row_height = 20
+        visible = max(1, (event.height - 24) // row_height)
+        if visible != self._visible:
+            self._visible = visible
+            self._refresh()
+
+    def _on_tree_select(self, _event=None) -> None:
+        sel = self.tree.selection()
+        if not sel:
+            return
+        index = self._offset + self.tree.index(sel[0])
+        # Seleções programáticas (re-render) chegam aqui com o mesmo índice
+        if index != self._selected:
+            self._selected = index
+            self._notify_select()
+
+    def _on_wheel(self, event) -> str:
+        self._scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_scrollbar(self, *args) -> None:
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._offset = int(float(args[1]) * self._total)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self._offset += step * (self._visible if args[2] == "pages" else 1)
+        self._refresh()
+
+    def _scroll(self, rows: int) -> None:
+        self._offset += rows
+        self._refresh()
+
+    def _move_selection(self, delta: int) -> str:
+        if self._selected is None:
+            self.select_index(self._offset)
+        else:
+            self.select_index(self._selected + delta)
+        return "break"
+
+    def _notify_select(self) -> None:
+        if self._selected is not None and self._row(self._selected) is None:
+            # Linha ainda não carregada: avisar quando o bloco chegar
+            self._select_pending = True
+            return
+        self._select_pending = False
+        for callback in self._select_callbacks:
+            callback()
+
+    # Janela e blocos
+    def _refresh(self) -> None:
+        self._offset = max(0, min(self._offset, self._total - self._visible))
+        self._in_refresh = True
+        try:
+            self._request_window()
+        finally:
+            self._in_refresh = False
+        self._render()
+
+    def _request_window(self) -> None:
+        if self._loader is None or not self._total:
+            return
+        bs = self.block_size
+        first = max(0, self._offset // bs - self.prefetch_blocks)
+        last = min((self._total - 1) // bs, (self._offset + self._visible) // bs + self.prefetch_blocks)
+        # Descarta blocos longe da janela para manter a memória limitada
+        for block in [b for b in self._blocks if b < first - 1 or b > last + 1]:
+            del self._blocks[block]
+        for block in range(first, last + 1):
+            if block not in self._blocks and block not in self._pending_blocks:
+                self._request_block(block)
+
+    def _request_block(self, block: int) -> None:
+        start = block * self.block_size
+        count = min(self.block_size, self._total - start)
+        generation = self._generation
+        self._pending_blocks.add(block)
+
+        def done(batch: PreviewBatch) -> None:
+            if generation != self._generation:
+                return  # resposta de uma fonte antiga
+            self._pending_blocks.discard(block)
+            self._blocks[block] = batch
+            if not self._in_refresh:
+                self._render()
+            if self._select_pending and self._row(self._selected) is not None:
+                self._notify_select()
+
+        def failed() -> None:
+            # Sem o bloco: a próxima rolagem pede de novo
+            if generation == self._generation:
+                self._pending_blocks.discard(block)
+
+        self._loader(start, count, done, failed)
+
+    @traced()
+    def _render(self) -> None:
+        end = min(self._total, self._offset + self._visible)
+        slots = self.tree.get_children()
+        needed = end - self._offset
+        if len(slots) > needed:
+            self.tree.delete(*slots[needed:])
+            slots = slots[:needed]
+        for k in range(len(slots), needed):
+            self.tree.insert("", tk.END, iid=f"slot:{k}")
+        for k in range(needed):
+            row = self._row(self._offset + k)
+            if row:
+                batch, j = row
+                values = (batch.subjects[j], batch.senders[j], batch.date_text(j))
+            else:
+                values = ("Carregando...", "", "")
+            self.tree.item(f"slot:{k}", values=values)
+        if self._selected is not None and self._offset <= self._selected < end:
+            slot = f"slot:{self._selected - self._offset}"
+            if self.tree.selection() != (slot,):
+                self.tree.selection_set(slot)
+            self.tree.focus(slot)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        if self._total:
+            self.scrollbar.set(self._offset / self._total, end / self._total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+class InstrumentationPanel(tk.Toplevel):
+    """Contadores de ``src.instrumentation`` ao vivo, com exportação do trace."""
+
+    COLUMNS = ("chamadas", "total", "media", "max", "bytes")
+
+    def __init__(self, master, refresh_ms: int = 500) -> None:
+        super().__init__(master)
+        self.title("Depuração - instrumentação")
+        self.geometry("760x420")
+        self.refresh_ms = refresh_ms
+
+        bar = ttk.Frame(self)
+        bar.pack(fill=tk.X, side=tk.TOP)
+        self.enabled_var = tk.BooleanVar(value=instrumentation.is_enabled())
+        ttk.Checkbutton(bar, text="Coletar", variable=self.enabled_var, command=self._on_toggle).pack(side=tk.LEFT, padx=4)
+        ttk.Button(bar, text="Zerar", command=instrumentation.reset).pack(side=tk.LEFT)
+        ttk.Button(bar, text="Exportar JSON...", command=lambda: self._export("json")).pack(side=tk.LEFT)
+        ttk.Button(bar, text="Exportar Chrome trace...", command=lambda: self._export("chrome")).pack(side=tk.LEFT)
+
+        self.tree = ttk.Treeview(self, columns=self.COLUMNS, show="tree headings")
+        self.tree.heading("#0", text="Ponto")
+        self.tree.column("#0", width=260, anchor=tk.W)
+        for column, title in zip(self.COLUMNS, ("Chamadas", "Total ms", "Média ms", "Máx ms", "Bytes")):
+            self.tree.heading(column, text=title)
+            self.tree.column(column, width=90, anchor=tk.E)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self._refresh()
+
+    def _on_toggle(self) -> None:
+        if self.enabled_var.get():
+            instrumentation.enable()
+        else:
+            instrumentation.disable()
+
+    def _export(self, fmt: str) -> None:
+        from tkinter import filedialog
+
+        default = ".trace.json" if fmt == "chrome" else ".json"
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=default, filetypes=[("JSON", "*.json")])
+        if path:
+            instrumentation.export(path, fmt)
+
+    def _refresh(self) -> None:
+        if not self.winfo_exists():
+            return
+        counters = instrumentation.snapshot()
+        present = set(self.tree.get_children())
+        # Mais caros primeiro
+        for name, c in sorted(counters.items(), key=lambda kv: -kv[1].total_ns):
+            values = (c.calls, f"{c.total_ns / 1e6:.1f}", f"{c.avg_ms:.3f}", f"{c.max_ns / 1e6:.1f}", c.bytes or "")
+            if name in present:
+                self.tree.item(name, values=values)
+            else:
+                self.tree.insert("", tk.END, iid=name, text=name, values=values)
+        stale = present - set(counters)
+        if stale:
+            self.tree.delete(*stale)
+        self.after(self.refresh_ms, self._refresh)
@@ -0,0 +1,138 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import importlib.util
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+# Script que imita ``readpst -q -r -8 -o SAIDA ARQUIVO.pst``: grava em SAIDA
+# a árvore descrita no JSON ao lado (pasta -> conteúdo do mbox) e anota
+# cada chamada em ``chamadas.log``
+STUB = """\
+#!{python}
+import json, os, sys
+here = os.path.dirname(os.path.abspath(__file__))
+args = sys.argv[1:]
+out = args[args.index("-o") + 1]
+with open(os.path.join(here, "chamadas.log"), "a", encoding="utf-8") as log:
+    log.write(" ".join(args) + "\\n")
+with open(os.path.join(here, "arvore.json"), encoding="utf-8") as f:
+    tree = json.load(f)
+for rel, mbox in tree.items():
+    folder = os.path.join(out, *rel.split("/"))
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "mbox"), "wb") as f:
+        f.write(mbox.encode("utf-8"))
+"""
+
+
+def mbox_message(
+    subject,
+    sender="Ana <ana@example.com>",
+    to="bob@example.com",
+    date="Mon, 01 Jan 2024 10:00:00 +0000",
+    body="corpo",
+    attachment=None,
+    cc=None,
+    headers=(),
+):
+    """Mensagem no formato gravado pelo readpst (linha "From " e corpo em mboxrd)."""
+    extra, headers = list(headers), [f"From: {sender}", f"To: {to}"]
+    if cc:
+        headers.append(f"Cc: {cc}")
+    headers += [f"Subject: {subject}", f"Date: {date}", *extra, "MIME-Version: 1.0"]
+    body = "\n".join(">" + line if line.lstrip(">").startswith("From ") else line for line in body.split("\n"))
+    if attachment is None:
+        parts = ["Content-Type: text/plain; charset=utf-8", "", body]
+    else:
+        name, b64 = attachment
+        parts = [
+            'Content-Type: multipart/mixed; boundary="limite"',
+            "",
+            "--limite",
+            "Content-Type: text/plain; charset=utf-8",
+            "",
+            body,
+            "",
+            "--limite",
+            f'Content-Type: application/octet-stream; name="{name}"',
+            f'Content-Disposition: attachment; filename="{name}"',
+            "Content-Transfer-Encoding: base64",
+            "",
+            b64,
+            "--limite--",
+        ]
+    return "\n".join(['From "Ana" Mon Jan  1 00:00:00 2024', *headers, *parts, "", ""])
+
+
+@pytest.fixture
+def fake_readpst(tmp_path, monkeypatch):
+    """Instala um ``readpst`` falso no PATH; devolve uma função que grava a árvore e o .pst."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "readpst"
+    script.write_text(STUB.format(python=sys.executable), encoding="utf-8")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+
+    def make(tree, name="teste.pst"):
+        (bin_dir / "arvore.json").write_text(json.dumps(tree), encoding="utf-8")
+        pst = tmp_path / name
+        pst.write_bytes(b"!BDN" + name.encode("utf-8"))
+        return str(pst)
+
+    def calls():
+        log = bin_dir / "chamadas.log"
+        return log.read_text(encoding="utf-8").splitlines() if log.exists() else []
+
+    make.calls = calls
+    return make
+
+
+@pytest.fixture
+def without_pypff(monkeypatch):
+    # Força o fallback para o readpst mesmo com pypff instalado
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *a: None if name == "pypff" else find_spec(name, *a))
+
+
+@pytest.fixture
+def closed_readers(monkeypatch):
+    """Caminhos dos ``PstReader`` fechados durante o teste."""
+    from src.pst_reader import PstReader
+
+    closed = []
+    original = PstReader.close
+
+    def close(self):
+        closed.append(self.path)
+        original(self)
+
+    monkeypatch.setattr(PstReader, "close", close)
+    return closed
+
+
+@pytest.fixture
+def sample_tree():
+    return {
+        "Pastas Pessoais": "",
+        "Pastas Pessoais/Caixa de Entrada": "".join(
+            [
+                mbox_message("Primeira", date="Mon, 01 Jan 2024 10:00:00 +0000", body="linha 1\nFrom aqui\nfim"),
+                mbox_message(
+                    "=?utf-8?q?Relat=C3=B3rio?=",
+                    date="Tue, 02 Jan 2024 09:30:00 +0000",
+                    attachment=("dados.bin", "AAECAwQF"),
+                    cc="carla@example.com",
+                ),
+                mbox_message("Terceira", sender="Bruno <bruno@example.com>", date="Wed, 03 Jan 2024 08:00:00 +0000"),
+            ]
+        ),
+        "Pastas Pessoais/Enviados": mbox_message("Enviada", date="Thu, 04 Jan 2024 12:00:00 +0000"),
+        "Pastas Pessoais/Vazia": "",
+    }
@@ -0,0 +1,58 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import mailbox
+import os
+
+import pytest
+
+from src.bulk_export import MBOX_NAME, BulkExporter, ExportShard, _export_shard_with
+from src.previews import PreviewBatch
+
+
+class SkippingReader:
+    """Pasta de 3 mensagens em que a do meio não pôde ser lida."""
+
+    def preview_batch(self, folder_id, start=0, count=None):
+        batch = PreviewBatch(folder_id, start)
+        for position in (0, 2):
+            batch.append(f"{folder_id}:m{position}", f"Assunto {position}", "Ana", 0, position=position)
+        return batch
+
+    def export_eml(self, msg_id, path):
+        with open(path, "wb") as f:
+            f.write(msg_id.encode())
+
+
+def test_nomes_pela_posicao_real_apos_mensagem_pulada(tmp_path):
+    shard = ExportShard("f1", "Caixa de Entrada", 0, 3)
+    key, messages, nbytes, errors = _export_shard_with(SkippingReader(), shard, str(tmp_path), "eml")
+    assert (messages, errors) == (2, [])
+    folder = tmp_path / "Caixa de Entrada"
+    assert sorted(os.listdir(folder)) == ["000000 - Assunto 0.eml", "000002 - Assunto 2.eml"]
+    assert (folder / "000002 - Assunto 2.eml").read_bytes() == b"f1:m2"
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_retomada_com_outro_tamanho_de_fatia_recomeca(fake_readpst, sample_tree, tmp_path, without_pypff, closed_readers):
+    pst = fake_readpst(sample_tree)
+    out_dir = tmp_path / "saida"
+    options = dict(fmt="mbox", workers=1, index_dir=str(tmp_path / "indice"))
+
+    def stop(progress):
+        raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        BulkExporter(pst, str(out_dir), shard_size=1, on_progress=stop, **options).run()
+    # Interrompida: o leitor foi fechado mesmo assim
+    assert closed_readers == [os.path.abspath(pst)]
+
+    progress = BulkExporter(pst, str(out_dir), shard_size=2, **options).run()
+    assert progress.messages == 4 and progress.errors == []
+    inbox = mailbox.mbox(str(out_dir / "Pastas Pessoais" / "Caixa de Entrada" / MBOX_NAME))
+    assert [m["Subject"] for m in inbox] == ["Primeira", "=?utf-8?q?Relat=C3=B3rio?=", "Terceira"]
+    assert len(closed_readers) == 2
@@ -0,0 +1,40 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import threading
+import time
+
+from src.io_executor import IoExecutor
+
+
+class FakeRoot:
+    """``after`` sem Tk: o teste chama o polling à mão."""
+
+    def after(self, ms, callback):
+        pass
+
+
+def test_callbacks_de_erro_e_de_cancelamento():
+    io = IoExecutor(FakeRoot(), frame_budget_ms=50)
+    gate = threading.Event()
+    calls = []
+    try:
+        io.submit(gate.wait, key="bloqueio")
+        first = io.submit(lambda: 1, on_done=calls.append, key="rows:0", on_cancel=lambda: calls.append("cancelada"))
+        # Mesma key: a anterior é substituída (cancelada)
+        second = io.submit(lambda: 2, on_done=calls.append, key="rows:0", on_cancel=lambda: calls.append("cancelada"))
+        failing = io.submit(
+            lambda: 1 / 0,
+            on_error=lambda exc: calls.append(type(exc).__name__),
+            key="rows:1",
+            on_cancel=lambda: calls.append("não"),
+        )
+        gate.set()
+        deadline = time.monotonic() + 10
+        while len(calls) < 3 and time.monotonic() < deadline:
+            io._poll()
+        assert first.cancelled and not second.cancelled and not failing.cancelled
+        assert sorted(calls, key=str) == [2, "ZeroDivisionError", "cancelada"]
+    finally:
+        io.shutdown()
@@ -0,0 +1,50 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from src.message_cache import CacheNamespace, MessageCache, estimate_size
+from src.models import PstEmail
+
+
+def email(msg_id, body=""):
+    return PstEmail(
+        id=msg_id,
+        subject="Assunto",
+        sender="Ana",
+        to="",
+        cc="",
+        date=None,
+        body_text=body,
+        body_html=None,
+        attachments=[],
+    )
+
+
+def test_lru_limitada_por_bytes():
+    a, b, c = email("a", "x" * 100), email("b", "x" * 100), email("c", "x" * 100)
+    cache = MessageCache(max_bytes=2 * estimate_size(a))
+    cache.put(a)
+    cache.put(b)
+    assert cache.get("a") is a  # "a" passa a ser o mais recente
+    cache.put(c)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    stats = cache.stats()
+    assert (stats.entries, stats.bytes_used, stats.hits) == (2, 2 * estimate_size(a), 1)
+
+
+def test_item_maior_que_o_limite_nao_e_guardado():
+    cache = MessageCache(max_bytes=100)
+    cache.put(email("a"), size=101)
+    assert "a" not in cache and cache.stats().bytes_used == 0
+
+
+def test_namespaces_dividem_o_limite():
+    shared = MessageCache(max_bytes=1000)
+    first, second = CacheNamespace(shared, "1/"), CacheNamespace(shared, "2/")
+    first.put(email("m"), size=400)
+    second.put(email("m"), size=400)
+    # Outros objetos entram com tamanho informado (ex.: ordens de pasta)
+    first.put(object(), key="ordem", size=300)
+    assert "m" not in first and "m" in second and "ordem" in first
+    first.clear()
+    assert shared.stats().bytes_used == 400 and "m" in second
@@ -0,0 +1,18 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import csv
+import os
+
+from src.metadata_export import MetadataExporter
+
+
+def test_exportacao_fecha_o_leitor_proprio(fake_readpst, sample_tree, tmp_path, without_pypff, closed_readers):
+    pst = fake_readpst(sample_tree)
+    out = tmp_path / "metadados.csv"
+    progress = MetadataExporter(pst, str(out), index_dir=str(tmp_path / "indice")).run()
+    assert (progress.rows, progress.errors) == (4, [])
+    with open(out, newline="", encoding="utf-8") as f:
+        assert len(list(csv.DictReader(f))) == 4
+    assert closed_readers == [os.path.abspath(pst)]
@@ -0,0 +1,141 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from datetime import datetime, timezone
+from email import policy
+from email.parser import BytesParser
+import io
+import mailbox
+import os
+
+from src.bulk_export import MBOX_NAME, BulkExporter
+from src.utils.exporters import MboxrdWriter, mbox_from_line
+from src.utils.mime import MimeAttachment, MimeMessage, MimeWriter, iter_base64, parse_header_block
+
+TRANSPORT = (
+    "Microsoft Mail Internet Headers Version 2.0\r\n"
+    "Received: from mx.example.com\r\n"
+    "\tby relay.example.com; Mon, 1 Jan 2024 10:00:00 +0000\r\n"
+    "Message-ID: <abc@example.com>\r\n"
+    "X-Custom: valor\r\n"
+    "Content-Type: text/plain\r\n"
+    "Subject: Original\r\n"
+    "\r\n"
+)
+
+
+def parse(data: bytes):
+    return BytesParser(policy=policy.default).parsebytes(data)
+
+
+def write(message: MimeMessage) -> bytes:
+    out = io.BytesIO()
+    assert MimeWriter(out).write_message(message) == len(out.getvalue())
+    return out.getvalue()
+
+
+def test_parse_header_block_com_continuacao():
+    headers = parse_header_block(TRANSPORT)
+    assert [name for name, _raw in headers] == ["Received", "Message-ID", "X-Custom", "Content-Type", "Subject"]
+    assert headers[0][1].endswith("\tby relay.example.com; Mon, 1 Jan 2024 10:00:00 +0000")
+
+
+def test_cabecalhos_de_transporte_mantidos_e_estrutura_refeita():
+    msg = parse(
+        write(
+            MimeMessage(
+                subject="Do PST",
+                sender="Ana <ana@example.com>",
+                to="bob@example.com",
+                timestamp=datetime(2024, 1, 1, 10, tzinfo=timezone.utc),
+                body_text="olá",
+                transport_headers=TRANSPORT,
+            )
+        )
+    )
+    assert msg["Message-ID"] == "<abc@example.com>"
+    assert msg["X-Custom"] == "valor"
+    # Do transporte prevalece; o que falta vem do PST
+    assert msg["Subject"] == "Original"
+    assert msg["From"] == "Ana <ana@example.com>"
+    assert msg.get_content_type() == "text/plain"
+    assert msg.get_content().strip() == "olá"
+
+
+def test_anexos_e_mensagem_incorporada():
+    payload = bytes(range(256)) * 40
+    inner = MimeMessage(subject="Interna", sender="c@example.com", body_text="dentro")
+    msg = parse(
+        write(
+            MimeMessage(
+                subject="Com anexos",
+                body_text="texto",
+                body_html="<p>texto</p>",
+                attachments=[
+                    MimeAttachment("relatório.bin", "application/octet-stream", [payload[:1000], payload[1000:]]),
+                    MimeAttachment("encaminhada.eml", "message/rfc822", embedded=inner),
+                    MimeAttachment("ruim", "tipo inválido", [b"x"]),
+                ],
+            )
+        )
+    )
+    assert msg.get_content_type() == "multipart/mixed"
+    parts = list(msg.iter_attachments())
+    assert parts[0].get_filename() == "relatório.bin"
+    assert parts[0].get_content() == payload
+    assert parts[1].get_content_type() == "message/rfc822"
+    assert parts[1].get_content()["Subject"] == "Interna"
+    assert parts[2].get_content_type() == "application/octet-stream"
+    assert msg.get_body(preferencelist=("html",)).get_content().strip() == "<p>texto</p>"
+
+
+def test_base64_em_blocos_igual_ao_inteiro():
+    data = os.urandom(10_000)
+    whole = b"".join(iter_base64([data]))
+    chunked = b"".join(iter_base64([data[:7], data[7:5000], data[5000:]]))
+    assert whole == chunked
+    assert all(len(line) <= 76 for line in whole.split(b"\r\n"))
+
+
+def test_mboxrd_em_streaming_com_blocos_de_qualquer_tamanho():
+    eml = b"From: a\r\n\r\nFrom aqui\r\n>From ali\r\nnada From\r\n>>From x\r\nFro"
+    expected = b"From: a\n\n>From aqui\n>>From ali\nnada From\n>>>From x\nFro\n\n"
+    for size in (1, 2, 3, 5, 64):
+        out = io.BytesIO()
+        writer = MboxrdWriter(out)
+        for i in range(0, len(eml), size):
+            writer.write(eml[i : i + size])
+        writer.finish()
+        assert out.getvalue() == expected
+        assert writer.written == len(expected)
+
+
+def test_entrada_mbox_completa():
+    out = io.BytesIO()
+    out.write(mbox_from_line("ana@example.com").encode())
+    writer = MboxrdWriter(out)
+    writer.write(b"Subject: x\r\n\r\nFrom aqui\r\n")
+    writer.finish()
+    from_line, rest = out.getvalue().split(b"\n", 1)
+    assert from_line.startswith(b"From ana@example.com ")
+    assert rest == b"Subject: x\n\n>From aqui\n\n"
+    # Remetente sem endereço simples: separador genérico
+    assert mbox_from_line("Ana <ana@example.com>").startswith("From MAILER-DAEMON ")
+
+
+def test_exportacao_mbox_completa(fake_readpst, sample_tree, tmp_path, without_pypff):
+    pst = fake_readpst(sample_tree)
+    out_dir = tmp_path / "saida"
+    progress = BulkExporter(pst, str(out_dir), fmt="mbox", workers=1, index_dir=str(tmp_path / "indice")).run()
+    assert progress.errors == [] and progress.messages == 4
+
+    path = out_dir / "Pastas Pessoais" / "Caixa de Entrada" / MBOX_NAME
+    messages = list(mailbox.mbox(str(path)))
+    assert [m["Subject"] for m in messages] == ["Primeira", "=?utf-8?q?Relat=C3=B3rio?=", "Terceira"]
+    # "From " do corpo escapado uma vez (mboxrd); anexo e Cc preservados
+    raw = path.read_bytes()
+    assert b"\n>From aqui\n" in raw and b">>From aqui" not in raw
+    assert messages[1]["Cc"] == "carla@example.com"
+    attachment = [p for p in messages[1].walk() if p.get_filename()]
+    assert [(p.get_filename(), p.get_payload(decode=True)) for p in attachment] == [("dados.bin", bytes(range(6)))]
@@ -0,0 +1,181 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import hashlib
+import json
+import os
+
+import pytest
+
+from src import cli
+from src.adapters.readpst_adapter import MAIL_DIR, MBOX_NAME, ReadPstAdapter
+from src.pst_reader import PstReader
+
+from tests.conftest import mbox_message
+
+
+@pytest.fixture
+def adapter(fake_readpst, sample_tree, tmp_path):
+    adapter = ReadPstAdapter(index_dir=str(tmp_path / "indice"))
+    adapter.open(fake_readpst(sample_tree))
+    yield adapter
+    adapter.close()
+
+
+@pytest.fixture
+def reader(fake_readpst, sample_tree, tmp_path, without_pypff):
+    reader = PstReader(index_dir=str(tmp_path / "indice"))
+    reader.open(fake_readpst(sample_tree))
+    assert isinstance(reader.adapter, ReadPstAdapter)
+    yield reader
+    reader.close()
+
+
+def folder_by_path(reader):
+    return {path: folder for folder, path, _depth in reader.walk_folders()}
+
+
+def test_arvore_de_pastas(reader):
+    roots = reader.get_root_folders()
+    assert [f.name for f in roots] == ["Pastas Pessoais"]
+    children = reader.get_sub_folders(roots[0].id)
+    assert [(f.name, f.message_count) for f in children] == [("Caixa de Entrada", 3), ("Enviados", 1), ("Vazia", 0)]
+    assert roots[0].subfolder_count == 3
+
+
+def test_ids_de_pasta_estaveis_entre_aberturas(fake_readpst, sample_tree, tmp_path):
+    pst = fake_readpst(sample_tree)
+    ids = []
+    for index_dir in ("a", "b"):
+        adapter = ReadPstAdapter(index_dir=str(tmp_path / index_dir))
+        adapter.open(pst)
+        ids.append([f.id for f in adapter.get_sub_folders(adapter.get_root_folders()[0].id)])
+        adapter.close()
+    assert ids[0] == ids[1]
+
+
+def test_listagem_e_previas(reader):
+    inbox = folder_by_path(reader)["Pastas Pessoais/Caixa de Entrada"]
+    previews = reader.list_messages(inbox.id)
+    assert [m.subject for m in previews] == ["Primeira", "Relatório", "Terceira"]
+    assert [m.attachment_count for m in previews] == [0, 1, 0]
+    assert previews[2].sender == "Bruno <bruno@example.com>"
+
+    batch = reader.preview_batch(inbox.id, 1, 5)
+    assert batch.ids == [f"{inbox.id}:1", f"{inbox.id}:2"]
+    assert [m.subject for m in reader.iter_messages(inbox.id, 2)] == ["Terceira"]
+
+
+def test_listagem_por_periodo(reader):
+    inbox = folder_by_path(reader)["Pastas Pessoais/Caixa de Entrada"]
+    found = reader.list_messages(inbox.id, since="2024-01-02", until="2024-01-03")
+    assert [m.subject for m in found] == ["Relatório"]
+
+
+def test_mensagem_completa(reader):
+    inbox = folder_by_path(reader)["Pastas Pessoais/Caixa de Entrada"]
+    first = reader.get_message(f"{inbox.id}:0")
+    # ">From" do mboxrd volta a ser "From"
+    assert first.body_text.splitlines() == ["linha 1", "From aqui", "fim"]
+    assert first.to == "bob@example.com"
+
+    second = reader.get_message(f"{inbox.id}:1")
+    assert second.subject == "Relatório"
+    assert second.cc == "carla@example.com"
+    assert [(a.name, a.size, a.mime_type) for a in second.attachments] == [("dados.bin", 6, "application/octet-stream")]
+
+
+def test_mensagem_inexistente(reader):
+    inbox = folder_by_path(reader)["Pastas Pessoais/Caixa de Entrada"]
+    with pytest.raises(KeyError):
+        reader.get_message(f"{inbox.id}:99")
+    with pytest.raises(KeyError):
+        reader.get_message("rnaoexiste:0")
+
+
+def test_extracao_de_anexos(reader, tmp_path):
+    inbox = folder_by_path(reader)["Pastas Pessoais/Caixa de Entrada"]
+    extracted = reader.extract_attachments(f"{inbox.id}:1", str(tmp_path / "anexos"))
+    assert len(extracted) == 1
+    with open(extracted[0].path, "rb") as f:
+        data = f.read()
+    assert data == bytes(range(6))
+    assert (extracted[0].size, extracted[0].digest) == (6, hashlib.sha256(data).hexdigest())
+    assert reader.extract_attachments(f"{inbox.id}:0", str(tmp_path / "vazio")) == []
+
+
+def test_indice_de_deslocamentos(adapter):
+    inbox = next(f for f in adapter.get_sub_folders(adapter.get_root_folders()[0].id) if f.name == "Caixa de Entrada")
+    rows = adapter._conn.execute(
+        "SELECT position, start, end FROM messages WHERE folder_id = ? ORDER BY position", (inbox.id,)
+    ).fetchall()
+    assert [r[0] for r in rows] == [0, 1, 2]
+    mbox = adapter._mbox_paths[inbox.id]
+    with open(mbox, "rb") as f:
+        data = f.read()
+    # Cada fatia começa nos cabeçalhos (sem a linha "From ") e as fatias não se sobrepõem
+    for (_pos, start, end), (_next, next_start, _end) in zip(rows, rows[1:] + [(None, len(data) + 1, None)]):
+        assert data[start:end].startswith(b"From: ")
+        assert end < next_start
+    assert adapter._raw_message(f"{inbox.id}:2").startswith(b"From: Bruno")
+
+
+def test_reabertura_usa_a_conversao_em_cache(fake_readpst, sample_tree, tmp_path):
+    pst = fake_readpst(sample_tree)
+    for _ in range(2):
+        adapter = ReadPstAdapter(index_dir=str(tmp_path / "indice"))
+        adapter.open(pst)
+        assert adapter.count_messages(adapter.get_sub_folders(adapter.get_root_folders()[0].id)[0].id) == 3
+        adapter.close()
+    assert len(fake_readpst.calls()) == 1
+
+
+def test_pst_alterado_e_convertido_de_novo(fake_readpst, sample_tree, tmp_path):
+    pst = fake_readpst(sample_tree)
+    adapter = ReadPstAdapter(index_dir=str(tmp_path / "indice"))
+    adapter.open(pst)
+    adapter.close()
+
+    sample_tree["Pastas Pessoais/Enviados"] += mbox_message("Outra enviada")
+    fake_readpst(sample_tree)
+    with open(pst, "ab") as f:
+        f.write(b"alterado")
+    adapter.open(pst)
+    sent = next(f for f in adapter.get_sub_folders(adapter.get_root_folders()[0].id) if f.name == "Enviados")
+    assert adapter.count_messages(sent.id) == 2
+    adapter.close()
+    assert len(fake_readpst.calls()) == 2
+
+
+def test_export_eml_devolve_a_mensagem_original(adapter, tmp_path):
+    inbox = next(f for f in adapter.get_sub_folders(adapter.get_root_folders()[0].id) if f.name == "Caixa de Entrada")
+    out = tmp_path / "msg.eml"
+    adapter.export_eml(f"{inbox.id}:0", str(out))
+    data = out.read_bytes()
+    assert data.startswith(b"From: Ana")
+    assert b"\nFrom aqui\n" in data and b">From aqui" not in data
+
+
+def test_conversao_em_diretorio_do_cache(adapter):
+    root = os.path.dirname(adapter.index_path)
+    assert os.path.exists(os.path.join(root, MAIL_DIR, "Pastas Pessoais", "Enviados", MBOX_NAME))
+
+
+def test_cli_tree_e_list(fake_readpst, sample_tree, tmp_path, without_pypff, capsys):
+    pst = fake_readpst(sample_tree)
+    index_dir = str(tmp_path / "indice")
+    assert cli.main(["tree", pst, "--json", "--index-dir", index_dir]) == 0
+    folders = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [f["path"] for f in folders] == [
+        "Pastas Pessoais",
+        "Pastas Pessoais/Caixa de Entrada",
+        "Pastas Pessoais/Enviados",
+        "Pastas Pessoais/Vazia",
+    ]
+
+    inbox = folders[1]["id"]
+    assert cli.main(["list", pst, "--folder", inbox, "--index-dir", index_dir]) == 0
+    rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["subject"] for r in rows] == ["Primeira", "Relatório", "Terceira"]
+    assert rows[1]["attachments"] == 1
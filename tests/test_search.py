@@ -0,0 +1,175 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import os
+import threading
+
+import pytest
+
+from src.index.search import SearchIndex, SearchIndexer, update_search_index
+from src.models import PstEmail, PstFolder
+from src.pst_reader import PstReader
+
+
+def email(msg_id, subject, body=""):
+    return PstEmail(
+        id=msg_id,
+        subject=subject,
+        sender="Ana <ana@example.com>",
+        to="bob@example.com",
+        cc="",
+        date="2024-01-01 10:00",
+        body_text=body,
+        body_html=None,
+        attachments=[],
+    )
+
+
+class MemoryReader:
+    """Leitor mínimo para ``update_search_index``: uma pasta, mensagens em memória."""
+
+    def __init__(self, path, messages):
+        self.path = path
+        self.messages = messages
+        self.folder = PstFolder(id="f1", name="Caixa de Entrada", children=[], message_count=len(messages))
+
+    def walk_folders(self):
+        yield self.folder, self.folder.name, 0
+
+    def count_messages(self, folder_id):
+        return len(self.messages)
+
+    def iter_folder_messages(self, folder_id):
+        return iter(self.messages)
+
+    def get_message(self, msg_id):
+        return next(m for m in self.messages if m.id == msg_id)
+
+
+@pytest.fixture
+def pst(tmp_path):
+    path = tmp_path / "caixa.pst"
+    path.write_bytes(b"!BDN v1")
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "indice.sqlite"))
+    yield index
+    index.close()
+
+
+def subjects(index, query):
+    return [hit.subject for hit in index.search(query)]
+
+
+def test_indexa_e_busca(pst, index):
+    reader = MemoryReader(pst, [email("f1:0", "Contrato assinado", "segue o contrato"), email("f1:1", "Almoço")])
+    assert update_search_index(reader, index) == (1, 2)
+    assert subjects(index, "contrato") == ["Contrato assinado"]
+    # Nada mudou: nada a refazer
+    assert update_search_index(reader, index) == (0, 0)
+
+
+def test_pst_editado_com_a_mesma_contagem_e_reindexado(pst, index):
+    reader = MemoryReader(pst, [email("f1:0", "Contrato assinado"), email("f1:1", "Almoço")])
+    update_search_index(reader, index)
+
+    reader.messages[1] = email("f1:1", "Reunião de orçamento")
+    with open(pst, "ab") as f:
+        f.write(b" editado")
+    st = os.stat(pst)
+    os.utime(pst, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    assert update_search_index(reader, index) == (1, 2)
+    assert subjects(index, "orçamento") == ["Reunião de orçamento"]
+    assert subjects(index, "almoço") == []
+
+
+class TwoFolderReader(MemoryReader):
+    def __init__(self, path, messages, sent):
+        super().__init__(path, messages)
+        self.sent = sent
+        self.other = PstFolder(id="f2", name="Enviados", children=[], message_count=len(sent))
+
+    def walk_folders(self):
+        yield self.folder, self.folder.name, 0
+        yield self.other, self.other.name, 0
+
+    def _messages(self, folder_id):
+        return self.messages if folder_id == "f1" else self.sent
+
+    def count_messages(self, folder_id):
+        return len(self._messages(folder_id))
+
+    def iter_folder_messages(self, folder_id):
+        return iter(self._messages(folder_id))
+
+    def get_message(self, msg_id):
+        return next(m for m in self.messages + self.sent if m.id == msg_id)
+
+
+def touch(pst):
+    with open(pst, "ab") as f:
+        f.write(b"+")
+    st = os.stat(pst)
+    os.utime(pst, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_pst_gravado_refaz_so_as_pastas_alteradas(pst, index):
+    reader = TwoFolderReader(pst, [email("f1:0", "Contrato"), email("f1:1", "Almoço")], [email("f2:0", "Proposta")])
+    assert update_search_index(reader, index) == (2, 3)
+
+    # Gravação que não mexe em nenhuma pasta: nada é reindexado
+    touch(pst)
+    assert update_search_index(reader, index) == (0, 0)
+    assert update_search_index(reader, index) == (0, 0)
+
+    reader.sent[0] = email("f2:0", "Proposta revisada")
+    touch(pst)
+    assert update_search_index(reader, index) == (1, 1)
+    assert subjects(index, "revisada") == ["Proposta revisada"]
+    assert subjects(index, "contrato") == ["Contrato"]
+
+
+def test_indexador_fecha_o_leitor(monkeypatch, fake_readpst, sample_tree, tmp_path, without_pypff):
+    closed = []
+    original = PstReader.close
+
+    def close(self):
+        closed.append(self.path)
+        original(self)
+
+    monkeypatch.setattr(PstReader, "close", close)
+    pst = fake_readpst(sample_tree)
+    done = threading.Event()
+    indexer = SearchIndexer(pst, str(tmp_path / "indice"), on_finished=done.set)
+    indexer.start()
+    indexer.join(30)
+    assert indexer.error is None and done.is_set()
+    assert closed == [os.path.abspath(pst)]
+
+
+def test_indexador_fecha_o_leitor_mesmo_com_erro(monkeypatch, tmp_path):
+    closed = []
+    monkeypatch.setattr(PstReader, "open", lambda self, path: (_ for _ in ()).throw(RuntimeError("PST corrompido")))
+    monkeypatch.setattr(PstReader, "close", lambda self: closed.append(True))
+    indexer = SearchIndexer(str(tmp_path / "nao.pst"), str(tmp_path / "indice"))
+    indexer.run()
+    assert isinstance(indexer.error, RuntimeError) and closed == [True]
+
+
+def test_schema_antigo_e_descartado(tmp_path):
+    db = str(tmp_path / "indice.sqlite")
+    SearchIndex(db).close()
+    index = SearchIndex(db)
+    with index._lock:
+        index._conn.execute("UPDATE meta SET value = '0' WHERE key = 'search_schema'")
+        index._conn.commit()
+    index.close()
+    index = SearchIndex(db)
+    columns = [row[1] for row in index._conn.execute("PRAGMA table_info(search_folders)")]
+    index.close()
+    assert columns == ["folder_id", "message_count", "source", "fingerprint"]
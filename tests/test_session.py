@@ -0,0 +1,87 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import threading
+
+import pytest
+
+from src.session import PstSession, qualify
+
+
+@pytest.fixture
+def session(tmp_path, without_pypff):
+    session = PstSession(index_dir=str(tmp_path / "indice"), max_open=1, idle_seconds=0)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def two_psts(fake_readpst, sample_tree):
+    return fake_readpst(sample_tree, "a.pst"), fake_readpst(sample_tree, "b.pst")
+
+
+def test_lease_impede_o_fechamento_por_max_open(session, two_psts):
+    a, b = (session.add(path) for path in two_psts)
+    with session.lease(a.key) as reader:
+        # Abrir outro PST (max_open=1) não fecha o que está em uso
+        session.run(b.key, lambda r: r.get_root_folders())
+        assert reader.is_open
+        assert reader.get_root_folders()[0].name == "Pastas Pessoais"
+    session.run(b.key, lambda r: r.get_root_folders())
+    assert not a.is_open and b.is_open
+
+
+def test_evict_idle_respeita_lease(session, two_psts):
+    a = session.add(two_psts[0])
+    with session.lease(a.key):
+        assert session.evict_idle(now=float("inf")) == []
+        assert a.is_open
+    assert session.evict_idle(now=float("inf")) == [a.key]
+    # Reaberto sob demanda
+    assert session.run(a.key, lambda r: r.is_open)
+
+
+def test_lease_concorrente_com_evict(session, two_psts):
+    a, b = (session.add(path) for path in two_psts)
+    errors = []
+
+    def use(key):
+        try:
+            for _ in range(30):
+                with session.lease(key) as reader:
+                    folder = reader.get_root_folders()[0]
+                    reader.get_sub_folders(folder.id)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=use, args=(key,)) for key in (a.key, b.key, a.key)]
+    for t in threads:
+        t.start()
+    for _ in range(30):
+        session.evict_idle(now=float("inf"))
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_resolve_id_qualificado(session, two_psts):
+    a = session.add(two_psts[0])
+    root_id = session.run(a.key, lambda r: r.get_root_folders()[0].id)
+    with session.resolve(qualify(a.key, root_id)) as (reader, local_id):
+        assert local_id == root_id
+        assert reader.is_open
+
+
+def test_ordens_de_pasta_entram_no_limite_compartilhado(session, two_psts):
+    a = session.add(two_psts[0])
+
+    def sort(reader):
+        inbox = reader.get_sub_folders(reader.get_root_folders()[0].id)[0]
+        return list(reader.sort_order(inbox.id, [("subject", True)]))
+
+    before = session.cache_stats.bytes_used
+    assert session.run(a.key, sort) == [2, 1, 0]
+    assert session.cache_stats.bytes_used > before
+    session.remove(a.key)
+    assert session.cache_stats.bytes_used == before
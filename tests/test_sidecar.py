@@ -0,0 +1,68 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import pytest
+
+from src.index.sidecar import SidecarIndex
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    pst = tmp_path / "caixa.pst"
+    pst.write_bytes(b"!BDN")
+    sidecar = SidecarIndex(str(tmp_path / "indice"), str(pst))
+    sidecar.mark_fresh()
+    sidecar.sync_children(None, [("f1", None, 0, "Caixa de Entrada", 0, 3), ("f2", None, 1, "Enviados", 0, 1)])
+    yield sidecar
+    sidecar.close()
+
+
+def test_mapa_de_ids_gravado_na_leitura(sidecar):
+    sidecar.save_message_ids("f1", [("f1:101", 0), ("f1:103", 2)])
+    assert sidecar.locate_message("f1:103") == ("f1", 2)
+    assert sidecar.locate_message("f1:102") is None
+    # Só parte da pasta: quem procura ainda precisa percorrê-la
+    assert not sidecar.has_message_ids("f1")
+    sidecar.save_message_ids("f1", [("f1:102", 1)], complete=True)
+    assert sidecar.has_message_ids("f1") and not sidecar.has_message_ids("f2")
+
+
+def test_indexacao_completa_tambem_mapeia(sidecar):
+    sidecar.save_previews("f2", [("f2:201", 0, "Enviada", "Ana", None, 0, None)])
+    assert sidecar.locate_message("f2:201") == ("f2", 0)
+    assert sidecar.has_message_ids("f2")
+
+
+def test_contagem_alterada_descarta_o_mapa(sidecar):
+    sidecar.save_message_ids("f1", [("f1:101", 0)], complete=True)
+    sidecar.save_message_ids("f2", [("f2:201", 0)], complete=True)
+    sidecar.sync_children(None, [("f1", None, 0, "Caixa de Entrada", 0, 4), ("f2", None, 1, "Enviados", 0, 1)])
+    assert sidecar.locate_message("f1:101") is None and not sidecar.has_message_ids("f1")
+    assert sidecar.locate_message("f2:201") == ("f2", 0)
+
+
+def test_pst_alterado_descarta_o_mapa(sidecar):
+    sidecar.save_message_ids("f1", [("f1:101", 0)], complete=True)
+    sidecar.invalidate()
+    # Mesmo com a pasta conferida de novo (mesma contagem), as posições antigas não valem
+    sidecar.sync_children(None, [("f1", None, 0, "Caixa de Entrada", 0, 3)])
+    assert sidecar.locate_message("f1:101") is None and not sidecar.has_message_ids("f1")
+
+
+def test_mapa_completo_substitui_o_anterior(sidecar):
+    sidecar.save_message_ids("f1", [("f1:101", 0), ("f1:102", 1)])
+    sidecar.save_message_ids("f1", [("f1:102", 0)], complete=True)
+    assert sidecar.locate_message("f1:101") is None
+    assert sidecar.locate_message("f1:102") == ("f1", 0)
+
+
+def test_pst_alterado_descarta_previas_e_ordens(sidecar):
+    sidecar.save_previews("f1", [("f1:101", 0, "Antiga", "Ana", None, 0, None)])
+    sidecar.save_sort_index("f1", "subject", b"o", b"r")
+    sidecar.invalidate()
+    # Mesma contagem, conteúdo possivelmente outro: nada do índice antigo vale
+    sidecar.sync_children(None, [("f1", None, 0, "Caixa de Entrada", 0, 3)])
+    assert sidecar.load_previews("f1") is None
+    assert sidecar.count_previews("f1") is None
+    assert sidecar.load_sort_index("f1", "subject") is None
@@ -0,0 +1,58 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import pytest
+
+from src.index.sorting import SortIndex, build_sort_index, combine, sort_batch
+from src.previews import PreviewBatch
+
+
+@pytest.fixture
+def batch():
+    batch = PreviewBatch("f1", start=10)
+    for subject, sender, date in [
+        ("Beta", "Ana", 300),
+        ("alfa", "Bruno", 100),
+        ("Beta", "ana", 100),
+        ("Alfa", "Carla", 200),
+        ("beta", "Bruno", 200),
+    ]:
+        batch.append(f"f1:{len(batch)}", subject, sender, date)
+    return batch
+
+
+def indexes(batch, *keys):
+    return {key: build_sort_index(batch, key) for key in keys}
+
+
+def test_indice_por_coluna(batch):
+    index = build_sort_index(batch, "subject")
+    assert list(index.order) == [11, 13, 10, 12, 14]
+    assert list(index.ranks[10:]) == [1, 0, 1, 0, 1]
+    # Posições antes de ``start`` não têm mensagem
+    assert set(index.ranks[:10]) == {-1}
+    again = SortIndex.from_bytes("subject", *index.to_bytes())
+    assert (again.order, again.ranks) == (index.order, index.ranks)
+
+
+def test_empates_na_ordem_da_pasta_nos_dois_sentidos(batch):
+    by_subject = indexes(batch, "subject")
+    assert list(combine(by_subject, [("subject", False)])) == [11, 13, 10, 12, 14]
+    assert list(combine(by_subject, [("subject", True)])) == [10, 12, 14, 11, 13]
+
+
+def test_varias_chaves(batch):
+    both = indexes(batch, "sender", "date")
+    assert list(combine(both, [("sender", False), ("date", True)])) == [10, 12, 14, 11, 13]
+    assert list(combine(both, [("date", True), ("sender", False)])) == [10, 14, 13, 12, 11]
+
+
+def test_sort_batch(batch):
+    ordered = sort_batch(batch, [("date", True), ("subject", False)])
+    assert ordered.ids == ["f1:0", "f1:3", "f1:4", "f1:1", "f1:2"]
+
+
+def test_ordenacao_vazia(batch):
+    with pytest.raises(ValueError):
+        combine(indexes(batch, "date"), [])
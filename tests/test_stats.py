@@ -0,0 +1,26 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import os
+
+from src.pst_reader import PstReader
+from src.stats import StatsEngine
+
+
+def test_estatisticas_fecham_o_leitor_proprio(fake_readpst, sample_tree, tmp_path, without_pypff, closed_readers):
+    pst = fake_readpst(sample_tree)
+    report = StatsEngine(pst, index_dir=str(tmp_path / "indice")).run()
+    assert sum(stats.messages for stats in report.per_folder.values()) == 4
+    assert closed_readers == [os.path.abspath(pst)]
+
+
+def test_leitor_recebido_continua_aberto(fake_readpst, sample_tree, tmp_path, without_pypff, closed_readers):
+    pst = fake_readpst(sample_tree)
+    reader = PstReader(index_dir=str(tmp_path / "indice"))
+    reader.open(pst)
+    try:
+        StatsEngine(pst).run(reader)
+        assert closed_readers == [] and reader.is_open
+    finally:
+        reader.close()
@@ -0,0 +1,48 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import pytest
+
+from src.utils import text
+
+pytest.importorskip("html2text")
+
+
+@pytest.fixture(autouse=True)
+def _sem_memo():
+    text.clear_memo()
+    yield
+    text.clear_memo()
+
+
+def test_blockquote_aberto_nao_vaza_para_a_proxima_mensagem():
+    html = "<p>Olá, tudo bem?</p><pre>código\n  indentado</pre><table><tr><td>a</td><td>b</td></tr></table>"
+    limpo = text.html_to_text(html)
+    text.clear_memo()
+
+    text.html_to_text("<p>Resposta</p><blockquote><p>citação sem fechar")
+    depois = text.html_to_text(html)
+
+    assert depois == limpo
+    assert not depois.startswith(">")
+
+
+def test_memo_devolve_a_mesma_conversao():
+    html = "<p>Mensagem <b>repetida</b></p>"
+    assert text.html_to_text(html) == text.html_to_text(html)
+
+
+def test_previa_limitada():
+    html = "<p>" + "palavra " * 2000 + "</p>"
+    assert len(text.html_to_text(html, preview=True)) <= text.PREVIEW_CHARS
+
+
+def test_memo_limitado_por_tamanho(monkeypatch):
+    monkeypatch.setattr(text, "MEMO_CHARS", 50)
+    for i in range(20):
+        text.html_to_text(f"<p>mensagem número {i} com algum texto</p>", preview=True)
+        assert text.memo_chars() <= 50
+    # Maior que o limite inteiro: convertido, mas não guardado
+    grande = text.html_to_text("<p>" + "x" * 100 + "</p>", preview=True)
+    assert len(grande) == 100 and text.memo_chars() <= 50
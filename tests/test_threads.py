@@ -0,0 +1,130 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+import os
+
+import pytest
+
+from src.index.threads import (
+    ThreadIndex,
+    conversation_key,
+    normalize_subject,
+    parse_thread_headers,
+    update_thread_index,
+)
+from src.models import MessageHeaders, PstFolder
+from src.pst_reader import PstReader
+
+from tests.conftest import mbox_message
+
+
+def test_parse_thread_headers():
+    text = (
+        "Received: from x\r\n"
+        "Message-ID: <b@example.com>\r\n"
+        "References: <a@example.com>\r\n"
+        "\t<z@example.com>\r\n"
+        "In-Reply-To: <z@example.com>\r\n"
+        "Message-ID: <ignorado@example.com>\r\n"
+        "\r\n"
+        "Message-ID: <corpo@example.com>\r\n"
+    )
+    assert parse_thread_headers(text) == ("b@example.com", ["a@example.com", "z@example.com"], "z@example.com", None)
+
+
+def test_normalize_subject_e_conversation_key():
+    assert normalize_subject("RE: Fwd:  Orçamento   2024") == ("orçamento 2024", True)
+    assert normalize_subject("Orçamento 2024") == ("orçamento 2024", False)
+    assert conversation_key(bytes(range(22)) + b"resposta") == bytes(range(22)).hex()
+    assert conversation_key(b"curto") is None
+
+
+def reply(subject, date, msg_id, parent=None, refs=()):
+    headers = [f"Message-ID: <{msg_id}>"]
+    if parent:
+        headers.append(f"In-Reply-To: <{parent}>")
+    if refs:
+        headers.append("References: " + " ".join(f"<{r}>" for r in refs))
+    return mbox_message(subject, date=date, headers=headers)
+
+
+@pytest.fixture
+def thread_tree():
+    return {
+        "Pastas Pessoais": "",
+        "Pastas Pessoais/Caixa de Entrada": "".join(
+            [
+                reply("Orçamento", "Mon, 01 Jan 2024 10:00:00 +0000", "a@x"),
+                reply("RE: Orçamento", "Mon, 01 Jan 2024 12:00:00 +0000", "c@x", "b@x", ["a@x", "b@x"]),
+                mbox_message("Outro assunto", date="Mon, 01 Jan 2024 11:00:00 +0000"),
+            ]
+        ),
+        # Resposta em outra pasta, e uma resposta sem cabeçalhos (só pelo assunto)
+        "Pastas Pessoais/Enviados": "".join(
+            [
+                reply("RE: Orçamento", "Mon, 01 Jan 2024 11:00:00 +0000", "b@x", "a@x", ["a@x"]),
+                mbox_message("Re: orçamento", date="Mon, 01 Jan 2024 13:00:00 +0000"),
+            ]
+        ),
+    }
+
+
+def test_conversa_em_todas_as_pastas(fake_readpst, thread_tree, tmp_path, without_pypff):
+    reader = PstReader(index_dir=str(tmp_path / "indice"))
+    reader.open(fake_readpst(thread_tree))
+    try:
+        index = ThreadIndex(reader.index_path)
+        try:
+            assert update_thread_index(reader, index) == (3, 5)
+            summaries = index.list_threads(min_size=2)
+        finally:
+            index.close()
+        assert [(s.subject, s.size) for s in summaries] == [("Orçamento", 4)]
+
+        thread = reader.conversation(summaries[0].msg_id)
+        assert [(m.subject, m.depth) for m in thread] == [
+            ("Orçamento", 0),
+            ("RE: Orçamento", 1),
+            ("RE: Orçamento", 2),
+            ("Re: orçamento", 0),
+        ]
+        # Qualquer mensagem da conversa abre a mesma conversa
+        assert [m.msg_id for m in reader.conversation(thread[2].msg_id)] == [m.msg_id for m in thread]
+    finally:
+        reader.close()
+
+
+class HeadersReader:
+    def __init__(self, path, headers):
+        self.path = path
+        self.headers = headers
+        self.folder = PstFolder(id="f1", name="Caixa de Entrada", children=[], message_count=len(headers))
+
+    def walk_folders(self):
+        yield self.folder, self.folder.name, 0
+
+    def count_messages(self, folder_id):
+        return len(self.headers)
+
+    def iter_thread_headers(self, folder_id, start=0, count=None):
+        return iter(self.headers[start : None if count is None else start + count])
+
+
+def test_pst_editado_com_a_mesma_contagem_e_reindexado(tmp_path):
+    pst = tmp_path / "caixa.pst"
+    pst.write_bytes(b"!BDN")
+    reader = HeadersReader(str(pst), [MessageHeaders("f1:0", "Orçamento", "Ana", 100, 0)])
+    index = ThreadIndex(str(tmp_path / "indice.sqlite"))
+    try:
+        assert update_thread_index(reader, index) == (1, 1)
+        assert update_thread_index(reader, index) == (0, 0)
+
+        reader.headers = [MessageHeaders("f1:0", "Viagem", "Ana", 100, 0)]
+        pst.write_bytes(b"!BDN editado")
+        st = os.stat(pst)
+        os.utime(pst, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert update_thread_index(reader, index) == (1, 1)
+        assert [m.subject for m in index.load_thread("f1:0")] == ["Viagem"]
+    finally:
+        index.close()
@@ -0,0 +1,57 @@
+"""
+@author João Gbriel de Almeida
+"""
+
+from src.previews import PreviewBatch
+from src.widgets import VirtualMessageList
+
+
+def message_list(loader, total=250):
+    # Só o estado dos blocos, sem Tk (a renderização é trocada por nada)
+    widget = VirtualMessageList.__new__(VirtualMessageList)
+    widget.block_size = 100
+    widget.prefetch_blocks = 0
+    widget._loader = loader
+    widget._generation = 1
+    widget._total = total
+    widget._offset = 0
+    widget._visible = 20
+    widget._blocks = {}
+    widget._pending_blocks = set()
+    widget._selected = None
+    widget._select_pending = False
+    widget._in_refresh = True
+    widget._render = lambda: None
+    return widget
+
+
+def test_bloco_com_falha_e_pedido_de_novo():
+    requests = []
+    widget = message_list(lambda start, count, done, failed: requests.append((start, count, done, failed)))
+    widget._request_window()
+    assert [r[:2] for r in requests] == [(0, 100)] and widget._pending_blocks == {0}
+
+    # Ainda pendente: a rolagem não repete o pedido
+    widget._request_window()
+    assert len(requests) == 1
+
+    # Falhou (ou foi cancelado): a próxima rolagem pede de novo
+    requests[0][3]()
+    assert widget._pending_blocks == set()
+    widget._request_window()
+    assert len(requests) == 2
+
+    batch = PreviewBatch("f1")
+    batch.append("f1:0", "Assunto", "Ana", 0)
+    requests[1][2](batch)
+    assert widget._blocks == {0: batch} and widget._pending_blocks == set()
+
+
+def test_falha_de_fonte_antiga_e_ignorada():
+    requests = []
+    widget = message_list(lambda start, count, done, failed: requests.append(failed))
+    widget._request_window()
+    widget._generation += 1
+    widget._pending_blocks = {0}
+    requests[0]()
+    assert widget._pending_blocks == {0}